@@ -4,13 +4,14 @@ bTeam WebApp - Main Backend Application
 FastAPI-based REST API for cycling team management
 """
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, FileResponse
 import sys
 import os
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 # Configure logging
@@ -24,7 +25,8 @@ logger = logging.getLogger(__name__)
 webapp_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, webapp_dir)
 
-from shared.storage import get_storage
+from shared.storage import get_storage, storage_session
+from shared.intervals.async_client import close_async_http_client
 
 # Import route modules
 from modules.teams import teams_routes
@@ -34,12 +36,24 @@ from modules.activities import activities_routes
 from modules.races import races_routes
 from modules.wellness import wellness_routes
 from modules.sync import sync_routes
+from modules.search import search_routes
+from modules.admin import admin_routes
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Chiude alla fine le connessioni del client Intervals async di questo worker"""
+    yield
+    await close_async_http_client()
+
 
 # Initialize FastAPI app
 app = FastAPI(
     title="bTeam API",
     description="REST API for cycling team management and Intervals.icu integration",
-    version="1.0.0"
+    version="1.0.0",
+    # Ogni richiesta lavora su una propria sessione DB (pool di connessioni condiviso)
+    dependencies=[Depends(storage_session)],
+    lifespan=lifespan,
 )
 
 # Enable CORS for frontend
@@ -102,6 +116,8 @@ app.include_router(activities_routes.router, prefix="/api/activities", tags=["Ac
 app.include_router(races_routes.router, prefix="/api/races", tags=["Races"])
 app.include_router(wellness_routes.router, prefix="/api/wellness", tags=["Wellness"])
 app.include_router(sync_routes.router, prefix="/api/sync", tags=["Synchronization"])
+app.include_router(search_routes.router, prefix="/api/search", tags=["Search"])
+app.include_router(admin_routes.router, prefix="/api/admin", tags=["Admin"])
 
 
 if __name__ == "__main__":
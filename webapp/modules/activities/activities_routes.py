@@ -2,9 +2,10 @@
 
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
-from shared.storage import get_storage
+from shared.responses import json_response
+from shared.storage import get_async_storage
 
 router = APIRouter()
 
@@ -26,63 +27,106 @@ class ActivityCreate(BaseModel):
     training_load: Optional[float] = None
     intensity: Optional[float] = None
     feel: Optional[int] = None
+    tags: Optional[List[str]] = None
 
 
 @router.get("/")
 async def get_activities(
     athlete_id: Optional[int] = None,
     limit: Optional[int] = Query(100, le=1000),
-    is_race: Optional[bool] = None
+    is_race: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    paginated: bool = False,
+    tags: Optional[List[str]] = Query(None),
+    since: Optional[int] = None
 ):
-    """Get activities with optional filters — filtering done at DB level"""
-    return get_storage().list_activities(
+    """Get activities with optional filters — filtering done at DB level.
+
+    With paginated=true (or a cursor) returns {"items", "next_cursor"}: pass
+    next_cursor back as cursor to fetch the following page. Repeat tags
+    (?tags=race&tags=test) to keep activities carrying any of them.
+
+    With since=<version> returns only the changes after that version:
+    {"version", "upserts", "deletes"} (since=0 returns every activity).
+    """
+    storage = get_async_storage()
+    if since is not None:
+        try:
+            return json_response(await storage.list_changes(
+                "activity", since, athlete_id=athlete_id, is_race=is_race, tags=tags
+            ))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if paginated or cursor:
+        try:
+            return json_response(await storage.list_activities_page(
+                athlete_id=athlete_id,
+                is_race=is_race,
+                limit=limit or 100,
+                cursor=cursor,
+                tags=tags,
+            ))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return json_response(await storage.list_activities(
         athlete_id=athlete_id,
         is_race=is_race,
         limit=limit or 100,
-    )
+        tags=tags,
+    ))
 
 
 @router.get("/athlete/{athlete_id}/stats")
-async def get_athlete_stats(athlete_id: int):
-    """Get statistics for an athlete's activities"""
-    athlete_activities = get_storage().list_activities(athlete_id=athlete_id)
-
-    if not athlete_activities:
-        return {
-            "total_activities": 0,
-            "total_distance_km": 0,
-            "total_duration_hours": 0,
-            "avg_tss": 0
-        }
-
-    total_distance = sum(float(a.get('distance_km', 0) or 0) for a in athlete_activities)
-    total_duration = sum(float(a.get('duration_minutes', 0) or 0) for a in athlete_activities)
-    tss_values = [float(a.get('tss', 0) or 0) for a in athlete_activities if a.get('tss')]
-    avg_tss = sum(tss_values) / len(tss_values) if tss_values else 0
-
-    return {
-        "total_activities": len(athlete_activities),
-        "total_distance_km": round(total_distance, 2),
-        "total_duration_hours": round(total_duration / 60, 2),
-        "avg_tss": round(avg_tss, 2)
-    }
+async def get_athlete_stats(
+    athlete_id: int,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    activity_type: Optional[str] = None,
+    is_race: Optional[bool] = None,
+    group_by: Optional[str] = None
+):
+    """Get statistics for an athlete's activities — aggregated at DB level, no row limit.
+
+    group_by=week|month|activity_type|is_race adds a "buckets" list with the same
+    metrics per group.
+    """
+    try:
+        return await get_async_storage().get_activity_stats(
+            athlete_id,
+            date_from=date_from,
+            date_to=date_to,
+            activity_type=activity_type,
+            is_race=is_race,
+            group_by=group_by,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/{activity_id}")
 async def get_activity(activity_id: int):
     """Get a specific activity by ID"""
-    activity = get_storage().get_activity(activity_id)
+    activity = await get_async_storage().get_activity(activity_id)
     if not activity:
         raise HTTPException(status_code=404, detail="Activity not found")
     return activity
 
 
+@router.get("/{activity_id}/payload")
+async def get_activity_payload(activity_id: int):
+    """Get the raw Intervals.icu payload stored for an activity"""
+    payload = await get_async_storage().get_activity_payload(activity_id)
+    if not payload:
+        raise HTTPException(status_code=404, detail="No payload stored for this activity")
+    return payload
+
+
 @router.post("/")
 async def create_activity(activity: ActivityCreate):
     """Create a new activity"""
     try:
-        storage = get_storage()
-        activity_id, _ = storage.add_activity(
+        storage = get_async_storage()
+        activity_id, _ = await storage.add_activity(
             athlete_id=activity.athlete_id,
             title=activity.title,
             activity_date=activity.activity_date,
@@ -99,8 +143,9 @@ async def create_activity(activity: ActivityCreate):
             training_load=activity.training_load,
             intensity=activity.intensity,
             feel=activity.feel,
+            tags=activity.tags,
         )
-        return storage.get_activity(activity_id)
+        return await storage.get_activity(activity_id)
     except HTTPException:
         raise
     except Exception as e:
@@ -110,12 +155,12 @@ async def create_activity(activity: ActivityCreate):
 @router.delete("/{activity_id}")
 async def delete_activity(activity_id: int):
     """Delete an activity"""
-    storage = get_storage()
-    if not storage.get_activity(activity_id):
+    storage = get_async_storage()
+    if not await storage.get_activity(activity_id):
         raise HTTPException(status_code=404, detail="Activity not found")
 
     try:
-        storage.delete_activity(activity_id)
+        await storage.delete_activity(activity_id)
         return {"message": "Activity deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""Admin API Routes"""
+
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+
+from shared.intervals.ratelimit import get_rate_limiter
+from shared.storage import get_async_storage
+
+router = APIRouter()
+
+
+@router.get("/archives")
+async def list_archives():
+    """List the per-season archive databases with their row counts"""
+    return await get_async_storage().list_archives()
+
+
+@router.post("/archives")
+async def archive_seasons(before: Optional[str] = None):
+    """Move activities and wellness older than `before` (YYYY-MM-DD) into per-season archives.
+
+    Without `before` the "archive_before" boundary of the config is used.
+    """
+    try:
+        return await get_async_storage().archive_seasons(before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/backups")
+async def list_backups():
+    """List the database snapshots, newest first"""
+    return await get_async_storage().list_backups()
+
+
+@router.post("/backups")
+async def create_backup():
+    """Take a compressed online snapshot of the database (safe while the app is running)"""
+    try:
+        return await get_async_storage().create_backup()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/intervals-usage")
+async def intervals_usage():
+    """Rate-limit metrics of the Intervals.icu calls of this worker, per API key fingerprint"""
+    return get_rate_limiter().stats()
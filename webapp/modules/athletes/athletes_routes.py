@@ -3,12 +3,12 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-from datetime import date
 from pathlib import Path
 import sys
 import logging
 
-from shared.storage import get_storage
+from shared.responses import json_response
+from shared.storage import get_async_storage
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -47,22 +47,29 @@ class AthleteUpdate(BaseModel):
 
 
 @router.get("/")
-async def get_athletes(team_id: Optional[int] = None, category_id: Optional[int] = None):
-    """Get all athletes, optionally filtered by team or category"""
-    athletes = get_storage().list_athletes()
-    if team_id:
-        athletes = [a for a in athletes if a.get('team_id') == team_id]
-    if category_id:
-        athletes = [a for a in athletes if a.get('category_id') == category_id]
-    return athletes
+async def get_athletes(team_id: Optional[int] = None, category_id: Optional[int] = None, since: Optional[int] = None):
+    """Get all athletes, optionally filtered by team or category.
+
+    With since=<version> returns only the changes after that version:
+    {"version", "upserts", "deletes"} (since=0 returns every athlete).
+    """
+    storage = get_async_storage()
+    if since is not None:
+        try:
+            return json_response(
+                await storage.list_changes("athlete", since, team_id=team_id, category_id=category_id)
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return json_response(await storage.list_athletes(team_id=team_id, category_id=category_id))
 
 
 @router.post("/")
 async def create_athlete(athlete: AthleteCreate):
     """Create a new athlete"""
     try:
-        storage = get_storage()
-        athlete_id = storage.add_athlete(
+        storage = get_async_storage()
+        athlete_id = await storage.add_athlete(
             first_name=athlete.first_name,
             last_name=athlete.last_name,
             birth_date=athlete.birth_date or "",
@@ -72,7 +79,7 @@ async def create_athlete(athlete: AthleteCreate):
             kj_per_hour_per_kg=athlete.kj_per_hour_per_kg,
             api_key=athlete.api_key
         )
-        return storage.get_athlete(athlete_id)
+        return await storage.get_athlete(athlete_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -86,8 +93,8 @@ async def get_athlete_power_curve(
     newest: Optional[str] = None
 ):
     """Get power curve data from Intervals.icu for a specific athlete"""
-    storage = get_storage()
-    athlete = storage.get_athlete(athlete_id)
+    storage = get_async_storage()
+    athlete = await storage.get_athlete(athlete_id)
     if not athlete:
         raise HTTPException(status_code=404, detail="Athlete not found")
 
@@ -99,22 +106,10 @@ async def get_athlete_power_curve(
         if str(root_dir) not in sys.path:
             sys.path.insert(0, str(root_dir))
 
-        from shared.intervals.client import IntervalsAPIClient
-
-        client = IntervalsAPIClient(api_key=athlete['api_key'])
+        from shared.intervals.async_client import AsyncIntervalsAPIClient
 
-        params = {'type': 'Ride'}
-        if oldest:
-            if not newest:
-                newest = date.today().strftime('%Y-%m-%d')
-            params['curves'] = f"r.{oldest}.{newest}"
-
-        response = client._request(
-            'GET',
-            '/api/v1/athlete/0/power-curves.json',
-            params=params
-        )
-        payload = response.json()
+        client = AsyncIntervalsAPIClient(api_key=athlete['api_key'])
+        payload = await client.get_power_curve(athlete_id='0', oldest=oldest, newest=newest)
 
         curves = payload.get('list', []) if isinstance(payload, dict) else []
         if not curves:
@@ -132,7 +127,7 @@ async def get_athlete_power_curve(
 @router.get("/{athlete_id}")
 async def get_athlete(athlete_id: int):
     """Get a specific athlete by ID"""
-    athlete = get_storage().get_athlete(athlete_id)
+    athlete = await get_async_storage().get_athlete(athlete_id)
     if not athlete:
         raise HTTPException(status_code=404, detail="Athlete not found")
     return athlete
@@ -141,14 +136,14 @@ async def get_athlete(athlete_id: int):
 @router.put("/{athlete_id}")
 async def update_athlete(athlete_id: int, athlete: AthleteUpdate):
     """Update an existing athlete"""
-    storage = get_storage()
-    if not storage.get_athlete(athlete_id):
+    storage = get_async_storage()
+    if not await storage.get_athlete(athlete_id):
         raise HTTPException(status_code=404, detail="Athlete not found")
 
     try:
         update_data = {k: v for k, v in athlete.dict().items() if v is not None}
-        storage.update_athlete(athlete_id, **update_data)
-        return storage.get_athlete(athlete_id)
+        await storage.update_athlete(athlete_id, **update_data)
+        return await storage.get_athlete(athlete_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -170,8 +165,8 @@ class CustomCPConfig(BaseModel):
 @router.post("/{athlete_id}/custom-cp")
 async def save_custom_cp_config(athlete_id: int, config: CustomCPConfig):
     """Save custom CP configuration for an athlete (creates new historical record)"""
-    storage = get_storage()
-    athlete = storage.get_athlete(athlete_id)
+    storage = get_async_storage()
+    athlete = await storage.get_athlete(athlete_id)
     if not athlete:
         raise HTTPException(status_code=404, detail="Athlete not found")
     
@@ -183,7 +178,7 @@ async def save_custom_cp_config(athlete_id: int, config: CustomCPConfig):
             display_label = f"{config.date_start} - {config.date_end}"
         
         # Save to history (does NOT overwrite, creates new record)
-        saved_config = storage.save_custom_cp(
+        saved_config = await storage.save_custom_cp(
             athlete_id=athlete_id,
             period=config.period,
             period_label=display_label,
@@ -212,24 +207,24 @@ async def get_custom_cp_history(
     limit: int = 50
 ):
     """Get Custom CP configuration history for an athlete"""
-    storage = get_storage()
-    athlete = storage.get_athlete(athlete_id)
+    storage = get_async_storage()
+    athlete = await storage.get_athlete(athlete_id)
     if not athlete:
         raise HTTPException(status_code=404, detail="Athlete not found")
     
-    history = storage.get_custom_cp_history(athlete_id, period=period, limit=limit)
+    history = await storage.get_custom_cp_history(athlete_id, period=period, limit=limit)
     return history
 
 
 @router.get("/{athlete_id}/custom-cp/latest/{period}")
 async def get_latest_custom_cp(athlete_id: int, period: str):
     """Get the most recent Custom CP configuration for a specific period"""
-    storage = get_storage()
-    athlete = storage.get_athlete(athlete_id)
+    storage = get_async_storage()
+    athlete = await storage.get_athlete(athlete_id)
     if not athlete:
         raise HTTPException(status_code=404, detail="Athlete not found")
     
-    config = storage.get_latest_custom_cp(athlete_id, period)
+    config = await storage.get_latest_custom_cp(athlete_id, period)
     if not config:
         raise HTTPException(status_code=404, detail="No custom CP config found for this period")
     
@@ -239,8 +234,8 @@ async def get_latest_custom_cp(athlete_id: int, period: str):
 @router.get("/{athlete_id}/custom-cp-detail/{config_id}")
 async def get_custom_cp_by_id(athlete_id: int, config_id: int):
     """Get a specific Custom CP configuration by ID"""
-    storage = get_storage()
-    config = storage.get_custom_cp_by_id(athlete_id, config_id)
+    storage = get_async_storage()
+    config = await storage.get_custom_cp_by_id(athlete_id, config_id)
     if not config:
         raise HTTPException(status_code=404, detail="Custom CP config not found")
     
@@ -250,10 +245,10 @@ async def get_custom_cp_by_id(athlete_id: int, config_id: int):
 @router.delete("/{athlete_id}/custom-cp-history/{config_id}")
 async def delete_custom_cp_config(athlete_id: int, config_id: int):
     """Delete a Custom CP configuration from history"""
-    storage = get_storage()
+    storage = get_async_storage()
     
     try:
-        if storage.delete_custom_cp(athlete_id, config_id):
+        if await storage.delete_custom_cp(athlete_id, config_id):
             return {"message": "Custom CP configuration deleted"}
         else:
             raise HTTPException(status_code=404, detail="Config not found")
@@ -270,12 +265,12 @@ async def get_custom_cp_config_legacy(athlete_id: int, period: str):
     Use /custom-cp/latest/{period} instead.
     Returns the most recent configuration for backwards compatibility.
     """
-    storage = get_storage()
-    athlete = storage.get_athlete(athlete_id)
+    storage = get_async_storage()
+    athlete = await storage.get_athlete(athlete_id)
     if not athlete:
         raise HTTPException(status_code=404, detail="Athlete not found")
     
-    config = storage.get_latest_custom_cp(athlete_id, period)
+    config = await storage.get_latest_custom_cp(athlete_id, period)
     if not config:
         # Fall back to old custom_cp_configs field for backwards compatibility
         custom_configs = athlete.get('custom_cp_configs', {})
@@ -292,16 +287,16 @@ async def delete_custom_cp_config_legacy(athlete_id: int, period: str):
     DEPRECATED: Delete custom CP configuration for an athlete and period.
     This now deletes ALL history for this period.
     """
-    storage = get_storage()
-    athlete = storage.get_athlete(athlete_id)
+    storage = get_async_storage()
+    athlete = await storage.get_athlete(athlete_id)
     if not athlete:
         raise HTTPException(status_code=404, detail="Athlete not found")
     
     # Get all configs for this period and delete them
-    history = storage.get_custom_cp_history(athlete_id, period=period)
+    history = await storage.get_custom_cp_history(athlete_id, period=period)
     deleted_count = 0
     for config in history:
-        if storage.delete_custom_cp(athlete_id, config["id"]):
+        if await storage.delete_custom_cp(athlete_id, config["id"]):
             deleted_count += 1
     
     return {"message": f"Deleted {deleted_count} custom CP configuration(s)"}
@@ -310,12 +305,12 @@ async def delete_custom_cp_config_legacy(athlete_id: int, period: str):
 @router.delete("/{athlete_id}")
 async def delete_athlete(athlete_id: int):
     """Delete an athlete"""
-    storage = get_storage()
-    if not storage.get_athlete(athlete_id):
+    storage = get_async_storage()
+    if not await storage.get_athlete(athlete_id):
         raise HTTPException(status_code=404, detail="Athlete not found")
 
     try:
-        storage.delete_athlete(athlete_id)
+        await storage.delete_athlete(athlete_id)
         return {"message": "Athlete deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -4,7 +4,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List
 
-from shared.storage import get_storage
+from shared.storage import get_async_storage
 
 router = APIRouter()
 
@@ -22,13 +22,13 @@ class CategoryResponse(BaseModel):
 @router.get("/", response_model=List[CategoryResponse])
 async def get_categories():
     """Get all categories"""
-    return get_storage().list_categories()
+    return await get_async_storage().list_categories()
 
 
 @router.get("/{category_id}", response_model=CategoryResponse)
 async def get_category(category_id: int):
     """Get a specific category by ID"""
-    category = get_storage().get_category(category_id)
+    category = await get_async_storage().get_category(category_id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     return category
@@ -38,9 +38,9 @@ async def get_category(category_id: int):
 async def create_category(category: CategoryCreate):
     """Create a new category"""
     try:
-        storage = get_storage()
-        category_id = storage.add_category(name=category.name)
-        created_category = storage.get_category(category_id)
+        storage = get_async_storage()
+        category_id = await storage.add_category(name=category.name)
+        created_category = await storage.get_category(category_id)
         if not created_category:
             raise HTTPException(status_code=500, detail="Failed to retrieve created category")
         return created_category
@@ -53,13 +53,13 @@ async def create_category(category: CategoryCreate):
 @router.put("/{category_id}", response_model=CategoryResponse)
 async def update_category(category_id: int, category: CategoryCreate):
     """Update an existing category"""
-    storage = get_storage()
-    if not storage.get_category(category_id):
+    storage = get_async_storage()
+    if not await storage.get_category(category_id):
         raise HTTPException(status_code=404, detail="Category not found")
 
     try:
-        storage.update_category(category_id, name=category.name)
-        return storage.get_category(category_id)
+        await storage.update_category(category_id, name=category.name)
+        return await storage.get_category(category_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -67,12 +67,12 @@ async def update_category(category_id: int, category: CategoryCreate):
 @router.delete("/{category_id}")
 async def delete_category(category_id: int):
     """Delete a category"""
-    storage = get_storage()
-    if not storage.get_category(category_id):
+    storage = get_async_storage()
+    if not await storage.get_category(category_id):
         raise HTTPException(status_code=404, detail="Category not found")
 
     try:
-        storage.delete_category(category_id)
+        await storage.delete_category(category_id)
         return {"message": "Category deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
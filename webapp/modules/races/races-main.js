@@ -101,6 +101,103 @@ window.showPushRaceDialog = function(race) {
     };
 };
 
+/**
+ * Build the table row of a race from its calendar summary
+ */
+function buildRaceRowHtml(race) {
+    const isMultiStage = race.num_stages && race.num_stages > 1;
+    const raceId = race.id;
+    const start = formatDate(race.race_date_start);
+    const end = formatDate(race.race_date_end);
+    const dateRange = start === end ? start : `${start} → ${end}`;
+
+    return `
+        <tr class="race-row" data-race-id="${raceId}">
+            <td style="text-align: center;">
+                ${isMultiStage ? `
+                    <button class="btn-expand" onclick="window.toggleStages(${raceId})" style="
+                        background: none;
+                        border: none;
+                        font-size: 1.2rem;
+                        cursor: pointer;
+                        padding: 0;
+                        width: 30px;
+                        height: 30px;
+                        display: flex;
+                        align-items: center;
+                        justify-content: center;
+                    ">
+                        ▶
+                    </button>
+                ` : ''}
+            </td>
+            <td>${raceId}</td>
+            <td><strong>${race.name}${isMultiStage ? ` <span style="color: #999;">(${race.num_stages} tappe)</span>` : ''}</strong></td>
+            <td>${dateRange}</td>
+            <td>${race.distance_km ? formatNumber(race.distance_km, 1) : '-'}</td>
+            <td>${race.category || '-'}</td>
+            <td>${race.gender || '-'}</td>
+            <td>${race.elevation_m ? formatNumber(race.elevation_m, 0) : '-'}</td>
+            <td>${isMultiStage ? `<strong>${race.num_stages} tappe</strong>` : (race.predicted_duration_minutes ? formatDuration(race.predicted_duration_minutes) : '-')}</td>
+            <td>${race.predicted_kj ? formatNumber(race.predicted_kj, 0) : '-'}</td>
+            <td>
+                <div style="display:flex; gap:4px; align-items:center; flex-wrap:nowrap;">
+                    <button class="btn btn-secondary btn-sm" onclick="viewRaceDetails(${raceId})" title="Visualizza dettagli">
+                        <i class="bi bi-eye"></i> Dettagli
+                    </button>
+                    <button class="btn btn-info btn-sm" onclick="pushRaceToIntervals(${raceId})" title="Push su Intervals.icu">
+                        <i class="bi bi-cloud-arrow-up"></i> Intervals
+                    </button>
+                    ${!isMultiStage ? `
+                    <button class="btn btn-warning btn-sm" onclick="window.openRaceActivitySelector(${raceId})" title="Seleziona attività Intervals">
+                        <i class="bi bi-target"></i> Attività
+                    </button>
+                    ` : ''}
+                    <button class="btn btn-danger btn-sm" onclick="deleteRaceConfirm(${raceId})" title="Elimina gara">
+                        <i class="bi bi-trash"></i>
+                    </button>
+                </div>
+            </td>
+        </tr>
+    `;
+}
+
+/**
+ * Build the (hidden) stage rows of a multi-stage race
+ */
+function buildStageRowsHtml(raceId, stages) {
+    return stages.map(stage => {
+        const stageDate = stage.stage_date ? formatDate(stage.stage_date) : '—';
+        return `
+            <tr class="stage-row" data-race-id="${raceId}" style="display:none; background: #f9f9f9;">
+                <td style="padding-left: 50px;"></td>
+                <td>—</td>
+                <td><em>Tappa ${stage.stage_number}</em></td>
+                <td>${stageDate}</td>
+                <td>${stage.distance_km ? formatNumber(stage.distance_km, 1) : '-'}</td>
+                <td>—</td>
+                <td>—</td>
+                <td>${stage.elevation_m ? formatNumber(stage.elevation_m, 0) : '-'}</td>
+                <td>—</td>
+                <td>—</td>
+                <td>
+                    <div style="display:flex; gap:4px; align-items:center; flex-wrap:nowrap;">
+                        <button class="btn btn-secondary btn-sm" onclick="viewRaceDetails(${raceId})" title="Visualizza dettagli">
+                            <i class="bi bi-eye"></i> Dettagli
+                        </button>
+                        <button class="btn btn-warning btn-sm" onclick="window.openRaceActivitySelector(${raceId}, ${stage.stage_number})" title="Seleziona attività Intervals">
+                            <i class="bi bi-target"></i> Attività
+                        </button>
+                        <button class="btn btn-danger btn-sm" onclick="deleteRaceConfirm(${raceId})" title="Elimina gara">
+                            <i class="bi bi-trash"></i>
+                        </button>
+                    </div>
+                </td>
+            </tr>
+        `;
+    }).join('');
+}
+
 /**
  * Main function to render the races page
  * Shows races table with actions
@@ -119,7 +216,9 @@ window.renderRacesPage = async function() {
 
     try {
         showLoading();
-        const races = await api.getRaces();
+        // Solo il riepilogo: tappe e atleti si caricano quando servono
+        const page = await api.getRaceSummaries({ limit: 200 });
+        window.racesNextCursor = page.next_cursor;
 
         contentArea.innerHTML = `
             <div class="card">
@@ -130,6 +229,7 @@ window.renderRacesPage = async function() {
                     </button>
                 </div>
                 <div id="races-table"></div>
+                <div id="races-load-more" style="text-align: center; padding: 1rem;"></div>
             </div>
         `;
 
@@ -151,102 +251,10 @@ window.renderRacesPage = async function() {
                         <th>Azioni</th>
                     </tr>
                 </thead>
-                <tbody>
+                <tbody id="races-tbody">
         `;
 
-        for (const race of races) {
-            const isMultiStage = race.num_stages && race.num_stages > 1;
-            const raceId = race.id;
-            const start = formatDate(race.race_date_start);
-            const end = formatDate(race.race_date_end);
-            const dateRange = start === end ? start : `${start} → ${end}`;
-            const stages = race.stages || [];
-
-            // Parent race row
-            tableHtml += `
-                <tr class="race-row" data-race-id="${raceId}">
-                    <td style="text-align: center;">
-                        ${isMultiStage ? `
-                            <button class="btn-expand" onclick="window.toggleStages(${raceId})" style="
-                                background: none;
-                                border: none;
-                                font-size: 1.2rem;
-                                cursor: pointer;
-                                padding: 0;
-                                width: 30px;
-                                height: 30px;
-                                display: flex;
-                                align-items: center;
-                                justify-content: center;
-                            ">
-                                ▶
-                            </button>
-                        ` : ''}
-                    </td>
-                    <td>${raceId}</td>
-                    <td><strong>${race.name}${isMultiStage ? ` <span style="color: #999;">(${race.num_stages} tappe)</span>` : ''}</strong></td>
-                    <td>${dateRange}</td>
-                    <td>${race.distance_km ? formatNumber(race.distance_km, 1) : '-'}</td>
-                    <td>${race.category || '-'}</td>
-                    <td>${race.gender || '-'}</td>
-                    <td>${race.elevation_m ? formatNumber(race.elevation_m, 0) : '-'}</td>
-                    <td>${isMultiStage ? `<strong>${race.num_stages} tappe</strong>` : (race.predicted_duration_minutes ? formatDuration(race.predicted_duration_minutes) : '-')}</td>
-                    <td>${race.predicted_kj ? formatNumber(race.predicted_kj, 0) : '-'}</td>
-                    <td>
-                        <div style="display:flex; gap:4px; align-items:center; flex-wrap:nowrap;">
-                            <button class="btn btn-secondary btn-sm" onclick="viewRaceDetails(${raceId})" title="Visualizza dettagli">
-                                <i class="bi bi-eye"></i> Dettagli
-                            </button>
-                            <button class="btn btn-info btn-sm" onclick="pushRaceToIntervals(${raceId})" title="Push su Intervals.icu">
-                                <i class="bi bi-cloud-arrow-up"></i> Intervals
-                            </button>
-                            ${!isMultiStage ? `
-                            <button class="btn btn-warning btn-sm" onclick="window.openRaceActivitySelector(${raceId})" title="Seleziona attività Intervals">
-                                <i class="bi bi-target"></i> Attività
-                            </button>
-                            ` : ''}
-                            <button class="btn btn-danger btn-sm" onclick="deleteRaceConfirm(${raceId})" title="Elimina gara">
-                                <i class="bi bi-trash"></i>
-                            </button>
-                        </div>
-                    </td>
-                </tr>
-            `;
-
-            // Stage rows (hidden by default if multi-stage)
-            if (isMultiStage) {
-                for (const stage of stages) {
-                    const stageDate = stage.stage_date ? formatDate(stage.stage_date) : '—';
-                    tableHtml += `
-                        <tr class="stage-row" data-race-id="${raceId}" style="display:none; background: #f9f9f9;">
-                            <td style="padding-left: 50px;"></td>
-                            <td>—</td>
-                            <td><em>Tappa ${stage.stage_number}</em></td>
-                            <td>${stageDate}</td>
-                            <td>${stage.distance_km ? formatNumber(stage.distance_km, 1) : '-'}</td>
-                            <td>—</td>
-                            <td>—</td>
-                            <td>${stage.elevation_m ? formatNumber(stage.elevation_m, 0) : '-'}</td>
-                            <td>—</td>
-                            <td>—</td>
-                            <td>
-                                <div style="display:flex; gap:4px; align-items:center; flex-wrap:nowrap;">
-                                    <button class="btn btn-secondary btn-sm" onclick="viewRaceDetails(${raceId})" title="Visualizza dettagli">
-                                        <i class="bi bi-eye"></i> Dettagli
-                                    </button>
-                                    <button class="btn btn-warning btn-sm" onclick="window.openRaceActivitySelector(${raceId}, ${stage.stage_number})" title="Seleziona attività Intervals">
-                                        <i class="bi bi-target"></i> Attività
-                                    </button>
-                                    <button class="btn btn-danger btn-sm" onclick="deleteRaceConfirm(${raceId})" title="Elimina gara">
-                                        <i class="bi bi-trash"></i>
-                                    </button>
-                                </div>
-                            </td>
-                        </tr>
-                    `;
-                }
-            }
-        }
+        tableHtml += page.items.map(buildRaceRowHtml).join('');
 
         tableHtml += `
                 </tbody>
@@ -254,6 +262,7 @@ window.renderRacesPage = async function() {
         `;
 
         document.getElementById('races-table').innerHTML = tableHtml;
+        renderRacesLoadMore();
 
     } catch (error) {
         showToast('Errore nel caricamento delle gare', 'error');
@@ -263,12 +272,57 @@ window.renderRacesPage = async function() {
     }
 };
 
+/**
+ * Show the "load more" button while the race calendar has further pages
+ */
+function renderRacesLoadMore() {
+    const container = document.getElementById('races-load-more');
+    if (!container) return;
+    container.innerHTML = window.racesNextCursor
+        ? `<button class="btn btn-secondary btn-sm" onclick="window.loadMoreRaces()">Carica altre gare</button>`
+        : '';
+}
+
+/**
+ * Append the next page of race summaries to the table
+ */
+window.loadMoreRaces = async function() {
+    if (!window.racesNextCursor) return;
+    try {
+        showLoading();
+        const page = await api.getRaceSummaries({ limit: 200, cursor: window.racesNextCursor });
+        window.racesNextCursor = page.next_cursor;
+        document.getElementById('races-tbody')
+            ?.insertAdjacentHTML('beforeend', page.items.map(buildRaceRowHtml).join(''));
+        renderRacesLoadMore();
+    } catch (error) {
+        showToast('Errore nel caricamento delle gare', 'error');
+        console.error(error);
+    } finally {
+        hideLoading();
+    }
+};
+
 /**
  * Toggle visibility of stage rows for multi-stage races
  */
-window.toggleStages = function(raceId) {
-    const stageRows = document.querySelectorAll(`tr.stage-row[data-race-id="${raceId}"]`);
-    const toggleBtn = document.querySelector(`tr.race-row[data-race-id="${raceId}"] .btn-expand`);
+window.toggleStages = async function(raceId) {
+    let stageRows = document.querySelectorAll(`tr.stage-row[data-race-id="${raceId}"]`);
+    const raceRow = document.querySelector(`tr.race-row[data-race-id="${raceId}"]`);
+    const toggleBtn = raceRow?.querySelector('.btn-expand');
+
+    // Le tappe non sono nel riepilogo: caricate alla prima apertura
+    if (!stageRows.length && raceRow) {
+        try {
+            const stages = await api.getStages(raceId);
+            raceRow.insertAdjacentHTML('afterend', buildStageRowsHtml(raceId, stages));
+            stageRows = document.querySelectorAll(`tr.stage-row[data-race-id="${raceId}"]`);
+        } catch (error) {
+            showToast('Errore nel caricamento delle tappe', 'error');
+            console.error(error);
+            return;
+        }
+    }
     
     if (!stageRows.length) return;
     
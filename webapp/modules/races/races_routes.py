@@ -3,13 +3,13 @@
 import re
 import requests
 from datetime import datetime
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from starlette.concurrency import run_in_threadpool
 from typing import Optional, List
 
-from shared.storage import get_storage
-from shared.intervals.client import IntervalsAPIClient
+from shared.storage import get_async_storage
+from shared.intervals.async_client import AsyncIntervalsAPIClient
 
 router = APIRouter()
 
@@ -296,15 +296,48 @@ async def load_from_bonvi(data: BonviRaceLink):
 
 
 @router.get("/")
-async def get_races():
-    """Get all races"""
-    return get_storage().list_races()
+async def get_races(since: Optional[int] = None):
+    """Get all races.
+
+    With since=<version> returns only the changes after that version:
+    {"version", "upserts", "deletes"} (since=0 returns every race).
+    """
+    storage = get_async_storage()
+    if since is not None:
+        try:
+            return await storage.list_changes("race", since)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return await storage.list_races()
+
+
+@router.get("/summary")
+async def get_race_summaries(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: Optional[int] = Query(100, le=500),
+    cursor: Optional[str] = None
+):
+    """Lightweight race calendar: race columns plus athlete/stage/activity counts.
+
+    Paginated: pass next_cursor back as cursor to fetch the following page.
+    Full details (athletes, stages) come from GET /{race_id}.
+    """
+    try:
+        return await get_async_storage().list_race_summaries(
+            date_from=date_from,
+            date_to=date_to,
+            limit=limit or 100,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/{race_id}")
 async def get_race(race_id: int):
     """Get a specific race by ID"""
-    race = get_storage().get_race(race_id)
+    race = await get_async_storage().get_race(race_id)
     if not race:
         raise HTTPException(status_code=404, detail="Race not found")
     return race
@@ -314,8 +347,8 @@ async def get_race(race_id: int):
 async def create_race(race: RaceCreate):
     """Create a new race"""
     try:
-        storage = get_storage()
-        race_id = storage.add_race(
+        storage = get_async_storage()
+        race_id = await storage.add_race(
             name=race.name,
             race_date_start=race.race_date_start,
             race_date_end=race.race_date_end,
@@ -339,7 +372,7 @@ async def create_race(race: RaceCreate):
             update_data = [{"stage_number": i + 1, "route_link": link} for i, link in enumerate(race.stage_links)]
 
         if update_data:
-            created_race = storage.get_race(race_id)
+            created_race = await storage.get_race(race_id)
             stages = created_race.get('stages', []) if isinstance(created_race, dict) else []
             stages_by_num = {s['stage_number']: s for s in stages}
 
@@ -347,7 +380,7 @@ async def create_race(race: RaceCreate):
                 stage_num = sd.get('stage_number')
                 matched = stages_by_num.get(stage_num)
                 if matched:
-                    storage.update_stage(
+                    await storage.update_stage(
                         stage_id=matched['id'],
                         distance_km=sd.get('distance_km'),
                         elevation_m=sd.get('elevation_m'),
@@ -356,7 +389,7 @@ async def create_race(race: RaceCreate):
                         avg_speed_kmh=sd.get('avg_speed_kmh'),
                     )
 
-        return storage.get_race(race_id)
+        return await storage.get_race(race_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -364,12 +397,12 @@ async def create_race(race: RaceCreate):
 @router.put("/{race_id}")
 async def update_race(race_id: int, race: RaceCreate):
     """Update an existing race"""
-    storage = get_storage()
-    if not storage.get_race(race_id):
+    storage = get_async_storage()
+    if not await storage.get_race(race_id):
         raise HTTPException(status_code=404, detail="Race not found")
 
     try:
-        storage.update_race(
+        await storage.update_race(
             race_id=race_id,
             name=race.name,
             race_date_start=race.race_date_start,
@@ -386,7 +419,7 @@ async def update_race(race_id: int, race: RaceCreate):
             route_link=race.route_link,
             notes=race.notes
         )
-        return storage.get_race(race_id)
+        return await storage.get_race(race_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -394,12 +427,12 @@ async def update_race(race_id: int, race: RaceCreate):
 @router.delete("/{race_id}")
 async def delete_race(race_id: int):
     """Delete a race"""
-    storage = get_storage()
-    if not storage.get_race(race_id):
+    storage = get_async_storage()
+    if not await storage.get_race(race_id):
         raise HTTPException(status_code=404, detail="Race not found")
 
     try:
-        storage.delete_race(race_id)
+        await storage.delete_race(race_id)
         return {"message": "Race deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -408,14 +441,14 @@ async def delete_race(race_id: int):
 @router.post("/{race_id}/athletes")
 async def add_athlete_to_race(race_id: int, athlete_data: RaceAthleteAdd):
     """Add an athlete to a race"""
-    storage = get_storage()
-    if not storage.get_race(race_id):
+    storage = get_async_storage()
+    if not await storage.get_race(race_id):
         raise HTTPException(status_code=404, detail="Race not found")
-    if not storage.get_athlete(athlete_data.athlete_id):
+    if not await storage.get_athlete(athlete_data.athlete_id):
         raise HTTPException(status_code=404, detail="Athlete not found")
 
     try:
-        storage.add_athlete_to_race(
+        await storage.add_athlete_to_race(
             race_id=race_id,
             athlete_id=athlete_data.athlete_id,
             kj_per_hour_per_kg=athlete_data.kj_per_hour_per_kg,
@@ -429,14 +462,14 @@ async def add_athlete_to_race(race_id: int, athlete_data: RaceAthleteAdd):
 @router.put("/{race_id}/athletes/{athlete_id}")
 async def update_athlete_in_race(race_id: int, athlete_id: int, athlete_data: RaceAthleteAdd):
     """Update athlete's objective and kJ value in a race"""
-    storage = get_storage()
-    race = storage.get_race(race_id)
+    storage = get_async_storage()
+    race = await storage.get_race(race_id)
     if not race:
         raise HTTPException(status_code=404, detail="Race not found")
     
     try:
         # Update the athlete's objective and kJ value using the proper storage method
-        success = storage.update_race_athlete(
+        success = await storage.update_race_athlete(
             race_id=race_id,
             athlete_id=athlete_id,
             objective=athlete_data.objective,
@@ -455,7 +488,7 @@ async def update_athlete_in_race(race_id: int, athlete_id: int, athlete_data: Ra
 async def remove_athlete_from_race(race_id: int, athlete_id: int):
     """Remove an athlete from a race"""
     try:
-        get_storage().remove_athlete_from_race(race_id, athlete_id)
+        await get_async_storage().remove_athlete_from_race(race_id, athlete_id)
         return {"message": "Athlete removed from race successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -464,7 +497,7 @@ async def remove_athlete_from_race(race_id: int, athlete_id: int):
 @router.get("/{race_id}/athletes")
 async def get_race_athletes(race_id: int):
     """Get all athletes for a race"""
-    race = get_storage().get_race(race_id)
+    race = await get_async_storage().get_race(race_id)
     if not race:
         raise HTTPException(status_code=404, detail="Race not found")
     return race.get('athletes', [])
@@ -475,13 +508,13 @@ async def get_race_athletes(race_id: int):
 @router.get("/{race_id}/stages")
 async def get_race_stages(race_id: int):
     """Get all stages for a race"""
-    storage = get_storage()
-    race = storage.get_race(race_id)
+    storage = get_async_storage()
+    race = await storage.get_race(race_id)
     if not race:
         raise HTTPException(status_code=404, detail="Race not found")
     
     try:
-        stages = storage.get_stages(race_id)
+        stages = await storage.get_stages(race_id)
         response = []
         for stage in stages:
             response.append(stage.to_dict() if hasattr(stage, 'to_dict') else stage)  # type: ignore[union-attr]
@@ -493,13 +526,13 @@ async def get_race_stages(race_id: int):
 @router.get("/{race_id}/stages/{stage_id}")
 async def get_stage(race_id: int, stage_id: int):
     """Get a specific stage by ID"""
-    storage = get_storage()
-    race = storage.get_race(race_id)
+    storage = get_async_storage()
+    race = await storage.get_race(race_id)
     if not race:
         raise HTTPException(status_code=404, detail="Race not found")
     
     try:
-        stage = storage.get_stage(stage_id)
+        stage = await storage.get_stage(stage_id)
         if not stage:
             raise HTTPException(status_code=404, detail="Stage not found")
         return stage.to_dict() if hasattr(stage, 'to_dict') else stage  # type: ignore[union-attr]
@@ -510,18 +543,18 @@ async def get_stage(race_id: int, stage_id: int):
 @router.post("/{race_id}/stages")
 async def create_stage(race_id: int, stage: StageCreate):
     """Create a new stage for a race"""
-    storage = get_storage()
-    race = storage.get_race(race_id)
+    storage = get_async_storage()
+    race = await storage.get_race(race_id)
     if not race:
         raise HTTPException(status_code=404, detail="Race not found")
     
     try:
         # Get current number of stages to determine next stage number
-        current_stages = storage.get_stages(race_id)
+        current_stages = await storage.get_stages(race_id)
         stage_number = len(current_stages) + 1
         
         # Add the new stage
-        stage_id = storage.add_stage(
+        stage_id = await storage.add_stage(
             race_id=race_id,
             stage_number=stage_number,
             distance_km=stage.distance_km,
@@ -533,7 +566,7 @@ async def create_stage(race_id: int, stage: StageCreate):
         
         if stage_id is None:
             raise HTTPException(status_code=500, detail="Failed to create stage")
-        new_stage = storage.get_stage(stage_id)
+        new_stage = await storage.get_stage(stage_id)
         return new_stage.to_dict() if hasattr(new_stage, 'to_dict') else new_stage  # type: ignore[union-attr]
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -542,18 +575,18 @@ async def create_stage(race_id: int, stage: StageCreate):
 @router.put("/{race_id}/stages/{stage_id}")
 async def update_stage(race_id: int, stage_id: int, stage: StageUpdate):
     """Update a specific stage"""
-    storage = get_storage()
-    race = storage.get_race(race_id)
+    storage = get_async_storage()
+    race = await storage.get_race(race_id)
     if not race:
         raise HTTPException(status_code=404, detail="Race not found")
     
     try:
-        existing_stage = storage.get_stage(stage_id)
+        existing_stage = await storage.get_stage(stage_id)
         if not existing_stage:
             raise HTTPException(status_code=404, detail="Stage not found")
         
         # Update the stage with provided data
-        storage.update_stage(
+        await storage.update_stage(
             stage_id=stage_id,
             distance_km=stage.distance_km,
             elevation_m=stage.elevation_m,
@@ -564,7 +597,7 @@ async def update_stage(race_id: int, stage_id: int, stage: StageUpdate):
             avg_speed_kmh=stage.avg_speed_kmh
         )
         
-        updated_stage = storage.get_stage(stage_id)
+        updated_stage = await storage.get_stage(stage_id)
         return updated_stage.to_dict() if hasattr(updated_stage, 'to_dict') else updated_stage  # type: ignore[union-attr]
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -573,17 +606,17 @@ async def update_stage(race_id: int, stage_id: int, stage: StageUpdate):
 @router.delete("/{race_id}/stages/{stage_id}")
 async def delete_stage(race_id: int, stage_id: int):
     """Delete a specific stage"""
-    storage = get_storage()
-    race = storage.get_race(race_id)
+    storage = get_async_storage()
+    race = await storage.get_race(race_id)
     if not race:
         raise HTTPException(status_code=404, detail="Race not found")
     
     try:
-        stage = storage.get_stage(stage_id)
+        stage = await storage.get_stage(stage_id)
         if not stage:
             raise HTTPException(status_code=404, detail="Stage not found")
         
-        storage.delete_stage(stage_id)
+        await storage.delete_stage(stage_id)
         return {"message": "Stage deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -600,8 +633,8 @@ async def get_candidate_activities(race_id: int):
     - Auto-matched: activity name ≈ race name (99.9% match)
     - Candidates: all activities from that day for manual selection
     """
-    storage = get_storage()
-    race = storage.get_race(race_id)
+    storage = get_async_storage()
+    race = await storage.get_race(race_id)
     if not race:
         raise HTTPException(status_code=404, detail="Race not found")
     
@@ -621,7 +654,7 @@ async def get_candidate_activities(race_id: int):
         
         for ra in race_athletes:
             athlete_id = ra.get('id')
-            athlete = storage.get_athlete(athlete_id)
+            athlete = await storage.get_athlete(athlete_id)
             
             if not athlete or not athlete.get('api_key'):
                 results[athlete_id] = {
@@ -632,14 +665,13 @@ async def get_candidate_activities(race_id: int):
             
             try:
                 # Fetch activities from Intervals for race day
-                client = IntervalsAPIClient(api_key=athlete['api_key'])
+                client = AsyncIntervalsAPIClient(api_key=athlete['api_key'])
                 
                 # Get activities for the race day (allow range for multi-day races)
                 oldest = race_date_start  # YYYY-MM-DD
                 newest = race.get('race_date_end', race_date_start)
                 
-                activities = await run_in_threadpool(
-                    client.get_activities,
+                activities = await client.get_activities(
                     athlete_id='0',  # Current user (authenticated by API key)
                     oldest=oldest,
                     newest=newest
@@ -724,18 +756,18 @@ async def link_activity(race_id: int, request: LinkActivityRequest):
     Stores the mapping: race_id + athlete_id → intervals_activity_id
     The activity is fetched from Intervals on-demand when needed.
     """
-    storage = get_storage()
-    race = storage.get_race(race_id)
+    storage = get_async_storage()
+    race = await storage.get_race(race_id)
     if not race:
         raise HTTPException(status_code=404, detail="Race not found")
     
-    athlete = storage.get_athlete(request.athlete_id)
+    athlete = await storage.get_athlete(request.athlete_id)
     if not athlete:
         raise HTTPException(status_code=404, detail="Athlete not found")
     
     try:
         # Insert or update the race_activity link
-        success = storage.link_race_activity(
+        success = await storage.link_race_activity(
             race_id=race_id,
             athlete_id=request.athlete_id,
             intervals_activity_id=request.intervals_activity_id,
@@ -762,17 +794,17 @@ async def get_linked_activity(race_id: int, athlete_id: int):
     
     Returns the stored link info (race_name, intervals_activity_id).
     """
-    storage = get_storage()
-    race = storage.get_race(race_id)
+    storage = get_async_storage()
+    race = await storage.get_race(race_id)
     if not race:
         raise HTTPException(status_code=404, detail="Race not found")
     
-    athlete = storage.get_athlete(athlete_id)
+    athlete = await storage.get_athlete(athlete_id)
     if not athlete:
         raise HTTPException(status_code=404, detail="Athlete not found")
     
     try:
-        link = storage.get_race_activity(race_id, athlete_id)
+        link = await storage.get_race_activity(race_id, athlete_id)
         if not link:
             return {"linked": False, "message": "No activity linked for this athlete"}
         
@@ -793,13 +825,13 @@ async def unlink_activity(race_id: int, athlete_id: int):
     """
     Remove the linked activity for a race athlete.
     """
-    storage = get_storage()
-    race = storage.get_race(race_id)
+    storage = get_async_storage()
+    race = await storage.get_race(race_id)
     if not race:
         raise HTTPException(status_code=404, detail="Race not found")
     
     try:
-        storage.unlink_race_activity(race_id, athlete_id)
+        await storage.unlink_race_activity(race_id, athlete_id)
         return {"message": "Activity unlinked successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error unlinking activity: {str(e)}")
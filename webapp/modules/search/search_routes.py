@@ -0,0 +1,25 @@
+"""Search API Routes"""
+
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
+
+from shared.storage import get_async_storage
+
+router = APIRouter()
+
+
+@router.get("/")
+async def search(
+    q: str,
+    types: Optional[List[str]] = Query(None),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Full-text search over activities, races and athletes.
+
+    Every word of q is matched as a prefix; results are ranked best first.
+    Repeat types (?types=activity&types=race) to restrict the sources.
+    """
+    try:
+        return await get_async_storage().search(q, types=types, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -3,14 +3,16 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
+import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from urllib.parse import urlparse
 
+from shared.config import get_sync_overlap_days
 from shared.intervals.sync import IntervalsSyncService
-from shared.intervals.client import IntervalsAPIClient
-from shared.storage import get_storage
+from shared.intervals.async_client import AsyncIntervalsAPIClient
+from shared.storage import get_async_storage
 
 router = APIRouter()
 
@@ -40,12 +42,14 @@ class SyncRequest(BaseModel):
     api_key: str
     days_back: int = 30
     include_intervals: bool = True
+    incremental: bool = False  # solo dall'ultima data vista (meno overlap), entro days_back
 
 
 class WellnessSyncRequest(BaseModel):
     athlete_id: int
     api_key: str
     days_back: int = 30
+    incremental: bool = False
 
 
 class PushRaceRequest(BaseModel):
@@ -53,21 +57,51 @@ class PushRaceRequest(BaseModel):
     athlete_ids: Optional[list[int]] = None  # if None → push to all enrolled athletes
 
 
+def _incremental_oldest(state: Optional[dict], newest_column: str, days_back: int) -> Optional[str]:
+    """Start date of an incremental sync: newest date seen minus the overlap, never before days_back.
+
+    None (no cursor yet) means a full days_back sync.
+    """
+    newest = state.get(newest_column) if state else None
+    if not newest:
+        return None
+    oldest = date.fromisoformat(newest[:10]) - timedelta(days=get_sync_overlap_days())
+    return max(oldest, date.today() - timedelta(days=days_back)).isoformat()
+
+
+def _synced_through(dates: List[str], incomplete: List[Optional[str]]) -> Optional[str]:
+    """Newest date the cursor can move to: every activity up to it was stored with its details.
+
+    incomplete holds the dates of the activities dropped or saved without details;
+    None if one of them has no date or nothing is older than the first of them.
+    """
+    if any(not activity_date for activity_date in incomplete):
+        return None
+    limit = min(incomplete, default=None)
+    return max((d for d in dates if limit is None or d < limit), default=None)
+
+
+async def _connect(api_key: str) -> AsyncIntervalsAPIClient:
+    """Async client for the key, verified with a get_athlete() call (401 if it fails)."""
+    client = AsyncIntervalsAPIClient(api_key=api_key)
+    try:
+        await client.get_athlete()
+    except Exception as e:
+        logger.error(f"❌ Errore connessione Intervals.icu: {e}")
+        raise HTTPException(status_code=401, detail="Not connected to Intervals.icu")
+    return client
+
+
 @router.post("/test-connection")
 async def test_connection(request: APIKeyRequest):
     """Test connection to Intervals.icu"""
     try:
-        sync_service = IntervalsSyncService(api_key=request.api_key)
-        if sync_service.is_connected():
-            assert sync_service.client is not None
-            athlete_data = sync_service.client.get_athlete()
-            return {
-                "success": True,
-                "message": "Connection successful",
-                "athlete_name": f"{athlete_data.get('name', 'Unknown')}"
-            }
-        else:
-            raise HTTPException(status_code=401, detail="Connection failed")
+        athlete_data = await AsyncIntervalsAPIClient(api_key=request.api_key).get_athlete()
+        return {
+            "success": True,
+            "message": "Connection successful",
+            "athlete_name": f"{athlete_data.get('name', 'Unknown')}"
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -78,57 +112,87 @@ async def test_connection(request: APIKeyRequest):
 async def sync_activities(request: SyncRequest):
     """Sync activities from Intervals.icu"""
     try:
-        storage = get_storage()
-        sync_service = IntervalsSyncService(api_key=request.api_key)
-
-        if not sync_service.is_connected():
-            raise HTTPException(status_code=401, detail="Not connected to Intervals.icu")
-
-        activities, message = sync_service.fetch_activities(
+        storage = get_async_storage()
+        client = await _connect(request.api_key)
+
+        oldest = None
+        if request.incremental:
+            state = await storage.get_sync_state(request.athlete_id)
+            oldest = _incremental_oldest(state, "newest_activity_date", request.days_back)
+        mode = "incremental" if oldest else "full"
+
+        # Le attività già salvate e invariate non richiedono il download dei dettagli;
+        # servono solo quelle della finestra scaricata
+        window_start = oldest or (date.today() - timedelta(days=request.days_back)).isoformat()
+        stored_summaries = await storage.intervals_activity_summaries(request.athlete_id, window_start)
+        details = {}
+        activities, message = await IntervalsSyncService.fetch_activities_async(
+            client,
             days_back=request.days_back,
-            include_intervals=request.include_intervals
+            include_intervals=request.include_intervals,
+            stored_summaries=stored_summaries,
+            oldest=oldest,
+            details=details
         )
 
         if not activities:
-            return {"success": True, "message": message, "imported": 0}
+            if not message.startswith("❌"):
+                # Nessuna attività nuova: il sync è comunque riuscito
+                await storage.record_sync(request.athlete_id, "activities")
+            return {"success": True, "message": message, "imported": 0, "mode": mode, "oldest": oldest}
 
-        imported_count = 0
-        skipped_count = 0
+        rows = []
+        incomplete = []  # date delle attività scartate o salvate senza dettagli
         for activity in activities:
             try:
                 formatted = IntervalsSyncService.format_activity_for_storage(activity)
-                activity_id, is_new = storage.add_activity(
-                    athlete_id=request.athlete_id,
-                    title=formatted['name'],
-                    activity_date=formatted['start_date'],
-                    activity_type=formatted.get('type'),
-                    duration_minutes=formatted.get('moving_time_minutes'),
-                    distance_km=formatted.get('distance_km'),
-                    tss=formatted.get('training_load'),
-                    source='intervals',
-                    intervals_id=formatted.get('intervals_id'),
-                    avg_watts=formatted.get('avg_watts'),
-                    normalized_watts=formatted.get('normalized_watts'),
-                    avg_hr=formatted.get('avg_hr'),
-                    max_hr=formatted.get('max_hr'),
-                    training_load=formatted.get('training_load'),
-                    intensity=formatted.get('intensity'),
-                    feel=formatted.get('feel')
-                )
-                if is_new:
-                    imported_count += 1
-                else:
-                    skipped_count += 1
+                if not formatted.get('start_date'):
+                    raise ValueError(f"missing start date for activity {formatted.get('intervals_id')}")
+                rows.append({
+                    'title': formatted['name'],
+                    'activity_date': formatted['start_date'],
+                    'activity_type': formatted.get('type'),
+                    'duration_minutes': formatted.get('moving_time_minutes'),
+                    'distance_km': formatted.get('distance_km'),
+                    'tss': formatted.get('training_load'),
+                    'source': 'intervals',
+                    'intervals_id': formatted.get('intervals_id'),
+                    'avg_watts': formatted.get('avg_watts'),
+                    'normalized_watts': formatted.get('normalized_watts'),
+                    'avg_hr': formatted.get('avg_hr'),
+                    'max_hr': formatted.get('max_hr'),
+                    'training_load': formatted.get('training_load'),
+                    'intensity': formatted.get('intensity'),
+                    'feel': formatted.get('feel'),
+                    'tags': formatted.get('tags'),
+                    # Solo i dettagli scaricati: senza payload il prossimo sync li riscarica
+                    'intervals_payload': activity if details.get(str(formatted.get('intervals_id'))) else None,
+                })
+                if details.get(str(formatted.get('intervals_id'))) is False:
+                    incomplete.append(formatted['start_date'])
             except Exception as e:
                 logger.warning(f"Error importing activity: {e}")
+                incomplete.append(activity.get('start_date_local'))
                 continue
 
+        # Un'unica transazione per tutto il batch invece di un commit per attività
+        results = await storage.upsert_activities(request.athlete_id, rows)
+        imported_count = sum(1 for _, is_new in results if is_new)
+        skipped_count = len(results) - imported_count
+        # Il cursore non supera le attività mancanti: il prossimo sync incrementale le rilegge
+        newest = _synced_through([row['activity_date'] for row in rows], incomplete)
+        if newest or not incomplete:
+            await storage.record_sync(request.athlete_id, "activities", newest)
+
         return {
             "success": True,
             "message": f"Imported {imported_count} activities, skipped {skipped_count} duplicates",
             "imported": imported_count,
             "skipped": skipped_count,
-            "total": len(activities)
+            "incomplete": len(incomplete),
+            "total": len(activities),
+            "mode": mode,
+            "oldest": oldest
         }
     except HTTPException:
         raise
@@ -140,63 +204,66 @@ async def sync_activities(request: SyncRequest):
 async def sync_wellness(request: WellnessSyncRequest):
     """Sync wellness data from Intervals.icu"""
     try:
-        storage = get_storage()
-        sync_service = IntervalsSyncService(api_key=request.api_key)
-
-        if not sync_service.is_connected():
-            raise HTTPException(status_code=401, detail="Not connected to Intervals.icu")
-
-        assert sync_service.client is not None
-        wellness_data = sync_service.client.get_wellness(days_back=request.days_back)
+        storage = get_async_storage()
+        client = await _connect(request.api_key)
+        oldest = None
+        if request.incremental:
+            state = await storage.get_sync_state(request.athlete_id)
+            oldest = _incremental_oldest(state, "newest_wellness_date", request.days_back)
+        mode = "incremental" if oldest else "full"
+        wellness_data = await client.get_wellness(oldest=oldest, days_back=request.days_back)
 
         if not wellness_data:
-            return {"success": True, "message": "No wellness data found", "imported": 0}
+            await storage.record_sync(request.athlete_id, "wellness")
+            return {"success": True, "message": "No wellness data found", "imported": 0, "mode": mode, "oldest": oldest}
 
-        imported_count = 0
+        entries = []
         for entry in wellness_data:
-            try:
-                wellness_date = entry.get('id')
-                if not wellness_date:
-                    continue
-                storage.add_wellness(
-                    athlete_id=request.athlete_id,
-                    wellness_date=str(wellness_date),
-                    weight_kg=entry.get('weight'),
-                    resting_hr=entry.get('restingHR'),
-                    hrv=entry.get('hrv'),
-                    steps=entry.get('steps'),
-                    soreness=entry.get('soreness'),
-                    fatigue=entry.get('fatigue'),
-                    stress=entry.get('stress'),
-                    mood=entry.get('mood'),
-                    motivation=entry.get('motivation'),
-                    injury=entry.get('injury'),
-                    kcal=entry.get('kcalConsumed'),
-                    sleep_secs=entry.get('sleepSecs'),
-                    sleep_score=entry.get('sleepScore'),
-                    sleep_quality=entry.get('sleepQuality'),
-                    avg_sleeping_hr=entry.get('avgSleepingHR'),
-                    menstruation=None,
-                    menstrual_cycle_phase=entry.get('menstrualPhase'),
-                    body_fat=entry.get('bodyFat'),
-                    respiration=entry.get('respiration'),
-                    spO2=entry.get('spO2'),
-                    readiness=entry.get('readiness'),
-                    ctl=entry.get('ctl'),
-                    atl=entry.get('atl'),
-                    ramp_rate=entry.get('rampRate'),
-                    comments=entry.get('comments')
-                )
-                imported_count += 1
-            except Exception as e:
-                logger.warning(f"Error importing wellness entry: {e}")
+            # Date e tipi dei campi li valida upsert_wellness, scartando solo le voci non valide
+            wellness_date = entry.get('id') if isinstance(entry, dict) else None
+            if not wellness_date:
                 continue
+            entries.append({
+                'wellness_date': str(wellness_date),
+                'weight_kg': entry.get('weight'),
+                'resting_hr': entry.get('restingHR'),
+                'hrv': entry.get('hrv'),
+                'steps': entry.get('steps'),
+                'soreness': entry.get('soreness'),
+                'fatigue': entry.get('fatigue'),
+                'stress': entry.get('stress'),
+                'mood': entry.get('mood'),
+                'motivation': entry.get('motivation'),
+                'injury': entry.get('injury'),
+                'kcal': entry.get('kcalConsumed'),
+                'sleep_secs': entry.get('sleepSecs'),
+                'sleep_score': entry.get('sleepScore'),
+                'sleep_quality': entry.get('sleepQuality'),
+                'avg_sleeping_hr': entry.get('avgSleepingHR'),
+                'menstruation': None,
+                'menstrual_cycle_phase': entry.get('menstrualPhase'),
+                'body_fat': entry.get('bodyFat'),
+                'respiration': entry.get('respiration'),
+                'spO2': entry.get('spO2'),
+                'readiness': entry.get('readiness'),
+                'ctl': entry.get('ctl'),
+                'atl': entry.get('atl'),
+                'ramp_rate': entry.get('rampRate'),
+                'comments': entry.get('comments'),
+            })
+
+        # Tutti i giorni in un solo statement/transazione (merge dei campi non nulli)
+        # Il cursore avanza fino all'ultimo giorno scritto: le voci scartate non contano
+        imported_count, newest_written = await storage.upsert_wellness(request.athlete_id, entries)
+        await storage.record_sync(request.athlete_id, "wellness", newest_written)
 
         return {
             "success": True,
             "message": f"Imported {imported_count} wellness entries",
             "imported": imported_count,
-            "total_found": len(wellness_data)
+            "total_found": len(wellness_data),
+            "mode": mode,
+            "oldest": oldest
         }
     except HTTPException:
         raise
@@ -204,11 +271,17 @@ async def sync_wellness(request: WellnessSyncRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.get("/state/{athlete_id}")
+async def get_sync_state(athlete_id: int):
+    """Incremental sync cursors of an athlete (null before the first recorded sync)"""
+    return await get_async_storage().get_sync_state(athlete_id)
+
+
 @router.post("/athlete-metrics")
 async def sync_athlete_metrics(request: SyncRequest):
     """Sync athlete metrics (weight, FTP, W', height, eCP, eW', HR max, gender, birth_date) from Intervals.icu"""
     try:
-        storage = get_storage()
+        storage = get_async_storage()
         api_key = request.api_key
 
         if not api_key or not api_key.strip():
@@ -216,10 +289,10 @@ async def sync_athlete_metrics(request: SyncRequest):
 
         logger.info(f"[SYNC] Starting athlete metrics sync for athlete_id={request.athlete_id}")
 
-        client = IntervalsAPIClient(api_key=api_key)
+        client = AsyncIntervalsAPIClient(api_key=api_key)
 
         try:
-            athlete_data = client.get_athlete()
+            athlete_data = await client.get_athlete()
         except Exception as e:
             raise HTTPException(status_code=401, detail=f"Failed to connect to Intervals.icu: {str(e)}")
 
@@ -323,7 +396,7 @@ async def sync_athlete_metrics(request: SyncRequest):
         if not updates:
             return {"success": True, "message": "Nessun dato disponibile da sincronizzare", "synced_fields": {}}
 
-        storage.update_athlete(request.athlete_id, **updates)
+        await storage.update_athlete(request.athlete_id, **updates)
 
         return {
             "success": True,
@@ -341,10 +414,10 @@ async def sync_athlete_metrics(request: SyncRequest):
 async def push_race(request: PushRaceRequest):
     """Push a race to Intervals.icu as a planned event for all enrolled athletes using their own API keys"""
     try:
-        storage = get_storage()
+        storage = get_async_storage()
         logger.info(f"[PUSH-RACE] race_id={request.race_id}")
 
-        race = storage.get_race(request.race_id)
+        race = await storage.get_race(request.race_id)
         if not race:
             raise HTTPException(status_code=404, detail=f"Race not found (ID: {request.race_id})")
 
@@ -360,7 +433,7 @@ async def push_race(request: PushRaceRequest):
             # Skip if caller passed a selection and this athlete is not in it
             if request.athlete_ids is not None and athlete_id not in request.athlete_ids:
                 continue
-            athlete = storage.get_athlete(athlete_id)
+            athlete = await storage.get_athlete(athlete_id)
             if athlete and athlete.get('api_key'):
                 athletes_with_keys.append({
                     'data': athlete_data,
@@ -381,7 +454,7 @@ async def push_race(request: PushRaceRequest):
         
         if num_stages > 1:
             # Multi-stage race: push each stage as a separate event
-            stages = storage.get_stages(request.race_id)
+            stages = await storage.get_stages(request.race_id)
             for stage in stages:
                 stage_number = stage.get('stage_number', 1)
                 stage_name = f"{race_name} - T{stage_number}"
@@ -433,17 +506,14 @@ async def push_race(request: PushRaceRequest):
             mins = int(minutes % 60)
             return f"{hours}h {mins}m"
 
-        # Push all stages to each athlete with API key
-        pushed_count = 0
-        failed_athletes = []
-        
-        for athlete_info in athletes_with_keys:
+        # Push all stages to each athlete with API key (athletes in parallel, stages in order)
+        async def push_to_athlete(athlete_info: dict) -> Optional[str]:
             try:
                 athlete_id = athlete_info['data'].get('id')
                 athlete = athlete_info['profile']
                 api_key = athlete_info['api_key']
                 
-                client = IntervalsAPIClient(api_key=api_key)
+                client = AsyncIntervalsAPIClient(api_key=api_key)
 
                 # Use athlete's specific objective if set, otherwise use race default category
                 athlete_objective = athlete_info['data'].get('objective') or race_default_category
@@ -510,7 +580,7 @@ async def push_race(request: PushRaceRequest):
 
                     # Check for duplicate in this specific athlete's calendar and delete if found
                     try:
-                        existing_events = client.get_events(
+                        existing_events = await client.get_events(
                             athlete_id="0",
                             oldest=stage_date,
                             newest=stage_date,
@@ -523,7 +593,7 @@ async def push_race(request: PushRaceRequest):
                                 event_id = evt.get('id')
                                 if event_id:
                                     try:
-                                        client.delete_event(athlete_id="0", event_id=event_id)
+                                        await client.delete_event(athlete_id="0", event_id=event_id)
                                         logger.info(f"[PUSH-RACE] Deleted existing race '{stage_name}' (ID: {event_id}) for athlete {athlete_id}")
                                     except Exception as delete_err:
                                         logger.warning(f"Could not delete existing event {event_id}: {delete_err}")
@@ -531,7 +601,7 @@ async def push_race(request: PushRaceRequest):
                         logger.warning(f"Could not check for existing events for athlete {athlete_id}: {check_err}")
 
                     # Create event for this stage
-                    event = client.create_event(
+                    await client.create_event(
                         athlete_id="0",
                         category=intervals_category,
                         start_date_local=start_date_local,
@@ -543,13 +613,16 @@ async def push_race(request: PushRaceRequest):
                         moving_time=duration_seconds
                     )
 
-                pushed_count += 1
                 logger.info(f"[PUSH-RACE] Pushed {len(stages_to_push)} stage(s) to athlete {athlete_id}: {athlete.get('first_name')} {athlete.get('last_name')}")
+                return None
 
             except Exception as e:
                 athlete_id = athlete_info['data'].get('id')
-                failed_athletes.append(f"Athlete {athlete_id}: {str(e)}")
                 logger.error(f"[PUSH-RACE] Failed to push to athlete {athlete_id}: {e}")
+                return f"Athlete {athlete_id}: {str(e)}"
+
+        errors = await asyncio.gather(*(push_to_athlete(info) for info in athletes_with_keys))
+        failed_athletes = [error for error in errors if error]
 
         total_events = len(athletes_with_keys) * len(stages_to_push)
         return {
@@ -571,8 +644,10 @@ async def debug_list_races():
     """Debug endpoint to list all races in database"""
     try:
         from shared.storage import Race
-        storage = get_storage()
-        races = storage.session.query(Race.id, Race.name, Race.race_date_start).all()
+        storage = get_async_storage()
+        races = await storage.run(
+            lambda: storage.sync.session.query(Race.id, Race.name, Race.race_date_start).all()
+        )
         return {
             "total": len(races),
             "races": [{"id": r.id, "name": r.name, "date": r.race_date_start} for r in races]
@@ -585,8 +660,8 @@ async def debug_list_races():
 async def debug_athlete_data(api_key: str):
     """Debug endpoint to see raw athlete data from Intervals.icu"""
     try:
-        client = IntervalsAPIClient(api_key=api_key)
-        athlete_data = client.get_athlete()
+        client = AsyncIntervalsAPIClient(api_key=api_key)
+        athlete_data = await client.get_athlete()
         return {
             "gender_field_value": athlete_data.get('gender'),
             "sex_field_value": athlete_data.get('sex'),
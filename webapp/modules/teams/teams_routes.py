@@ -4,7 +4,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List
 
-from shared.storage import get_storage
+from shared.storage import get_async_storage
 
 router = APIRouter()
 
@@ -22,13 +22,13 @@ class TeamResponse(BaseModel):
 @router.get("/", response_model=List[TeamResponse])
 async def get_teams():
     """Get all teams"""
-    return get_storage().list_teams()
+    return await get_async_storage().list_teams()
 
 
 @router.get("/{team_id}", response_model=TeamResponse)
 async def get_team(team_id: int):
     """Get a specific team by ID"""
-    team = get_storage().get_team(team_id)
+    team = await get_async_storage().get_team(team_id)
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
     return team
@@ -38,10 +38,10 @@ async def get_team(team_id: int):
 async def create_team(team: TeamCreate):
     """Create a new team"""
     try:
-        storage = get_storage()
-        team_id = storage.add_team(name=team.name)
+        storage = get_async_storage()
+        team_id = await storage.add_team(name=team.name)
         # Recupera dal DB così created_at è quello reale
-        new_team = storage.get_team(team_id)
+        new_team = await storage.get_team(team_id)
         if not new_team:
             raise HTTPException(status_code=500, detail="Failed to retrieve created team")
         return new_team
@@ -54,14 +54,14 @@ async def create_team(team: TeamCreate):
 @router.put("/{team_id}", response_model=TeamResponse)
 async def update_team(team_id: int, team: TeamCreate):
     """Update an existing team"""
-    storage = get_storage()
-    existing_team = storage.get_team(team_id)
+    storage = get_async_storage()
+    existing_team = await storage.get_team(team_id)
     if not existing_team:
         raise HTTPException(status_code=404, detail="Team not found")
 
     try:
-        storage.update_team(team_id, name=team.name)
-        return storage.get_team(team_id)
+        await storage.update_team(team_id, name=team.name)
+        return await storage.get_team(team_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -69,12 +69,12 @@ async def update_team(team_id: int, team: TeamCreate):
 @router.delete("/{team_id}")
 async def delete_team(team_id: int):
     """Delete a team"""
-    storage = get_storage()
-    if not storage.get_team(team_id):
+    storage = get_async_storage()
+    if not await storage.get_team(team_id):
         raise HTTPException(status_code=404, detail="Team not found")
 
     try:
-        storage.delete_team(team_id)
+        await storage.delete_team(team_id)
         return {"message": "Team deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
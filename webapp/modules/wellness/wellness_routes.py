@@ -1,10 +1,11 @@
 """Wellness API Routes"""
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
-from shared.storage import get_storage
+from shared.responses import json_response
+from shared.storage import get_async_storage
 
 router = APIRouter()
 
@@ -40,22 +41,49 @@ class WellnessCreate(BaseModel):
 
 
 @router.get("/")
-async def get_wellness(athlete_id: Optional[int] = None, days_back: int = 30):
-    """Get wellness data, optionally filtered by athlete"""
-    storage = get_storage()
+async def get_wellness(
+    athlete_id: Optional[int] = None,
+    days_back: int = 30,
+    athlete_ids: Optional[List[int]] = Query(None),
+    team_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    fields: Optional[List[str]] = Query(None),
+    since: Optional[int] = None
+):
+    """Get wellness data, optionally filtered by athlete(s), team or category.
+
+    All athletes are read in a single query; fields=... restricts the returned
+    columns (id, athlete_id and wellness_date are always included).
+
+    With since=<version> returns only the changes after that version, whatever
+    their date: {"version", "upserts", "deletes"} (since=0 returns every record).
+    """
+    storage = get_async_storage()
     if athlete_id:
-        return storage.get_wellness(athlete_id, days_back=days_back)
-
-    wellness_data = []
-    for athlete in storage.list_athletes():
-        wellness_data.extend(storage.get_wellness(int(athlete['id']), days_back=days_back))
-    return wellness_data
+        athlete_ids = [athlete_id]
+    if since is not None:
+        try:
+            return json_response(await storage.list_changes(
+                "wellness", since, athlete_ids=athlete_ids, team_id=team_id, category_id=category_id
+            ))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return json_response(await storage.list_wellness(
+            athlete_ids=athlete_ids,
+            team_id=team_id,
+            category_id=category_id,
+            days_back=days_back,
+            fields=fields,
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/athlete/{athlete_id}/latest")
 async def get_latest_wellness(athlete_id: int):
     """Get the latest wellness entry for an athlete"""
-    wellness_data = get_storage().get_wellness(athlete_id, days_back=7)
+    wellness_data = await get_async_storage().get_wellness(athlete_id, days_back=7)
     if not wellness_data:
         raise HTTPException(status_code=404, detail="No wellness data found")
     return wellness_data[0]
@@ -64,7 +92,7 @@ async def get_latest_wellness(athlete_id: int):
 @router.get("/{wellness_id}")
 async def get_wellness_entry(wellness_id: int):
     """Get a specific wellness entry by ID"""
-    entry = get_storage().get_wellness_by_id(wellness_id)
+    entry = await get_async_storage().get_wellness_by_id(wellness_id)
     if not entry:
         raise HTTPException(status_code=404, detail="Wellness entry not found")
     return entry
@@ -74,8 +102,8 @@ async def get_wellness_entry(wellness_id: int):
 async def create_wellness_entry(wellness: WellnessCreate):
     """Create or update a wellness entry"""
     try:
-        storage = get_storage()
-        result = storage.add_wellness(
+        storage = get_async_storage()
+        result = await storage.add_wellness(
             athlete_id=wellness.athlete_id,
             wellness_date=wellness.wellness_date,
             weight_kg=wellness.weight_kg,
@@ -108,7 +136,7 @@ async def create_wellness_entry(wellness: WellnessCreate):
             raise HTTPException(status_code=400, detail="Failed to create wellness entry")
 
         # Restituisce il record appena creato/aggiornato
-        wellness_data = storage.get_wellness(wellness.athlete_id, days_back=7)
+        wellness_data = await storage.get_wellness(wellness.athlete_id, days_back=7)
         for entry in wellness_data:
             if entry.get('wellness_date') == wellness.wellness_date:
                 return entry
@@ -122,12 +150,12 @@ async def create_wellness_entry(wellness: WellnessCreate):
 @router.put("/{wellness_id}")
 async def update_wellness_entry(wellness_id: int, wellness: WellnessCreate):
     """Update a wellness entry"""
-    storage = get_storage()
-    if not storage.get_wellness_by_id(wellness_id):
+    storage = get_async_storage()
+    if not await storage.get_wellness_by_id(wellness_id):
         raise HTTPException(status_code=404, detail="Wellness entry not found")
 
     try:
-        result = storage.add_wellness(
+        result = await storage.add_wellness(
             athlete_id=wellness.athlete_id,
             wellness_date=wellness.wellness_date,
             weight_kg=wellness.weight_kg,
@@ -168,12 +196,12 @@ async def update_wellness_entry(wellness_id: int, wellness: WellnessCreate):
 @router.delete("/{wellness_id}")
 async def delete_wellness_entry(wellness_id: int):
     """Delete a wellness entry"""
-    storage = get_storage()
-    if not storage.get_wellness_by_id(wellness_id):
+    storage = get_async_storage()
+    if not await storage.get_wellness_by_id(wellness_id):
         raise HTTPException(status_code=404, detail="Wellness entry not found")
 
     try:
-        storage.delete_wellness(wellness_id)
+        await storage.delete_wellness(wellness_id)
         return {"message": "Wellness entry deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
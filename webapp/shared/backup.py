@@ -0,0 +1,127 @@
+# ===============================================================================
+# Copyright (c) 2026 Andrea Bonvicin - bFactor Project
+# PROPRIETARY LICENSE - TUTTI I DIRITTI RISERVATI
+# Sharing, distribution or reproduction is strictly prohibited.
+# La condivisione, distribuzione o riproduzione è severamente vietata.
+# ===============================================================================
+
+"""Online snapshots of the SQLite databases (sqlite3 backup API), compressed, with retention."""
+
+from __future__ import annotations
+
+import gzip
+import shutil
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+SNAPSHOT_PREFIX = "bteam-"
+_CHUNK_SIZE = 1024 * 1024
+
+
+def backup_database(source: Path, target: Path, pages: int = 1024, sleep: float = 0.005,
+                    timeout: float = 5.0) -> None:
+    """Consistent copy of a live SQLite file, `pages` pages per step.
+
+    Between steps the source is released for `sleep` seconds, so writers are
+    never blocked for more than one step. A write from another connection makes
+    SQLite restart the copy from a fresh read.
+    """
+    src = sqlite3.connect(source, timeout=timeout)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst, pages=pages, sleep=sleep)
+    finally:
+        dst.close()
+        src.close()
+
+
+def compress_file(source: Path) -> Path:
+    """Stream-compress source next to itself (zstd if available, else gzip) and delete it."""
+    if ZSTD_AVAILABLE:
+        target = source.with_name(source.name + ".zst")
+        with open(source, "rb") as fin, open(target, "wb") as fout:
+            with zstandard.ZstdCompressor(level=3).stream_writer(fout) as writer:
+                shutil.copyfileobj(fin, writer, _CHUNK_SIZE)
+    else:
+        target = source.with_name(source.name + ".gz")
+        with open(source, "rb") as fin, gzip.open(target, "wb", compresslevel=6) as fout:
+            shutil.copyfileobj(fin, fout, _CHUNK_SIZE)
+    source.unlink()
+    return target
+
+
+def create_snapshot(databases: Dict[str, Path], backup_dir: Path, keep: int = 7,
+                    pages: int = 1024, sleep: float = 0.005) -> Dict:
+    """Back up and compress every database into a new timestamped snapshot directory.
+
+    Args:
+        databases:  nome relativo nello snapshot (es. "archive/bteam_2024.db") -> file sorgente
+        keep:       snapshot da conservare, i più vecchi vengono eliminati
+
+    Returns:
+        The snapshot description (see list_snapshots) plus "pruned": [names]
+
+    Raises:
+        RuntimeError: if a snapshot with the same timestamp exists or is being written
+    """
+    name = SNAPSHOT_PREFIX + datetime.now().strftime("%Y%m%d-%H%M%S")
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    # Scrittura in una cartella temporanea rinominata alla fine: uno snapshot elencato è completo
+    partial = backup_dir / f".{name}.partial"
+    if (backup_dir / name).exists():
+        raise RuntimeError(f"Snapshot {name} already exists")
+    try:
+        partial.mkdir()
+    except FileExistsError:
+        raise RuntimeError(f"Snapshot {name} is already being written")
+    try:
+        for relative, source in databases.items():
+            target = partial / relative
+            target.parent.mkdir(parents=True, exist_ok=True)
+            backup_database(source, target, pages=pages, sleep=sleep)
+            compress_file(target)
+        partial.rename(backup_dir / name)
+    except Exception:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+
+    pruned = prune_snapshots(backup_dir, keep)
+    return {**_describe(backup_dir / name), "pruned": pruned}
+
+
+def list_snapshots(backup_dir: Path) -> List[Dict]:
+    """Completed snapshots, newest first."""
+    if not backup_dir.exists():
+        return []
+    snapshots = sorted(
+        (p for p in backup_dir.iterdir() if p.is_dir() and p.name.startswith(SNAPSHOT_PREFIX)),
+        key=lambda p: p.name, reverse=True,
+    )
+    return [_describe(p) for p in snapshots]
+
+
+def prune_snapshots(backup_dir: Path, keep: int) -> List[str]:
+    """Delete all but the newest `keep` snapshots (at least one is always kept)."""
+    pruned = []
+    for snapshot in list_snapshots(backup_dir)[max(keep, 1):]:
+        shutil.rmtree(backup_dir / snapshot["name"], ignore_errors=True)
+        pruned.append(snapshot["name"])
+    return pruned
+
+
+def _describe(snapshot: Path) -> Dict:
+    files = sorted(p for p in snapshot.rglob("*") if p.is_file())
+    return {
+        "name": snapshot.name,
+        "created_at": datetime.strptime(snapshot.name[len(SNAPSHOT_PREFIX):], "%Y%m%d-%H%M%S").isoformat(),
+        "size_bytes": sum(p.stat().st_size for p in files),
+        "files": [p.relative_to(snapshot).as_posix() for p in files],
+    }
@@ -8,6 +8,7 @@
 """Intervals.icu Integration Module"""
 
 from .client import IntervalsAPIClient, format_workout_description
+from .async_client import AsyncIntervalsAPIClient
 from .models import (
     Activity, Wellness, CalendarEvent, Athlete, 
     Interval, WorkoutStep, Folder, WorkoutLibrary,
@@ -17,6 +18,7 @@ from .sync import IntervalsSyncService
 
 __all__ = [
     'IntervalsAPIClient',
+    'AsyncIntervalsAPIClient',
     'format_workout_description',
     'Activity',
     'Wellness',
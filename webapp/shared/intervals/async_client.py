@@ -0,0 +1,450 @@
+# ===============================================================================
+# Copyright (c) 2026 Andrea Bonvicin - bFactor Project
+# PROPRIETARY LICENSE - TUTTI I DIRITTI RISERVATI
+# Sharing, distribution or reproduction is strictly prohibited.
+# La condivisione, distribuzione o riproduzione è severamente vietata.
+# ===============================================================================
+
+"""
+Client async per Intervals.icu (httpx), stessi metodi di IntervalsAPIClient
+Le richieste non bloccano l'event loop e passano da un semaforo che limita
+quante chiamate sono in volo contemporaneamente
+"""
+
+from __future__ import annotations
+
+import asyncio
+import weakref
+from datetime import date, datetime, timedelta
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import httpx
+
+from ..config import get_intervals_http_settings
+from .client import IntervalsAPIClient
+from .ratelimit import get_rate_limiter, limit_key, rewind_files
+
+# Un client httpx e un semaforo per event loop (non sono utilizzabili da loop diversi)
+_loop_state: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _shared_state() -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+    """Pooled AsyncClient and concurrency semaphore of the running event loop.
+
+    Like get_http_session() for the blocking client: connections are reused across
+    client instances and API keys, credentials travel per request and cookies are refused.
+    """
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None or state[0].is_closed:
+        settings = get_intervals_http_settings()
+        pool_size = int(settings["pool_maxsize"])
+        http = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                retries=int(settings["retries"]),  # solo errori di connessione
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            ),
+            timeout=settings["timeout"],
+            cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        )
+        state = (http, asyncio.Semaphore(int(settings["max_concurrency"])))
+        _loop_state[loop] = state
+    return state
+
+
+async def close_async_http_client() -> None:
+    """Close the pooled connections of the running event loop."""
+    state = _loop_state.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state[0].aclose()
+
+
+def _date_window(
+    oldest: Optional[Union[str, date, datetime]],
+    newest: Optional[Union[str, date, datetime]],
+    days: int,
+    anchor: Union[date, datetime],
+    forward: bool = False,
+) -> Dict[str, str]:
+    """oldest/newest params as IntervalsAPIClient computes them (days before newest, or after oldest)."""
+    coerce = IntervalsAPIClient._coerce_date_value
+    if forward:
+        oldest_dt = anchor if oldest is None else coerce(oldest)
+        newest_dt = oldest_dt + timedelta(days=days) if newest is None else coerce(newest)
+    else:
+        newest_dt = anchor if newest is None else coerce(newest)
+        oldest_dt = newest_dt - timedelta(days=days) if oldest is None else coerce(oldest)
+    return {'oldest': oldest_dt.strftime('%Y-%m-%d'), 'newest': newest_dt.strftime('%Y-%m-%d')}
+
+
+class AsyncIntervalsAPIClient:
+    """
+    Versione async di IntervalsAPIClient (stessa autenticazione, stessi metodi)
+
+    Esempio uso:
+        client = AsyncIntervalsAPIClient(api_key='your_key')
+        activities = await client.get_activities(days_back=7)
+
+    Le chiamate di tutti i client dello stesso worker condividono il pool di
+    connessioni e il semaforo (max_concurrency nel config "intervals_http").
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        access_token: Optional[str] = None,
+        base_url: str = 'https://intervals.icu'
+    ):
+        """
+        Inizializza il client
+
+        Args:
+            api_key: API key personale (da https://intervals.icu/settings)
+            access_token: Bearer token da OAuth
+            base_url: URL base dell'API (default: https://intervals.icu)
+        """
+        if not api_key and not access_token:
+            raise ValueError("Devi fornire api_key o access_token")
+
+        self.base_url = base_url
+        self.api_key = api_key
+        self.access_token = access_token
+        # Stesso rate limiter del client sincrono (bucket per API key + globale)
+        self.limit_key = limit_key(api_key, access_token)
+        self.throttled_seconds = 0.0
+
+        if access_token:
+            self.headers = {
+                'Authorization': f'Bearer {access_token}',
+                'Content-Type': 'application/json'
+            }
+            self.auth: Optional[tuple[str, str]] = None
+        else:
+            self.headers = {'Content-Type': 'application/json'}
+            self.auth = ('API_KEY', api_key) if api_key else None
+
+    async def _request(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict] = None,
+        json: Optional[Dict] = None,
+        data: Any = None,
+        files: Optional[Dict] = None
+    ) -> httpx.Response:
+        """
+        Esegue una richiesta HTTP gestendo errori
+
+        L'attesa del rate limiter e del backoff su 429/5xx avviene fuori dal
+        semaforo: una richiesta in pausa non occupa uno slot di concorrenza.
+
+        Raises:
+            httpx.HTTPStatusError: Per errori HTTP (4xx, 5xx)
+            httpx.ConnectError: Per errori di connessione
+            httpx.TimeoutException: Per timeout
+            httpx.RequestError: Per altri errori
+        """
+        url = f"{self.base_url}{endpoint}"
+
+        # Per upload file non usiamo Content-Type
+        headers = self.headers.copy()
+        if files:
+            headers.pop('Content-Type', None)
+
+        # Semaforo dell'event loop, non del client: il limite vale per tutto il worker
+        http, semaphore = _shared_state()
+        limiter = get_rate_limiter()
+        throttled = 0.0
+        attempt = 0
+        response = None
+        try:
+            try:
+                while True:
+                    wait = limiter.reserve(self.limit_key)
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                        throttled += wait
+                    if attempt:
+                        rewind_files(files)
+                    async with semaphore:
+                        response = await http.request(
+                            method,
+                            url,
+                            params=params,
+                            json=json,
+                            data=data,
+                            files=files,
+                            headers=headers,
+                            auth=self.auth,
+                        )
+                    delay = limiter.retry_delay(method, response.status_code, response.headers, attempt)
+                    if delay is None:
+                        break
+                    if response.status_code == 429:
+                        limiter.penalize(self.limit_key, delay)
+                    await asyncio.sleep(delay)
+                    throttled += delay
+                    attempt += 1
+            finally:
+                self.throttled_seconds += throttled
+                limiter.record(self.limit_key, throttled, attempt, response.status_code if response is not None else None)
+            response.raise_for_status()
+            return response
+        except httpx.HTTPStatusError as e:
+            # Stesso messaggio del client sincrono, eccezione originale (e.request / e.response)
+            e.args = (f"HTTP {e.response.status_code} error: {e} - {e.response.text[:200]}",) + e.args[1:]
+            raise
+        except httpx.ConnectError as e:
+            e.args = (f"Errore di connessione a {url}: {e}",) + e.args[1:]
+            raise
+        except httpx.TimeoutException as e:
+            e.args = (f"Timeout nella richiesta a {url}: {e}",) + e.args[1:]
+            raise
+        except httpx.RequestError as e:
+            e.args = (f"Errore nella richiesta: {e}",) + e.args[1:]
+            raise
+
+    # ========== ACTIVITIES ==========
+
+    async def get_activities(
+        self,
+        athlete_id: str = '0',
+        oldest: Optional[Union[str, date, datetime]] = None,
+        newest: Optional[Union[str, date, datetime]] = None,
+        days_back: int = 30
+    ) -> List[Dict]:
+        """Lista attività (vedi IntervalsAPIClient.get_activities)"""
+        params = _date_window(oldest, newest, days_back, anchor=datetime.now())
+        response = await self._request('GET', f'/api/v1/athlete/{athlete_id}/activities', params=params)
+        return response.json()
+
+    async def get_activity(
+        self,
+        activity_id: str,
+        include_intervals: bool = False
+    ) -> Dict:
+        """Dettagli completi di un'attività"""
+        params = {'intervals': 'true' if include_intervals else 'false'}
+        response = await self._request('GET', f'/api/v1/activity/{activity_id}', params=params)
+        return response.json()
+
+    async def download_activity_file(
+        self,
+        activity_id: str,
+        save_path: Optional[str] = None
+    ) -> bytes:
+        """Scarica file FIT originale (gzip compresso)"""
+        response = await self._request('GET', f'/api/v1/activity/{activity_id}/file')
+        if save_path:
+            Path(save_path).write_bytes(response.content)
+        return response.content
+
+    async def download_activity_fit_file(
+        self,
+        activity_id: str,
+        save_path: Optional[str] = None
+    ) -> bytes:
+        """Scarica file FIT generato da Intervals.icu (con edit e laps)"""
+        response = await self._request('GET', f'/api/v1/activity/{activity_id}/fit-file')
+        if save_path:
+            Path(save_path).write_bytes(response.content)
+        return response.content
+
+    async def upload_activity(
+        self,
+        file_path: str,
+        athlete_id: str = '0',
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        activity_type: Optional[str] = None,
+        external_id: Optional[str] = None
+    ) -> Dict:
+        """
+        Carica un'attività (FIT, TCX, GPX o zip/gz)
+
+        Raises:
+            FileNotFoundError: Se il file non esiste
+            OSError: Se il file non può essere letto
+        """
+        params = {}
+        if name:
+            params['name'] = name
+        if description:
+            params['description'] = description
+        if activity_type:
+            params['type'] = activity_type
+        if external_id:
+            params['external_id'] = external_id
+
+        try:
+            content = Path(file_path).read_bytes()
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"File non trovato: {file_path}") from e
+        except OSError as e:
+            raise OSError(f"Errore lettura file {file_path}: {e}") from e
+
+        response = await self._request(
+            'POST',
+            f'/api/v1/athlete/{athlete_id}/activities',
+            params=params,
+            files={'file': (Path(file_path).name, content)}
+        )
+        return response.json()
+
+    async def update_activity(self, activity_id: str, **fields) -> Dict:
+        """Aggiorna un'attività (name, description, type, feel, etc.)"""
+        response = await self._request('PUT', f'/api/v1/activity/{activity_id}', json=fields)
+        return response.json()
+
+    async def delete_activity(self, activity_id: str) -> None:
+        """Elimina un'attività"""
+        await self._request('DELETE', f'/api/v1/activity/{activity_id}')
+
+    # ========== WELLNESS ==========
+
+    async def get_wellness(
+        self,
+        athlete_id: str = '0',
+        oldest: Optional[Union[str, date]] = None,
+        newest: Optional[Union[str, date]] = None,
+        days_back: int = 30
+    ) -> List[Dict]:
+        """Lista dati wellness (vedi IntervalsAPIClient.get_wellness)"""
+        params = _date_window(oldest, newest, days_back, anchor=date.today())
+        response = await self._request('GET', f'/api/v1/athlete/{athlete_id}/wellness', params=params)
+        return response.json()
+
+    async def get_wellness_date(
+        self,
+        wellness_date: Union[str, date],
+        athlete_id: str = '0'
+    ) -> Dict:
+        """Dati wellness per una data specifica"""
+        if isinstance(wellness_date, date):
+            wellness_date = wellness_date.strftime('%Y-%m-%d')
+        response = await self._request('GET', f'/api/v1/athlete/{athlete_id}/wellness/{wellness_date}')
+        return response.json()
+
+    async def update_wellness(
+        self,
+        wellness_date: Union[str, date],
+        athlete_id: str = '0',
+        **fields
+    ) -> Dict:
+        """Aggiorna wellness per una data (weight, restingHR, hrv, steps, etc.)"""
+        if isinstance(wellness_date, date):
+            wellness_date = wellness_date.strftime('%Y-%m-%d')
+        response = await self._request(
+            'PUT',
+            f'/api/v1/athlete/{athlete_id}/wellness/{wellness_date}',
+            json=fields
+        )
+        return response.json()
+
+    # ========== CALENDAR / EVENTS ==========
+
+    async def get_events(
+        self,
+        athlete_id: str = '0',
+        oldest: Optional[Union[str, date]] = None,
+        newest: Optional[Union[str, date]] = None,
+        days_forward: int = 30
+    ) -> List[Dict]:
+        """Lista eventi calendario (workouts, note, gare)"""
+        params = _date_window(oldest, newest, days_forward, anchor=date.today(), forward=True)
+        response = await self._request('GET', f'/api/v1/athlete/{athlete_id}/events', params=params)
+        return response.json()
+
+    async def create_event(
+        self,
+        athlete_id: str = '0',
+        category: str = 'WORKOUT',
+        start_date_local: Optional[str] = None,
+        end_date_local: Optional[str] = None,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        duration_minutes: Optional[int] = None,
+        distance: Optional[float] = None,
+        moving_time: Optional[int] = None,
+        activity_type: Optional[str] = None,
+        notes: Optional[str] = None,
+        **kwargs
+    ) -> Dict:
+        """
+        Crea un evento/workout pianificato (vedi IntervalsAPIClient.create_event)
+
+        Raises:
+            ValueError: Se start_date_local non è fornito
+        """
+        if not start_date_local:
+            raise ValueError("start_date_local è obbligatorio per creare un evento")
+
+        data: Dict[str, Any] = {
+            'category': category,
+            'start_date_local': str(start_date_local),
+        }
+        optional = {
+            'end_date_local': end_date_local,
+            'name': name,
+            'description': description,
+            'type': activity_type,
+            'notes': notes,
+        }
+        data.update({key: value for key, value in optional.items() if value})
+        numeric = {
+            'duration_minutes': duration_minutes,
+            'distance': distance,
+            'moving_time': moving_time,
+        }
+        data.update({key: value for key, value in numeric.items() if value is not None})
+        data.update(kwargs)
+
+        response = await self._request('POST', f'/api/v1/athlete/{athlete_id}/events', json=data)
+        return response.json()
+
+    async def delete_event(self, athlete_id: str = '0', event_id: Optional[int] = None) -> bool:
+        """
+        Elimina un evento dal calendario
+
+        Raises:
+            ValueError: Se event_id non è fornito
+        """
+        if event_id is None:
+            raise ValueError("event_id è obbligatorio per eliminare un evento")
+
+        try:
+            response = await self._request('DELETE', f'/api/v1/athlete/{athlete_id}/events/{event_id}')
+            return response.status_code in [200, 204]
+        except Exception:
+            # Se l'evento non esiste, non è un vero errore
+            return False
+
+    async def get_athlete(self, athlete_id: str = '0') -> Dict:
+        """Informazioni atleta"""
+        response = await self._request('GET', f'/api/v1/athlete/{athlete_id}')
+        return response.json()
+
+    async def get_power_curve(
+        self,
+        athlete_id: str = '0',
+        oldest: Optional[str] = None,
+        newest: Optional[str] = None,
+        activity_type: str = 'Ride'
+    ) -> Dict:
+        """Power curve (migliori sforzi per durata), endpoint /power-curves.json"""
+        params: Dict[str, str] = {'type': activity_type}
+        if oldest:
+            if not newest:
+                newest = date.today().strftime('%Y-%m-%d')
+            params['curves'] = f"r.{oldest}.{newest}"
+
+        response = await self._request(
+            'GET',
+            f'/api/v1/athlete/{athlete_id}/power-curves.json',
+            params=params
+        )
+        return response.json()
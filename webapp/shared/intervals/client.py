@@ -3,10 +3,19 @@ Client completo auto-generato dall'OpenAPI spec di Intervals.icu
 Include tutti i 114+ endpoints con type hints completi
 """
 
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Optional, List, Dict, Any, Union
 from datetime import datetime, date, timedelta
 from pathlib import Path
+from urllib3.util.retry import Retry
+
+from ..config import get_intervals_http_settings
+from .ratelimit import IDEMPOTENT_METHODS, get_rate_limiter, limit_key, rewind_files
 
 try:
     from .models import (
@@ -19,6 +28,55 @@ except ImportError:
     PYDANTIC_AVAILABLE = False
 
 
+_http_session: Optional[requests.Session] = None
+_http_session_lock = threading.Lock()
+_http_timeout: float = 30  # secondi, aggiornato da get_http_session() con il config
+
+
+def get_http_session() -> requests.Session:
+    """Process-wide keep-alive session shared by every IntervalsAPIClient.
+
+    Connections (TCP+TLS) are pooled and reused across clients and API keys:
+    credentials travel per request (auth/headers), never on the session, and
+    cookies are refused so nothing leaks from one athlete's calls to another's.
+    """
+    global _http_session, _http_timeout
+    with _http_session_lock:
+        if _http_session is None:
+            settings = get_intervals_http_settings()
+            _http_timeout = settings["timeout"]
+            retries = int(settings["retries"])
+            adapter = HTTPAdapter(
+                pool_connections=int(settings["pool_connections"]),
+                pool_maxsize=int(settings["pool_maxsize"]),
+                # Solo errori di connessione: 429/5xx li ripete _request con il rate limiter
+                max_retries=Retry(
+                    total=retries,
+                    connect=retries,
+                    read=retries,
+                    status=0,
+                    allowed_methods=IDEMPOTENT_METHODS,
+                    backoff_factor=settings["backoff_factor"],
+                    raise_on_status=False,
+                ),
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            _http_session = session
+        return _http_session
+
+
+def close_http_session() -> None:
+    """Close the pooled connections (they are reopened on the next request)."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is not None:
+            _http_session.close()
+            _http_session = None
+
+
 class IntervalsAPIClient:
     """
     Client completo per Intervals.icu API
@@ -38,7 +96,8 @@ class IntervalsAPIClient:
         self, 
         api_key: Optional[str] = None,
         access_token: Optional[str] = None,
-        base_url: str = 'https://intervals.icu'
+        base_url: str = 'https://intervals.icu',
+        session: Optional[requests.Session] = None
     ):
         """
         Inizializza il client
@@ -47,6 +106,7 @@ class IntervalsAPIClient:
             api_key: API key personale (da https://intervals.icu/settings)
             access_token: Bearer token da OAuth
             base_url: URL base dell'API (default: https://intervals.icu)
+            session: sessione HTTP da usare (default: pool condiviso, get_http_session())
         """
         if not api_key and not access_token:
             raise ValueError("Devi fornire api_key o access_token")
@@ -54,6 +114,11 @@ class IntervalsAPIClient:
         self.base_url = base_url
         self.api_key = api_key
         self.access_token = access_token
+        # Creare un client è gratuito: le connessioni stanno nel pool condiviso
+        self.session = session or get_http_session()
+        # Rate limit per credenziale e secondi passati in attesa (limiter + backoff)
+        self.limit_key = limit_key(api_key, access_token)
+        self.throttled_seconds = 0.0
         
         # Setup auth
         if access_token:
@@ -89,6 +154,9 @@ class IntervalsAPIClient:
         """
         Esegue una richiesta HTTP gestendo errori
         
+        Attende il proprio turno nel rate limiter (bucket della API key e globale)
+        e ripete 429/5xx con backoff esponenziale, rispettando Retry-After.
+        
         Raises:
             requests.exceptions.HTTPError: Per errori HTTP (4xx, 5xx)
             requests.exceptions.ConnectionError: Per errori di connessione
@@ -102,18 +170,42 @@ class IntervalsAPIClient:
         if files:
             headers.pop('Content-Type', None)
         
+        limiter = get_rate_limiter()
+        throttled = 0.0
+        attempt = 0
+        response = None
         try:
-            response = requests.request(
-                method=method,
-                url=url,
-                params=params,
-                json=json,
-                data=data,
-                files=files,
-                headers=headers,
-                auth=self.auth,
-                timeout=30  # Timeout di 30 secondi
-            )
+            try:
+                while True:
+                    wait = limiter.reserve(self.limit_key)
+                    if wait > 0:
+                        time.sleep(wait)
+                        throttled += wait
+                    if attempt:
+                        rewind_files(files)
+                    response = self.session.request(
+                        method=method,
+                        url=url,
+                        params=params,
+                        json=json,
+                        data=data,
+                        files=files,
+                        headers=headers,
+                        auth=self.auth,
+                        timeout=_http_timeout
+                    )
+                    delay = limiter.retry_delay(method, response.status_code, response.headers, attempt)
+                    if delay is None:
+                        break
+                    if response.status_code == 429:
+                        limiter.penalize(self.limit_key, delay)
+                    response.close()
+                    time.sleep(delay)
+                    throttled += delay
+                    attempt += 1
+            finally:
+                self.throttled_seconds += throttled
+                limiter.record(self.limit_key, throttled, attempt, response.status_code if response is not None else None)
             
             response.raise_for_status()
             return response
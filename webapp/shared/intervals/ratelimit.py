@@ -0,0 +1,197 @@
+# ===============================================================================
+# Copyright (c) 2026 Andrea Bonvicin - bFactor Project
+# PROPRIETARY LICENSE - TUTTI I DIRITTI RISERVATI
+# Sharing, distribution or reproduction is strictly prohibited.
+# La condivisione, distribuzione o riproduzione è severamente vietata.
+# ===============================================================================
+
+"""
+Rate limiting e retry delle chiamate a Intervals.icu
+Token bucket per API key più uno globale del processo, backoff esponenziale
+con jitter che rispetta Retry-After su 429/5xx e metriche del tempo di attesa
+"""
+
+from __future__ import annotations
+
+import hashlib
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional
+
+from ..config import get_intervals_http_settings
+
+# 429 si ripete sempre (la richiesta è stata rifiutata, non eseguita);
+# i 5xx solo sui metodi idempotenti, per non creare due volte lo stesso evento
+RETRY_ALWAYS_STATUS = frozenset({429})
+RETRY_IDEMPOTENT_STATUS = frozenset({500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `burst` stored."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = max(burst, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return the seconds to wait before using it.
+
+        Tokens can go negative: concurrent callers queue up behind each other
+        instead of all waking at the same instant.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.rate > 0:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                self.tokens -= 1
+                wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            else:
+                wait = 0.0  # rate 0 = nessun limite
+            return max(wait, self.blocked_until - now)
+
+    def block(self, seconds: float) -> None:
+        """Hold every caller for `seconds` (upstream asked us to slow down)."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def limit_key(api_key: Optional[str], access_token: Optional[str]) -> str:
+    """Short fingerprint of the credential: buckets and metrics never hold the key itself."""
+    secret = access_token or api_key or ""
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()[:12]
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds (delta-seconds or HTTP-date), None if missing/invalid."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def rewind_files(files: Optional[Dict]) -> None:
+    """Seek uploaded file objects back to the start before a retry."""
+    for value in (files or {}).values():
+        handle = value[1] if isinstance(value, tuple) and len(value) > 1 else value
+        if hasattr(handle, "seek"):
+            handle.seek(0)
+
+
+class IntervalsRateLimiter:
+    """Process-wide limiter shared by IntervalsAPIClient and AsyncIntervalsAPIClient.
+
+    Every request takes a token from the bucket of its API key and from the
+    global one; the caller sleeps (time.sleep or asyncio.sleep) for the
+    returned delay, so the same object serves both clients.
+    """
+
+    def __init__(self, settings: Mapping[str, float]):
+        self.retries = int(settings["retries"])
+        self.backoff_factor = float(settings["backoff_factor"])
+        self.backoff_max = float(settings["backoff_max"])
+        self.key_rate = float(settings["rate_per_key"])
+        self.key_burst = float(settings["burst_per_key"])
+        self._global = TokenBucket(float(settings["rate_global"]), float(settings["burst_global"]))
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.key_rate, self.key_burst)
+            return bucket
+
+    def reserve(self, key: str) -> float:
+        """Seconds to wait before sending the next request for `key`."""
+        return max(self._bucket(key).reserve(), self._global.reserve())
+
+    def retry_delay(self, method: str, status: int, headers: Mapping[str, str], attempt: int) -> Optional[float]:
+        """Delay before retrying a response, None if it must not be retried.
+
+        Retry-After wins over the computed backoff; if it asks for more than
+        backoff_max we give up instead of holding the request open.
+        """
+        if attempt >= self.retries:
+            return None
+        if status not in RETRY_ALWAYS_STATUS and not (
+            status in RETRY_IDEMPOTENT_STATUS and method.upper() in IDEMPOTENT_METHODS
+        ):
+            return None
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+        if retry_after is not None:
+            if retry_after > self.backoff_max:
+                return None
+            # Un po' di jitter: i chiamanti in coda non ripartono tutti insieme
+            return retry_after + random.uniform(0, min(1.0, self.backoff_factor))
+        # Full jitter: uniforme in [0, factor * 2^attempt], con tetto backoff_max
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+
+    def penalize(self, key: str, seconds: float) -> None:
+        """After a 429 hold every pending request of the same key, not just the one that failed."""
+        self._bucket(key).block(seconds)
+        with self._lock:
+            self._key_stats(key)["rate_limited"] += 1
+
+    def _key_stats(self, key: str) -> Dict[str, float]:
+        return self._stats.setdefault(
+            key, {"calls": 0, "retries": 0, "rate_limited": 0, "throttled_seconds": 0.0, "max_throttled_seconds": 0.0}
+        )
+
+    def record(self, key: str, throttled: float, retries: int, status: Optional[int]) -> None:
+        """Accumulate the per-key metrics of one completed call."""
+        with self._lock:
+            stats = self._key_stats(key)
+            stats["calls"] += 1
+            stats["retries"] += retries
+            if status == 429:  # 429 finale, senza altri tentativi (i precedenti li conta penalize)
+                stats["rate_limited"] += 1
+            stats["throttled_seconds"] += throttled
+            stats["max_throttled_seconds"] = max(stats["max_throttled_seconds"], throttled)
+
+    def stats(self) -> Dict[str, Any]:
+        """Metrics per credential fingerprint plus the totals of the process."""
+        with self._lock:
+            keys = {key: dict(values) for key, values in self._stats.items()}
+        totals = {
+            name: sum(values[name] for values in keys.values())
+            for name in ("calls", "retries", "rate_limited", "throttled_seconds")
+        }
+        for values in list(keys.values()) + [totals]:
+            values["throttled_seconds"] = round(values["throttled_seconds"], 3)
+            if "max_throttled_seconds" in values:
+                values["max_throttled_seconds"] = round(values["max_throttled_seconds"], 3)
+        return {"keys": keys, "totals": totals}
+
+
+_rate_limiter: Optional[IntervalsRateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> IntervalsRateLimiter:
+    """Limiter of the process, built from the "intervals_http" config on first use."""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = IntervalsRateLimiter(get_intervals_http_settings())
+        return _rate_limiter
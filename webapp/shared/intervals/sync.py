@@ -7,10 +7,15 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Dict, List, Optional, Tuple
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 import json
 
+from ..config import get_intervals_http_settings
+from .async_client import AsyncIntervalsAPIClient
 from .client import IntervalsAPIClient
 
 logger = logging.getLogger(__name__)
@@ -56,17 +61,96 @@ class IntervalsSyncService:
         self.api_key = api_key
         return self._init_client()
     
+    # Colonne salvate da /api/sync/activities -> campi di format_activity_for_storage:
+    # se coincidono con la lista di Intervals l'attività non è cambiata
+    SUMMARY_FIELDS: Dict[str, str] = {
+        'title': 'name',
+        'activity_date': 'start_date',
+        'activity_type': 'type',
+        'duration_minutes': 'moving_time_minutes',
+        'distance_km': 'distance_km',
+        'tss': 'training_load',
+        'avg_watts': 'avg_watts',
+        'normalized_watts': 'normalized_watts',
+        'avg_hr': 'avg_hr',
+        'max_hr': 'max_hr',
+        'training_load': 'training_load',
+        'intensity': 'intensity',
+        'feel': 'feel',
+    }
+
+    @classmethod
+    def summary_unchanged(cls, activity: Dict, stored: Optional[Mapping[str, Any]]) -> bool:
+        """
+        Confronta il riepilogo della lista attività con la riga salvata
+        
+        Args:
+            activity: Attività dalla lista di Intervals (senza dettagli)
+            stored: Colonne salvate (BTeamStorage.intervals_activity_summaries), None se assente
+        
+        Returns:
+            True se nessun campo salvato è cambiato su Intervals
+        """
+        if not stored or not stored.get('has_payload'):
+            return False  # senza il payload dei dettagli (download fallito) si riscarica
+        formatted = cls.format_activity_for_storage(activity)
+        for column, field in cls.SUMMARY_FIELDS.items():
+            new, old = formatted.get(field), stored.get(column)
+            if new is None:
+                continue  # l'upsert non sovrascrive con NULL: il valore salvato resta valido
+            if column == 'title' and isinstance(new, str):
+                new = new.strip()
+            if isinstance(new, (int, float)) and isinstance(old, (int, float)):
+                if not math.isclose(new, old, rel_tol=1e-9, abs_tol=1e-9):
+                    return False
+            elif new != old:
+                return False
+        return True
+
+    @classmethod
+    def _detail_ids(
+        cls,
+        activities: List[Dict],
+        stored_summaries: Optional[Mapping[str, Mapping[str, Any]]]
+    ) -> List[Optional[str]]:
+        """ID da arricchire con i dettagli, None dove basta il riepilogo della lista"""
+        ids: List[Optional[str]] = []
+        for activity in activities:
+            activity_id = activity.get('id')
+            if not activity_id:
+                logger.warning("Attività senza ID trovata; impossibile scaricare i dettagli. L'attività verrà restituita senza arricchimento.")
+                ids.append(None)
+            elif stored_summaries is not None and cls.summary_unchanged(activity, stored_summaries.get(str(activity_id))):
+                # Già in archivio e invariata: il riepilogo basta per aggiornare le metriche
+                ids.append(None)
+            else:
+                ids.append(str(activity_id))
+        return ids
+
     def fetch_activities(
         self,
         days_back: int = 30,
-        include_intervals: bool = True
+        include_intervals: bool = True,
+        stored_summaries: Optional[Mapping[str, Mapping[str, Any]]] = None,
+        oldest: Optional[str] = None,
+        details: Optional[Dict[str, bool]] = None
     ) -> Tuple[List[Dict], str]:
         """
         Scarica le attività da Intervals.icu
         
+        I dettagli sono scaricati in parallelo (al massimo max_concurrency del
+        config "intervals_http"), mantenendo l'ordine della lista; se un dettaglio
+        fallisce resta il riepilogo.
+        
         Args:
             days_back: Quanti giorni indietro scaricare
             include_intervals: Se includere gli intervalli rilevati
+            stored_summaries: Attività già salvate per intervals_id
+                (BTeamStorage.intervals_activity_summaries); quelle invariate
+                tengono il riepilogo della lista senza scaricare i dettagli
+            oldest: Data inizio (YYYY-MM-DD) al posto di days_back, per il sync incrementale
+            details: Se fornito, riceve per ogni ID di cui si sono chiesti i dettagli
+                True (scaricati) o False (download fallito, resta il riepilogo)
         
         Returns:
             Tupla (lista attività, messaggio stato)
@@ -75,36 +159,102 @@ class IntervalsSyncService:
             return [], "❌ Client non configurato. Imposta l'API key."
         
         try:
-            logger.info(f"📥 Scarico attività degli ultimi {days_back} giorni...")
+            window = f"dal {oldest}" if oldest else f"degli ultimi {days_back} giorni"
+            logger.info(f"📥 Scarico attività {window}...")
             
             # Scarica lista attività
-            activities = self.client.get_activities(days_back=days_back)
+            activities = self.client.get_activities(oldest=oldest, days_back=days_back)
             
             if not activities:
-                return [], f"✓ Nessuna attività trovata negli ultimi {days_back} giorni"
+                return [], f"✓ Nessuna attività trovata {window}"
             
             logger.info(f"📦 Trovate {len(activities)} attività")
             
             # Arricchisci con dettagli e intervalli
-            enriched = []
-            for activity in activities:
-                activity_id = activity.get('id')
-                if not activity_id:
-                    logger.warning("Attività senza ID trovata; impossibile scaricare i dettagli. L'attività verrà restituita senza arricchimento.")
-                    enriched.append(activity)
-                    continue
-                activity_id_str = str(activity_id)
+            detail_ids = self._detail_ids(activities, stored_summaries)
+            client = self.client
+
+            def enrich(activity: Dict, activity_id: Optional[str]) -> Dict:
+                if activity_id is None:
+                    return activity
+                try:
+                    detail = client.get_activity(activity_id, include_intervals=include_intervals)
+                except Exception as e:
+                    logger.warning(f"Errore scaricamento dettagli {activity_id}: {e}")
+                    detail, ok = activity, False
+                else:
+                    ok = True
+                if details is not None:
+                    details[activity_id] = ok
+                return detail
+
+            to_fetch = sum(1 for activity_id in detail_ids if activity_id)
+            workers = min(int(get_intervals_http_settings()["max_concurrency"]), to_fetch)
+            if workers > 1:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    enriched = list(pool.map(enrich, activities, detail_ids))
+            else:
+                enriched = [enrich(activity, activity_id) for activity, activity_id in zip(activities, detail_ids)]
+            
+            logger.info(f"✅ Scaricate {to_fetch} attività con dettagli ({len(enriched) - to_fetch} invariate o senza ID)")
+            return enriched, f"✅ Sincronizzate {len(enriched)} attività da Intervals.icu"
+        
+        except Exception as e:
+            msg = f"❌ Errore sync attività: {str(e)}"
+            logger.error(msg)
+            return [], msg
+    
+    @classmethod
+    async def fetch_activities_async(
+        cls,
+        client: AsyncIntervalsAPIClient,
+        days_back: int = 30,
+        include_intervals: bool = True,
+        stored_summaries: Optional[Mapping[str, Mapping[str, Any]]] = None,
+        oldest: Optional[str] = None,
+        details: Optional[Dict[str, bool]] = None
+    ) -> Tuple[List[Dict], str]:
+        """
+        Come fetch_activities, con il client async: non blocca l'event loop
+        
+        I dettagli partono tutti insieme con asyncio.gather; il semaforo e il
+        rate limiter del client decidono quanti sono davvero in volo.
+        
+        Returns:
+            Tupla (lista attività, messaggio stato)
+        """
+        try:
+            window = f"dal {oldest}" if oldest else f"degli ultimi {days_back} giorni"
+            logger.info(f"📥 Scarico attività {window}...")
+            activities = await client.get_activities(oldest=oldest, days_back=days_back)
+            
+            if not activities:
+                return [], f"✓ Nessuna attività trovata {window}"
+            
+            logger.info(f"📦 Trovate {len(activities)} attività")
+            
+            detail_ids = cls._detail_ids(activities, stored_summaries)
+
+            async def enrich(activity: Dict, activity_id: Optional[str]) -> Dict:
+                if activity_id is None:
+                    return activity
                 try:
-                    details = self.client.get_activity(
-                        activity_id_str,
-                        include_intervals=include_intervals
-                    )
-                    enriched.append(details)
+                    detail = await client.get_activity(activity_id, include_intervals=include_intervals)
                 except Exception as e:
-                    logger.warning(f"Errore scaricamento dettagli {activity_id_str}: {e}")
-                    enriched.append(activity)
+                    logger.warning(f"Errore scaricamento dettagli {activity_id}: {e}")
+                    detail, ok = activity, False
+                else:
+                    ok = True
+                if details is not None:
+                    details[activity_id] = ok
+                return detail
+
+            enriched = list(await asyncio.gather(
+                *(enrich(activity, activity_id) for activity, activity_id in zip(activities, detail_ids))
+            ))
+            to_fetch = sum(1 for activity_id in detail_ids if activity_id)
             
-            logger.info(f"✅ Scaricate {len(enriched)} attività con dettagli")
+            logger.info(f"✅ Scaricate {to_fetch} attività con dettagli ({len(enriched) - to_fetch} invariate o senza ID)")
             return enriched, f"✅ Sincronizzate {len(enriched)} attività da Intervals.icu"
         
         except Exception as e:
@@ -0,0 +1,39 @@
+# ===============================================================================
+# Copyright (c) 2026 Andrea Bonvicin - bFactor Project
+# PROPRIETARY LICENSE - TUTTI I DIRITTI RISERVATI
+# Sharing, distribution or reproduction is strictly prohibited.
+# La condivisione, distribuzione o riproduzione è severamente vietata.
+# ===============================================================================
+
+"""Direct JSON responses for the hot list endpoints.
+
+Returning a dict/list from a route makes FastAPI walk it with jsonable_encoder
+before serializing; the list methods of the storage already produce plain
+JSON types, so these helpers serialize them as they are.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serialized with orjson when installed, else with the stdlib json."""
+
+    def render(self, content: Any) -> bytes:
+        if ORJSON_AVAILABLE:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return super().render(content)
+
+
+def json_response(content: Any) -> FastJSONResponse:
+    """Wrap storage output (plain dict/list/str/number/None) skipping jsonable_encoder."""
+    return FastJSONResponse(content=content)
@@ -9,24 +9,131 @@
 
 from __future__ import annotations
 
+import functools
+import inspect
 import json
 import logging
+import re
 import sqlite3
+import base64
+import threading
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
 
-from sqlalchemy import Column, ForeignKey, Integer, String, Text, Float, Boolean, JSON, create_engine
+from sqlalchemy import (
+    Column, Date, ForeignKey, Index, Integer, MetaData, String, Table, Text, Float, Boolean, JSON, LargeBinary,
+    cast, create_engine, event, func, inspect as sa_inspect, literal, select, text, tuple_, union_all,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker, Session as SQLAlchemySession, joinedload
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import (
+    relationship, sessionmaker, scoped_session, Session as SQLAlchemySession, joinedload,
+)
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateIndex, CreateTable
+from starlette.concurrency import run_in_threadpool
+
+from .backup import create_snapshot, list_snapshots
+from .config import (
+    get_archive_before, get_backup_dir, get_backup_settings, get_database_url, get_db_pool_settings,
+    get_sqlite_pragmas,
+)
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
 
 
 Base = declarative_base()
 
+T = TypeVar("T")
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 _logger = logging.getLogger(__name__)
 
+# Unità di lavoro corrente (una per richiesta HTTP); None fuori da session_scope()
+_session_scope_id: ContextVar[Optional[object]] = ContextVar("bteam_session_scope", default=None)
+
+
+def _current_session_scope() -> object:
+    """Scope key for scoped_session: the active unit of work, else the current thread."""
+    scope = _session_scope_id.get()
+    return scope if scope is not None else threading.get_ident()
+
+
+def _encode_payload(payload: Any) -> Tuple[str, bytes, int]:
+    """Serialize a raw Intervals payload to compressed JSON.
+
+    Returns:
+        Tuple (encoding, compressed bytes, uncompressed size)
+    """
+    if not isinstance(payload, (dict, list)):
+        payload = list(payload)
+    raw = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    if ZSTD_AVAILABLE:
+        return "zstd", zstandard.ZstdCompressor(level=3).compress(raw), len(raw)
+    return "zlib", zlib.compress(raw, 6), len(raw)
+
+
+def _decode_payload(encoding: str, data: bytes) -> Any:
+    """Inverse of _encode_payload."""
+    if encoding == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("Payload compresso con zstd ma il modulo 'zstandard' non è installato")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    elif encoding == "zlib":
+        raw = zlib.decompress(data)
+    else:
+        raw = data
+    return json.loads(raw.decode("utf-8"))
+
+
+def _install_sqlite_pragmas(engine, pragmas: Dict[str, object]) -> None:
+    """Apply the storage profile PRAGMAs to every new DBAPI connection of the engine."""
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def _attach_archives(dbapi_connection, attached: set, archives: Dict[int, Path]) -> None:
+    """ATTACH to a DBAPI connection the season archives (arch_<year>) it does not have yet."""
+    missing = [(year, path) for year, path in archives.items() if year not in attached]
+    if not missing:
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for year, path in missing:
+            cursor.execute(f"ATTACH DATABASE ? AS arch_{int(year)}", (str(path),))
+            attached.add(year)
+    finally:
+        cursor.close()
+
+
+def _install_archive_attach(engine, archives: Callable[[], Dict[int, Path]]) -> None:
+    """ATTACH the season archives to the DBAPI connections of the engine.
+
+    Checked at every checkout: an archive created while the app runs reaches the
+    pooled connections the next time they are used, without disposing the pool.
+    """
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        _attach_archives(dbapi_connection, connection_record.info.setdefault("archives", set()), archives())
+
 
 class Team(Base):
     """SQLAlchemy ORM model for teams."""
@@ -85,6 +192,7 @@ class Athlete(Base):
     activities = relationship("Activity", back_populates="athlete", cascade="all, delete-orphan")
     wellness = relationship("Wellness", back_populates="athlete", cascade="all, delete-orphan")
     seasons = relationship("Season", back_populates="athlete", cascade="all, delete-orphan")
+    sync_state = relationship("SyncState", back_populates="athlete", uselist=False, cascade="all, delete-orphan")
 
     def to_dict(self, with_team_name: bool = True) -> Dict:
         data = {
@@ -117,6 +225,15 @@ class Athlete(Base):
 class Activity(Base):
     """SQLAlchemy ORM model for activities."""
     __tablename__ = "activities"
+    __table_args__ = (
+        # Dedupe in add_activity (athlete+date+title[+source]) e lista per atleta ordinata per data
+        Index("ix_activities_athlete_date_title", "athlete_id", "activity_date", "title", "source"),
+        # Unico: target di ON CONFLICT per upsert_activities (i NULL non collidono)
+        Index("ux_activities_intervals_id", "intervals_id", unique=True),
+        # Paginazione keyset su (activity_date, created_at, id): id è implicito (rowid) in coda all'indice
+        Index("ix_activities_date_created", "activity_date", "created_at"),
+        Index("ix_activities_athlete_date_created", "athlete_id", "activity_date", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True)
     athlete_id = Column(Integer, ForeignKey("athletes.id", ondelete="CASCADE"), nullable=False)
@@ -130,7 +247,7 @@ class Activity(Base):
     intervals_id = Column(String(100), nullable=True)  # ID attività da Intervals
     # ✨ NUOVI CAMPI PER GARE E TAG
     is_race = Column(Boolean, default=False)  # È una gara?
-    tags = Column(Text, nullable=True)  # JSON array: ["race", "test", "long-ride"]
+    # I tag stanno in activity_tags (la vecchia colonna JSON "tags" non è più letta)
     avg_watts = Column(Float, nullable=True)
     normalized_watts = Column(Float, nullable=True)
     avg_hr = Column(Float, nullable=True)
@@ -140,20 +257,18 @@ class Activity(Base):
     intensity = Column(Float, nullable=True)
     feel = Column(Integer, nullable=True)  # 1-10
     calories = Column(Float, nullable=True)
-    intervals_payload = Column(Text, nullable=True)  # JSON raw completo
+    # Il JSON raw completo da Intervals sta in activity_payloads (compresso, caricato solo on demand)
     created_at = Column(String(255), nullable=False)
 
     athlete = relationship("Athlete", back_populates="activities")
+    payload = relationship(
+        "ActivityPayload", uselist=False, cascade="all, delete-orphan", back_populates="activity"
+    )
+    tag_links = relationship(
+        "ActivityTag", cascade="all, delete-orphan", back_populates="activity", order_by="ActivityTag.tag"
+    )
 
     def to_dict(self, with_athlete_name: bool = False) -> Dict:
-        # Parse tags from JSON string to list
-        tags = []
-        if self.tags:
-            try:
-                tags = json.loads(self.tags)
-            except (json.JSONDecodeError, TypeError):
-                tags = []
-        
         data = {
             "id": self.id,
             "athlete_id": self.athlete_id,
@@ -165,7 +280,7 @@ class Activity(Base):
             "source": self.source,
             "intervals_id": self.intervals_id,
             "is_race": self.is_race,
-            "tags": tags,  # Ritorna come lista, non come JSON string
+            "tags": [link.tag for link in self.tag_links],
             "avg_watts": self.avg_watts,
             "normalized_watts": self.normalized_watts,
             "avg_hr": self.avg_hr,
@@ -176,12 +291,56 @@ class Activity(Base):
             "feel": self.feel,
             "calories": self.calories,
             "activity_type": self.activity_type,
-            "intervals_payload": self.intervals_payload,
             "created_at": self.created_at,
         }
         return data
 
 
+class ActivityTag(Base):
+    """Tag of an activity, one row per (activity, tag)."""
+    __tablename__ = "activity_tags"
+    __table_args__ = (
+        # Filtro per tag: seek sul tag, activity_id già nell'indice
+        Index("ix_activity_tags_tag", "tag", "activity_id"),
+    )
+
+    activity_id = Column(Integer, ForeignKey("activities.id", ondelete="CASCADE"), primary_key=True)
+    tag = Column(String(100), primary_key=True)
+
+    activity = relationship("Activity", back_populates="tag_links")
+
+
+def _normalize_tags(tags: Optional[Iterable[str]]) -> List[str]:
+    """Strip, drop empty and duplicate tags, keeping the first occurrence order."""
+    if not tags:
+        return []
+    if isinstance(tags, str):
+        tags = [tags]
+    return list(dict.fromkeys(str(tag).strip()[:100] for tag in tags if tag and str(tag).strip()))
+
+
+class ActivityPayload(Base):
+    """Raw Intervals JSON of an activity, compressed and kept out of the activities rows."""
+    __tablename__ = "activity_payloads"
+
+    activity_id = Column(Integer, ForeignKey("activities.id", ondelete="CASCADE"), primary_key=True)
+    encoding = Column(String(20), nullable=False)  # "zstd" | "zlib"
+    data = Column(LargeBinary, nullable=False)
+    size_bytes = Column(Integer, nullable=True)  # Dimensione JSON non compresso
+    created_at = Column(String(255), nullable=False)
+
+    activity = relationship("Activity", back_populates="payload")
+
+    def to_dict(self) -> Dict:
+        return {
+            "activity_id": self.activity_id,
+            "encoding": self.encoding,
+            "size_bytes": self.size_bytes,
+            "payload": _decode_payload(self.encoding, self.data),
+            "created_at": self.created_at,
+        }
+
+
 class FitFile(Base):
     """SQLAlchemy ORM model for FIT files."""
     __tablename__ = "fit_files"
@@ -200,6 +359,10 @@ class FitFile(Base):
 class RaceAthlete(Base):
     """Many-to-many association between races and athletes."""
     __tablename__ = "race_athletes"
+    __table_args__ = (
+        Index("ix_race_athletes_race_athlete", "race_id", "athlete_id"),
+        Index("ix_race_athletes_athlete", "athlete_id"),
+    )
 
     id = Column(Integer, primary_key=True)
     race_id = Column(Integer, ForeignKey("races.id", ondelete="CASCADE"), nullable=False)
@@ -226,6 +389,9 @@ class RaceAthlete(Base):
 class RaceActivity(Base):
     """Link between a race and an athlete's activity from Intervals on race day."""
     __tablename__ = "race_activities"
+    __table_args__ = (
+        Index("ix_race_activities_race_athlete", "race_id", "athlete_id"),
+    )
 
     id = Column(Integer, primary_key=True)
     race_id = Column(Integer, ForeignKey("races.id", ondelete="CASCADE"), nullable=False)
@@ -252,6 +418,12 @@ class RaceActivity(Base):
 class Wellness(Base):
     """Dati wellness giornalieri dell'atleta (peso, FC riposo, HRV, etc)"""
     __tablename__ = "wellness"
+    __table_args__ = (
+        # Un record per atleta e giorno: target di ON CONFLICT per upsert_wellness
+        Index("ux_wellness_athlete_date", "athlete_id", "wellness_date", unique=True),
+        # Finestra di date su tutti gli atleti (list_wellness senza filtro atleta)
+        Index("ix_wellness_date", "wellness_date"),
+    )
 
     id = Column(Integer, primary_key=True)
     athlete_id = Column(Integer, ForeignKey("athletes.id", ondelete="CASCADE"), nullable=False)
@@ -322,6 +494,9 @@ class Wellness(Base):
 class Season(Base):
     """Stagioni sportive per ogni atleta"""
     __tablename__ = "seasons"
+    __table_args__ = (
+        Index("ix_seasons_athlete_start", "athlete_id", "start_date"),
+    )
 
     id = Column(Integer, primary_key=True)
     athlete_id = Column(Integer, ForeignKey("athletes.id", ondelete="CASCADE"), nullable=False)
@@ -341,9 +516,34 @@ class Season(Base):
         }
 
 
+class SyncState(Base):
+    """Cursori del sync incrementale da Intervals.icu, una riga per atleta"""
+    __tablename__ = "sync_state"
+
+    athlete_id = Column(Integer, ForeignKey("athletes.id", ondelete="CASCADE"), primary_key=True)
+    activities_synced_at = Column(String(255), nullable=True)  # ultimo sync attività riuscito (UTC)
+    newest_activity_date = Column(String(255), nullable=True)  # start_date_local più recente vista
+    wellness_synced_at = Column(String(255), nullable=True)  # ultimo sync wellness riuscito (UTC)
+    newest_wellness_date = Column(String(10), nullable=True)  # YYYY-MM-DD più recente visto
+
+    athlete = relationship("Athlete", back_populates="sync_state")
+
+    def to_dict(self) -> Dict:
+        return {
+            "athlete_id": self.athlete_id,
+            "activities_synced_at": self.activities_synced_at,
+            "newest_activity_date": self.newest_activity_date,
+            "wellness_synced_at": self.wellness_synced_at,
+            "newest_wellness_date": self.newest_wellness_date,
+        }
+
+
 class CustomCPHistory(Base):
     """Historical Custom CP configurations per athlete and period."""
     __tablename__ = "custom_cp_history"
+    __table_args__ = (
+        Index("ix_custom_cp_history_athlete_period_saved", "athlete_id", "period", "saved_at"),
+    )
 
     id = Column(Integer, primary_key=True)
     athlete_id = Column(Integer, ForeignKey("athletes.id", ondelete="CASCADE"), nullable=False)
@@ -387,6 +587,10 @@ class CustomCPHistory(Base):
 class Race(Base):
     """SQLAlchemy ORM model for planned races."""
     __tablename__ = "races"
+    __table_args__ = (
+        # Calendario: finestra di date e paginazione keyset su (race_date_start, id)
+        Index("ix_races_date_start", "race_date_start"),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String(255), nullable=False)
@@ -450,6 +654,9 @@ class Race(Base):
 class RaceStage(Base):
     """SQLAlchemy ORM model for individual race stages (tappe)."""
     __tablename__ = "race_stages"
+    __table_args__ = (
+        Index("ix_race_stages_race_stage", "race_id", "stage_number"),
+    )
 
     id = Column(Integer, primary_key=True)
     race_id = Column(Integer, ForeignKey("races.id", ondelete="CASCADE"), nullable=False)
@@ -479,17 +686,289 @@ class RaceStage(Base):
         }
 
 
+class ChangeLog(Base):
+    """Latest change of every entity: the change feed behind the ?since= list endpoints.
+
+    One row per (entity, entity_id), rewritten by triggers with a new version on
+    every change, so the table grows with the number of entities, not of writes.
+    """
+    __tablename__ = "change_log"
+    __table_args__ = (
+        Index("ux_change_log_entity", "entity", "entity_id", unique=True),
+        Index("ix_change_log_entity_version", "entity", "version"),
+        {"sqlite_autoincrement": True},  # versioni mai riusate
+    )
+
+    version = Column(Integer, primary_key=True)
+    entity = Column(String(20), nullable=False)  # "athlete" | "activity" | "wellness" | "race"
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String(10), nullable=False)  # "upsert" | "delete"
+
+
+# Tabelle che alimentano il change log: entità -> (tabella, colonna con l'id dell'entità, tabella padre).
+# Le tabelle figlie (tag, iscritti, tappe) segnano come modificata l'entità padre, se esiste ancora.
+_CHANGE_SOURCES: Dict[str, Tuple[Tuple[str, str, Optional[str]], ...]] = {
+    "athlete": (("athletes", "id", None),),
+    "activity": (("activities", "id", None), ("activity_tags", "activity_id", "activities")),
+    "wellness": (("wellness", "id", None),),
+    "race": (
+        ("races", "id", None),
+        ("race_athletes", "race_id", "races"),
+        ("race_stages", "race_id", "races"),
+    ),
+}
+
+
+# Ricerca full-text (FTS5, external content): tipo -> (tabella fts, tabella sorgente, colonne indicizzate,
+# colonne restituite). Le tabelle fts restano allineate tramite trigger sulla tabella sorgente.
+_SEARCH_SOURCES: Dict[str, Tuple[str, str, Tuple[str, ...], str]] = {
+    "activity": (
+        "activities_fts", "activities", ("title",),
+        "src.title AS title, src.activity_date AS date, src.athlete_id AS athlete_id",
+    ),
+    "race": (
+        "races_fts", "races", ("name", "notes"),
+        "src.name AS title, src.race_date_start AS date, NULL AS athlete_id",
+    ),
+    "athlete": (
+        "athletes_fts", "athletes", ("first_name", "last_name", "notes"),
+        "src.first_name || ' ' || src.last_name AS title, NULL AS date, src.id AS athlete_id",
+    ),
+}
+
+
+def _search_document(columns: Iterable[str], alias: str = "") -> str:
+    """PostgreSQL: the indexed columns as a single tsvector (same expression as the GIN index)."""
+    text_expr = " || ' ' || ".join(f"coalesce({alias}{c}, '')" for c in columns)
+    return f"to_tsvector('simple', {text_expr})"
+
+
+def _search_index_ddl(dialect: str = "sqlite") -> List[str]:
+    """CREATE statements (idempotent) for the search index of the given dialect.
+
+    SQLite: FTS5 tables and their sync triggers. PostgreSQL: GIN expression
+    indexes on the source tables, which need no triggers.
+    """
+    if dialect == "postgresql":
+        return [
+            f"CREATE INDEX IF NOT EXISTS ix_{source}_search ON {source} USING gin ({_search_document(columns)})"
+            for _, source, columns, _ in _SEARCH_SOURCES.values()
+        ]
+    statements = []
+    for fts, source, columns, _ in _SEARCH_SOURCES.values():
+        cols = ", ".join(columns)
+        new_values = ", ".join(f"new.{c}" for c in columns)
+        old_values = ", ".join(f"old.{c}" for c in columns)
+        insert_new = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values});"
+        delete_old = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values});"
+        statements += [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{source}', "
+            f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN {insert_new} END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN {delete_old} END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {source} "
+            f"BEGIN {delete_old} {insert_new} END",
+        ]
+    return statements
+
+
+def _creates_fresh_schema(kw: Dict[str, Any]) -> bool:
+    """Whether an after_create event comes from create_all on an empty database.
+
+    On a legacy database create_all only adds the missing tables: the triggers
+    must wait for their migration, otherwise they fire on the rows the earlier
+    migrations rewrite (an FTS5 'delete' of a row never indexed corrupts the index).
+    """
+    return any(table.name == "athletes" for table in kw.get("tables") or ())
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_search_index(target, connection, **kw) -> None:
+    """Create the search index together with the tables (fresh databases only).
+
+    Existing SQLite files get it from _migration_search_index, which also
+    populates it; PostgreSQL from _migrate_server_schema.
+    """
+    if not _creates_fresh_schema(kw):
+        return
+    for statement in _search_index_ddl(connection.dialect.name):
+        connection.execute(text(statement))
+
+
+def _change_log_ddl(dialect: str = "sqlite") -> List[str]:
+    """CREATE statements (idempotent) for the triggers that keep change_log up to date.
+
+    Updates that leave every column unchanged (e.g. a re-sync of the same data)
+    are not logged.
+    """
+    if dialect == "postgresql":
+        statements = ["""
+            CREATE OR REPLACE FUNCTION bteam_log_change() RETURNS trigger LANGUAGE plpgsql AS $$
+            DECLARE
+                target_id integer;
+                parent_exists boolean;
+            BEGIN
+                -- TG_ARGV: entità, colonna con l'id, tabella padre ('' per la tabella dell'entità)
+                IF TG_OP = 'DELETE' THEN
+                    target_id := (to_jsonb(OLD) ->> TG_ARGV[1])::integer;
+                ELSE
+                    target_id := (to_jsonb(NEW) ->> TG_ARGV[1])::integer;
+                END IF;
+                IF TG_ARGV[2] <> '' THEN
+                    EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE id = $1)', TG_ARGV[2])
+                        INTO parent_exists USING target_id;
+                    IF NOT parent_exists THEN
+                        RETURN NULL;
+                    END IF;
+                END IF;
+                INSERT INTO change_log (entity, entity_id, op)
+                VALUES (TG_ARGV[0], target_id,
+                        CASE WHEN TG_OP = 'DELETE' AND TG_ARGV[2] = '' THEN 'delete' ELSE 'upsert' END)
+                ON CONFLICT (entity, entity_id) DO UPDATE
+                SET version = nextval(pg_get_serial_sequence('change_log', 'version')), op = EXCLUDED.op;
+                RETURN NULL;
+            END $$
+        """]
+        for entity, sources in _CHANGE_SOURCES.items():
+            for table, column, parent in sources:
+                args = f"'{entity}', '{column}', '{parent or ''}'"
+                statements += [
+                    f"CREATE OR REPLACE TRIGGER change_log_{table} AFTER INSERT OR DELETE ON {table} "
+                    f"FOR EACH ROW EXECUTE FUNCTION bteam_log_change({args})",
+                    f"CREATE OR REPLACE TRIGGER change_log_{table}_au AFTER UPDATE ON {table} "
+                    f"FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION bteam_log_change({args})",
+                ]
+        return statements
+
+    statements = []
+    for entity, sources in _CHANGE_SOURCES.items():
+        for table, column, parent in sources:
+            def log(ref: str, op: str) -> str:
+                # DELETE + INSERT, non INSERT OR REPLACE: nei trigger vale la politica di conflitto
+                # dello statement esterno (es. l'upsert di upsert_activities)
+                exists = f"EXISTS (SELECT 1 FROM {parent} WHERE id = {ref}.{column})" if parent else None
+                return (
+                    f"DELETE FROM change_log WHERE entity = '{entity}' AND entity_id = {ref}.{column}"
+                    f"{f' AND {exists}' if exists else ''}; "
+                    f"INSERT INTO change_log (entity, entity_id, op) "
+                    f"SELECT '{entity}', {ref}.{column}, '{'upsert' if exists else op}'"
+                    f"{f' WHERE {exists}' if exists else ''};"
+                )
+
+            columns = [c.name for c in Base.metadata.tables[table].columns]
+            old_row = ", ".join(f"old.{c}" for c in columns)
+            new_row = ", ".join(f"new.{c}" for c in columns)
+            on_update = log("new", "upsert") if parent is None else log("old", "upsert") + " " + log("new", "upsert")
+            statements += [
+                f"CREATE TRIGGER IF NOT EXISTS change_log_{table}_ai AFTER INSERT ON {table} "
+                f"BEGIN {log('new', 'upsert')} END",
+                f"CREATE TRIGGER IF NOT EXISTS change_log_{table}_au AFTER UPDATE ON {table} "
+                f"WHEN ({old_row}) IS NOT ({new_row}) BEGIN {on_update} END",
+                f"CREATE TRIGGER IF NOT EXISTS change_log_{table}_ad AFTER DELETE ON {table} "
+                f"BEGIN {log('old', 'delete')} END",
+            ]
+    return statements
+
+
+def _change_log_seed_sql(dialect: str = "sqlite") -> List[str]:
+    """Register every existing row as an upsert (databases created before the change log)."""
+    statements = []
+    for entity, sources in _CHANGE_SOURCES.items():
+        table = sources[0][0]
+        if dialect == "postgresql":
+            statements.append(
+                f"INSERT INTO change_log (entity, entity_id, op) SELECT '{entity}', id, 'upsert' FROM {table} "
+                f"ORDER BY id ON CONFLICT (entity, entity_id) DO NOTHING"
+            )
+        else:
+            statements.append(
+                f"INSERT OR IGNORE INTO change_log (entity, entity_id, op) "
+                f"SELECT '{entity}', id, 'upsert' FROM {table} ORDER BY id"
+            )
+    return statements
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_change_log_triggers(target, connection, **kw) -> None:
+    """Create the change log triggers together with the tables (fresh databases only).
+
+    Existing SQLite files get them from _migration_change_log, PostgreSQL from
+    _migrate_server_schema.
+    """
+    if not _creates_fresh_schema(kw):
+        return
+    for statement in _change_log_ddl(connection.dialect.name):
+        connection.execute(text(statement))
+
+
+def _column_value(column_type, value: Any) -> Any:
+    """value converted to the Python type of a Boolean/Integer/Float/string column.
+
+    Raises:
+        TypeError, ValueError: if it does not fit (e.g. a dict, or text in a numeric column)
+    """
+    if isinstance(column_type, Boolean):
+        if isinstance(value, bool) or value in (0, 1):
+            return bool(value)
+        raise TypeError(value)
+    if isinstance(value, (bool, dict, list)):
+        raise TypeError(value)
+    if isinstance(column_type, Integer):
+        return int(round(float(value)))
+    if isinstance(column_type, Float):
+        return float(value)
+    if isinstance(value, str):
+        return value
+    raise TypeError(value)
+
+
+def _search_terms(query: str) -> List[str]:
+    """Words of a search query; each one is matched as a prefix."""
+    terms = re.findall(r"\w+", query or "")
+    if not terms:
+        raise ValueError("Search query must contain at least one word")
+    return terms
+
+
+# Versione dello schema sui database server (su SQLite sta in PRAGMA user_version)
+_SCHEMA_VERSION_TABLE = Table("schema_version", MetaData(), Column("version", Integer, nullable=False))
+# Chiave del pg_advisory_xact_lock che serializza l'avvio dello schema tra worker e host
+_SCHEMA_LOCK_KEY = 0x6254_6561_6D
+
+# Tabelle spostate negli archivi per stagione -> colonne dell'indice creato nell'archivio
+_ARCHIVE_TABLES: Dict[str, Tuple[str, ...]] = {
+    "activities": ("athlete_id", "activity_date"),
+    "activity_payloads": (),
+    "activity_tags": (),
+    "wellness": ("athlete_id", "wellness_date"),
+}
+
+
 class BTeamStorage:
     """Database storage using SQLAlchemy ORM."""
 
-    def __init__(self, storage_dir: Path):
+    def __init__(self, storage_dir: Path, database_url: Optional[str] = None):
+        """Open the storage: SQLite in storage_dir, or the database at database_url.
+
+        Args:
+            database_url: URL SQLAlchemy (sqlite o postgresql); default get_database_url()
+        """
         self.storage_dir = storage_dir
         self.db_path = self.storage_dir / "bteam.db"
         self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self.archive_dir = self.storage_dir / "archive"
+        self.backup_dir = get_backup_dir() or self.storage_dir / "backups"
+        self._backup_lock = threading.Lock()
+        # Indice in memoria per la deduplica delle attività (vedi _activity_index)
+        self._activity_index_lock = threading.Lock()
+        self._activity_indexes: Dict[int, Dict[str, Dict]] = {}
+        self._activity_index_rows: Dict[int, Tuple[int, Optional[str], Tuple[str, str]]] = {}
+        self._activity_index_version: Optional[int] = None
+        self._activity_index_scope: Optional[object] = None
 
         # NOTA: Non cancellare il database se lo schema è "obsoleto"!
         # Meglio migrare lo schema che perdere i dati. Il vecchio codice era pericoloso.
-        # Se serve cambiare lo schema, usare _migrate_schema() per le alterazioni.
+        # Se serve cambiare lo schema, aggiungere una migrazione numerata in _MIGRATIONS.
         
         # Old dangerous code disabled - was deleting entire database on schema detection:
         # if self.db_path.exists():
@@ -507,484 +986,754 @@ class BTeamStorage:
         #     except (sqlite3.Error, OSError) as e:
         #         print(f"[bTeam] Errore check schema: {e}")
 
-        # Initialize SQLAlchemy engine and session
-        db_url = f"sqlite:///{self.db_path.as_posix()}"
-        self.engine = create_engine(db_url, echo=False, connect_args={"check_same_thread": False})
-        Base.metadata.create_all(self.engine)
-        
-        # Migrate schema if needed (add new columns)
-        self._migrate_schema()
+        # Initialize SQLAlchemy engine with a real connection pool
+        db_url = make_url(database_url or get_database_url() or f"sqlite:///{self.db_path.as_posix()}")
+        self.dialect = db_url.get_backend_name()
+        if self.dialect not in ("sqlite", "postgresql"):
+            raise ValueError(f"Unsupported database backend: {self.dialect}")
+        self.is_sqlite = self.dialect == "sqlite"
+        if self.is_sqlite and db_url.database:
+            self.db_path = Path(db_url.database)
+        # Archivi per stagione (solo SQLite): anno -> file, attaccati a ogni connessione
+        self.archives: Dict[int, Path] = self._find_archives() if self.is_sqlite else {}
+        self._archive_metadata = MetaData()
+        self.engine = create_engine(
+            db_url,
+            echo=False,
+            connect_args={"check_same_thread": False} if self.is_sqlite else {},
+            poolclass=QueuePool,
+            pool_pre_ping=True,
+            **get_db_pool_settings(),
+        )
+        # Profilo SQLite (WAL, synchronous, cache, busy_timeout...) su ogni connessione del pool
+        self.sqlite_pragmas = get_sqlite_pragmas() if self.is_sqlite else {}
+        if self.is_sqlite:
+            _install_sqlite_pragmas(self.engine, self.sqlite_pragmas)
+            _install_archive_attach(self.engine, lambda: self.archives)
+
+        # Schema versionato: se è già aggiornato costa una sola lettura
+        if self.is_sqlite:
+            self._migrate_schema()
+        else:
+            self._migrate_server_schema()
         
-        SessionLocal = sessionmaker(bind=self.engine)
-        self.session: SQLAlchemySession = SessionLocal()
+        # Una sessione per unità di lavoro: ogni richiesta ha la sua (vedi session_scope),
+        # fuori da una richiesta si ricade su una sessione per thread.
+        self.SessionLocal = sessionmaker(bind=self.engine)
+        self.session: scoped_session[SQLAlchemySession] = scoped_session(
+            self.SessionLocal, scopefunc=_current_session_scope
+        )
+
+    @contextmanager
+    def session_scope(self) -> Iterator[SQLAlchemySession]:
+        """Run a unit of work on its own session, closed (and rolled back on error) at exit.
+
+        All storage methods called inside the block share this session; concurrent
+        scopes get independent sessions and pooled connections.
+        """
+        token = _session_scope_id.set(object())
+        try:
+            yield self.session()
+        except Exception:
+            self.session.rollback()
+            raise
+        finally:
+            self.session.remove()
+            _session_scope_id.reset(token)
+
+    def _busy_timeout_seconds(self) -> float:
+        """busy_timeout of the storage profile, for raw sqlite3 connections."""
+        try:
+            return int(self.sqlite_pragmas.get("busy_timeout", 5000)) / 1000
+        except (TypeError, ValueError):
+            return 5.0
+
+    # Migrazioni numerate dello schema: (versione, metodo). Aggiungere in coda, mai rinumerare.
+    _MIGRATIONS: Tuple[Tuple[int, str], ...] = (
+        (1, "_migration_legacy_columns"),
+        (2, "_migration_secondary_indexes"),
+        (3, "_migration_activity_payloads"),
+        (4, "_migration_wellness_date_index"),
+        (5, "_migration_races_date_index"),
+        (6, "_migration_activity_tags"),
+        (7, "_migration_search_index"),
+        (8, "_migration_change_log"),
+        (9, "_migration_sync_state"),
+    )
+    SCHEMA_VERSION = _MIGRATIONS[-1][0]
 
     def _migrate_schema(self) -> None:
-        """Add missing columns to existing tables."""
+        """Bring the database to SCHEMA_VERSION, tracked in PRAGMA user_version.
+
+        When the stored version already matches nothing else runs. Otherwise missing
+        tables are created and every pending migration is applied in its own
+        transaction together with its version bump, so a failed step is rolled back
+        and retried at the next start.
+        """
+        with self.engine.connect() as conn:
+            version = int(conn.exec_driver_sql("PRAGMA user_version").scalar() or 0)
+            if version == self.SCHEMA_VERSION:
+                return
+            fresh = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='athletes'"
+            ).first() is None
+
+        Base.metadata.create_all(self.engine)
+
+        # isolation_level=None: le transazioni (anche DDL) le apriamo noi con BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.db_path, timeout=self._busy_timeout_seconds(), isolation_level=None)
         try:
-            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
-            
-            # Get existing columns in activities table
-            cursor.execute("PRAGMA table_info(activities)")
-            activities_cols = {row[1] for row in cursor.fetchall()}
-            
-            # Define new columns for activities
-            activity_columns = [
-                ("intervals_id", "TEXT"),
-                ("is_race", "BOOLEAN DEFAULT 0"),
-                ("tags", "TEXT DEFAULT '[]'"),
-                ("avg_watts", "REAL"),
-                ("normalized_watts", "REAL"),
-                ("avg_hr", "REAL"),
-                ("max_hr", "REAL"),
-                ("avg_cadence", "REAL"),
-                ("training_load", "REAL"),
-                ("intensity", "REAL"),
-                ("feel", "INTEGER"),
-                ("calories", "REAL"),
-                ("activity_type", "TEXT"),
-            ]
-            
-            # Add missing columns to activities
-            for col_name, col_def in activity_columns:
-                if col_name not in activities_cols:
-                    try:
-                        cursor.execute(f"ALTER TABLE activities ADD COLUMN {col_name} {col_def}")
-                        print(f"[bTeam] Colonna '{col_name}' aggiunta alla tabella activities")
-                    except sqlite3.OperationalError as e:
-                        if "duplicate column name" not in str(e).lower():
-                            print(f"[bTeam] Errore aggiunta colonna '{col_name}': {e}")
-            
-            # Get existing columns in athletes table
-            cursor.execute("PRAGMA table_info(athletes)")
-            athletes_cols = {row[1] for row in cursor.fetchall()}
-            
-            # Add kj_per_hour_per_kg to athletes if missing
-            if "kj_per_hour_per_kg" not in athletes_cols:
-                try:
-                    cursor.execute("ALTER TABLE athletes ADD COLUMN kj_per_hour_per_kg REAL DEFAULT 10.0")
-                    print(f"[bTeam] Colonna 'kj_per_hour_per_kg' aggiunta alla tabella athletes")
-                except sqlite3.OperationalError as e:
-                    if "duplicate column name" not in str(e).lower():
-                        print(f"[bTeam] Errore aggiunta colonna 'kj_per_hour_per_kg': {e}")
-            
-            # Add ecp and ew_prime columns to athletes if missing
-            if "ecp" not in athletes_cols:
+            for target, method_name in self._MIGRATIONS:
+                cursor.execute("BEGIN IMMEDIATE")
                 try:
-                    cursor.execute("ALTER TABLE athletes ADD COLUMN ecp REAL DEFAULT NULL")
-                    print(f"[bTeam] Colonna 'ecp' aggiunta alla tabella athletes")
-                except sqlite3.OperationalError as e:
-                    if "duplicate column name" not in str(e).lower():
-                        print(f"[bTeam] Errore aggiunta colonna 'ecp': {e}")
-            
-            if "ew_prime" not in athletes_cols:
+                    # Riletta sotto lock: un altro worker può aver già migrato nel frattempo
+                    current = cursor.execute("PRAGMA user_version").fetchone()[0]
+                    if current < target:
+                        # Un DB appena creato da create_all ha già lo schema finale
+                        if not fresh:
+                            getattr(self, method_name)(cursor)
+                            print(f"[bTeam] Migrazione schema v{target} applicata ({method_name})")
+                        cursor.execute(f"PRAGMA user_version = {int(target)}")
+                    conn.commit()
+                except Exception as e:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    # Meglio non partire che girare su uno schema a metà (es. senza gli indici unici)
+                    print(f"[bTeam] Errore migrazione schema v{target} ({method_name}): {e}")
+                    raise RuntimeError(f"Schema migration v{target} ({method_name}) failed: {e}") from e
+        finally:
+            conn.close()
+
+    def _migrate_server_schema(self) -> None:
+        """Bring a server database (PostgreSQL) to SCHEMA_VERSION, tracked in schema_version.
+
+        The numbered _MIGRATIONS upgrade legacy SQLite files and never apply here:
+        a server database is synced additively instead (missing tables, indexes
+        and search indexes). An advisory lock lets only one worker, on any host,
+        do it at a time.
+        """
+        with self.engine.begin() as conn:
+            conn.execute(select(func.pg_advisory_xact_lock(_SCHEMA_LOCK_KEY)))
+            _SCHEMA_VERSION_TABLE.create(conn, checkfirst=True)
+            version = conn.execute(select(_SCHEMA_VERSION_TABLE.c.version)).scalar()
+            if version == self.SCHEMA_VERSION:
+                return
+
+            Base.metadata.create_all(conn)
+            inspector = sa_inspect(conn)
+            for table in Base.metadata.sorted_tables:
+                existing = {index["name"] for index in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name not in existing:
+                        index.create(conn)
+            for statement in _search_index_ddl(self.dialect) + _change_log_ddl(self.dialect):
+                conn.execute(text(statement))
+            if version is not None:
+                for statement in _change_log_seed_sql(self.dialect):
+                    conn.execute(text(statement))
+
+            if version is None:
+                conn.execute(_SCHEMA_VERSION_TABLE.insert().values(version=self.SCHEMA_VERSION))
+            else:
+                conn.execute(_SCHEMA_VERSION_TABLE.update().values(version=self.SCHEMA_VERSION))
+        print(f"[bTeam] Schema database v{self.SCHEMA_VERSION} applicato ({self.dialect})")
+
+    def _migration_legacy_columns(self, cursor: sqlite3.Cursor) -> None:
+        """Columns and tables added before schema versioning (each step is idempotent)."""
+        # Get existing columns in activities table
+        cursor.execute("PRAGMA table_info(activities)")
+        activities_cols = {row[1] for row in cursor.fetchall()}
+
+        # Define new columns for activities
+        activity_columns = [
+            ("intervals_id", "TEXT"),
+            ("is_race", "BOOLEAN DEFAULT 0"),
+            ("tags", "TEXT DEFAULT '[]'"),
+            ("avg_watts", "REAL"),
+            ("normalized_watts", "REAL"),
+            ("avg_hr", "REAL"),
+            ("max_hr", "REAL"),
+            ("avg_cadence", "REAL"),
+            ("training_load", "REAL"),
+            ("intensity", "REAL"),
+            ("feel", "INTEGER"),
+            ("calories", "REAL"),
+            ("activity_type", "TEXT"),
+        ]
+
+        # Add missing columns to activities
+        for col_name, col_def in activity_columns:
+            if col_name not in activities_cols:
                 try:
-                    cursor.execute("ALTER TABLE athletes ADD COLUMN ew_prime REAL DEFAULT NULL")
-                    print(f"[bTeam] Colonna 'ew_prime' aggiunta alla tabella athletes")
+                    cursor.execute(f"ALTER TABLE activities ADD COLUMN {col_name} {col_def}")
+                    print(f"[bTeam] Colonna '{col_name}' aggiunta alla tabella activities")
                 except sqlite3.OperationalError as e:
                     if "duplicate column name" not in str(e).lower():
-                        print(f"[bTeam] Errore aggiunta colonna 'ew_prime': {e}")
-            
-            # Add gender column to athletes if missing
-            if "gender" not in athletes_cols:
+                        print(f"[bTeam] Errore aggiunta colonna '{col_name}': {e}")
+
+        # Get existing columns in athletes table
+        cursor.execute("PRAGMA table_info(athletes)")
+        athletes_cols = {row[1] for row in cursor.fetchall()}
+
+        # Add kj_per_hour_per_kg to athletes if missing
+        if "kj_per_hour_per_kg" not in athletes_cols:
+            try:
+                cursor.execute("ALTER TABLE athletes ADD COLUMN kj_per_hour_per_kg REAL DEFAULT 10.0")
+                print(f"[bTeam] Colonna 'kj_per_hour_per_kg' aggiunta alla tabella athletes")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e).lower():
+                    print(f"[bTeam] Errore aggiunta colonna 'kj_per_hour_per_kg': {e}")
+
+        # Add ecp and ew_prime columns to athletes if missing
+        if "ecp" not in athletes_cols:
+            try:
+                cursor.execute("ALTER TABLE athletes ADD COLUMN ecp REAL DEFAULT NULL")
+                print(f"[bTeam] Colonna 'ecp' aggiunta alla tabella athletes")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e).lower():
+                    print(f"[bTeam] Errore aggiunta colonna 'ecp': {e}")
+
+        if "ew_prime" not in athletes_cols:
+            try:
+                cursor.execute("ALTER TABLE athletes ADD COLUMN ew_prime REAL DEFAULT NULL")
+                print(f"[bTeam] Colonna 'ew_prime' aggiunta alla tabella athletes")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e).lower():
+                    print(f"[bTeam] Errore aggiunta colonna 'ew_prime': {e}")
+
+        # Add gender column to athletes if missing
+        if "gender" not in athletes_cols:
+            try:
+                cursor.execute("ALTER TABLE athletes ADD COLUMN gender TEXT DEFAULT NULL")
+                print(f"[bTeam] Colonna 'gender' aggiunta alla tabella athletes")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e).lower():
+                    print(f"[bTeam] Errore aggiunta colonna 'gender': {e}")
+
+        # Add category_id column to athletes if missing
+        if "category_id" not in athletes_cols:
+            try:
+                cursor.execute("ALTER TABLE athletes ADD COLUMN category_id INTEGER DEFAULT NULL")
+                print(f"[bTeam] Colonna 'category_id' aggiunta alla tabella athletes")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e).lower():
+                    print(f"[bTeam] Errore aggiunta colonna 'category_id': {e}")
+
+        # Add max_hr column to athletes if missing
+        if "max_hr" not in athletes_cols:
+            try:
+                cursor.execute("ALTER TABLE athletes ADD COLUMN max_hr REAL DEFAULT NULL")
+                print(f"[bTeam] Colonna 'max_hr' aggiunta alla tabella athletes")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e).lower():
+                    print(f"[bTeam] Errore aggiunta colonna 'max_hr': {e}")
+
+        # Add custom_cp_configs column to athletes if missing
+        if "custom_cp_configs" not in athletes_cols:
+            try:
+                cursor.execute("ALTER TABLE athletes ADD COLUMN custom_cp_configs TEXT DEFAULT NULL")
+                print(f"[bTeam] Colonna 'custom_cp_configs' aggiunta alla tabella athletes")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e).lower():
+                    print(f"[bTeam] Errore aggiunta colonna 'custom_cp_configs': {e}")
+
+        # Add api_key column to athletes if missing
+        if "api_key" not in athletes_cols:
+            try:
+                cursor.execute("ALTER TABLE athletes ADD COLUMN api_key TEXT DEFAULT NULL")
+                print(f"[bTeam] Colonna 'api_key' aggiunta alla tabella athletes")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e).lower():
+                    print(f"[bTeam] Errore aggiunta colonna 'api_key': {e}")
+
+        # Add notes column to athletes if missing
+        if "notes" not in athletes_cols:
+            try:
+                cursor.execute("ALTER TABLE athletes ADD COLUMN notes TEXT DEFAULT NULL")
+                print(f"[bTeam] Colonna 'notes' aggiunta alla tabella athletes")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e).lower():
+                    print(f"[bTeam] Errore aggiunta colonna 'notes': {e}")
+
+        # Get existing columns in races table
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='races'")
+        races_exists = cursor.fetchone() is not None
+        if races_exists:
+            cursor.execute("PRAGMA table_info(races)")
+            races_cols = {row[1] for row in cursor.fetchall()}
+            if "athlete_id" in races_cols:
+                # Races table has old schema - need to migrate
+                print("[bTeam] Rilevato schema vecchio delle gare, migrazione in corso...")
+                # Copy old data to temporary table
+                cursor.execute("""
+                    CREATE TABLE races_old AS 
+                    SELECT * FROM races
+                """)
+                # Drop old races table
+                cursor.execute("DROP TABLE races")
+                # Recreate it with the current model schema, in the same transaction
+                cursor.execute(str(CreateTable(Race.__table__).compile(dialect=sqlite_dialect.dialect())))
+                print("[bTeam] Tabella gare ricreata con nuovo schema (senza athlete_id)")
+
+            # Add gender column if missing
+            if "gender" not in races_cols:
                 try:
-                    cursor.execute("ALTER TABLE athletes ADD COLUMN gender TEXT DEFAULT NULL")
-                    print(f"[bTeam] Colonna 'gender' aggiunta alla tabella athletes")
+                    cursor.execute("ALTER TABLE races ADD COLUMN gender TEXT DEFAULT NULL")
+                    print(f"[bTeam] Colonna 'gender' aggiunta alla tabella races")
                 except sqlite3.OperationalError as e:
                     if "duplicate column name" not in str(e).lower():
                         print(f"[bTeam] Errore aggiunta colonna 'gender': {e}")
 
-            # Add category_id column to athletes if missing
-            if "category_id" not in athletes_cols:
+            # Add race_date_start column if missing (migration from race_date)
+            if "race_date_start" not in races_cols:
                 try:
-                    cursor.execute("ALTER TABLE athletes ADD COLUMN category_id INTEGER DEFAULT NULL")
-                    print(f"[bTeam] Colonna 'category_id' aggiunta alla tabella athletes")
+                    cursor.execute("ALTER TABLE races ADD COLUMN race_date_start TEXT DEFAULT NULL")
+                    print(f"[bTeam] Colonna 'race_date_start' aggiunta alla tabella races")
+                    # If old race_date column exists, copy its data
+                    if "race_date" in races_cols:
+                        cursor.execute("UPDATE races SET race_date_start = race_date WHERE race_date_start IS NULL")
+                        print(f"[bTeam] Dati da 'race_date' copiati a 'race_date_start'")
                 except sqlite3.OperationalError as e:
                     if "duplicate column name" not in str(e).lower():
-                        print(f"[bTeam] Errore aggiunta colonna 'category_id': {e}")
-
-            # Add max_hr column to athletes if missing
-            if "max_hr" not in athletes_cols:
+                        print(f"[bTeam] Errore aggiunta colonna 'race_date_start': {e}")
+            elif "race_date" in races_cols:
+                # race_date_start already exists, but make sure race_date is populated from it for backward compat
                 try:
-                    cursor.execute("ALTER TABLE athletes ADD COLUMN max_hr REAL DEFAULT NULL")
-                    print(f"[bTeam] Colonna 'max_hr' aggiunta alla tabella athletes")
+                    cursor.execute("UPDATE races SET race_date = race_date_start WHERE race_date IS NULL AND race_date_start IS NOT NULL")
+                    print(f"[bTeam] Dati da 'race_date_start' copiati a 'race_date' per compatibilità")
                 except sqlite3.OperationalError as e:
-                    if "duplicate column name" not in str(e).lower():
-                        print(f"[bTeam] Errore aggiunta colonna 'max_hr': {e}")
+                    print(f"[bTeam] Avviso aggiornamento 'race_date': {e}")
 
-            # Add custom_cp_configs column to athletes if missing
-            if "custom_cp_configs" not in athletes_cols:
+            # Add race_date_end column if missing
+            if "race_date_end" not in races_cols:
                 try:
-                    cursor.execute("ALTER TABLE athletes ADD COLUMN custom_cp_configs TEXT DEFAULT NULL")
-                    print(f"[bTeam] Colonna 'custom_cp_configs' aggiunta alla tabella athletes")
+                    cursor.execute("ALTER TABLE races ADD COLUMN race_date_end TEXT DEFAULT NULL")
+                    print(f"[bTeam] Colonna 'race_date_end' aggiunta alla tabella races")
+                    # Copy race_date_start to race_date_end if not set
+                    cursor.execute("UPDATE races SET race_date_end = race_date_start WHERE race_date_end IS NULL AND race_date_start IS NOT NULL")
+                    print(f"[bTeam] Dati da 'race_date_start' copiati a 'race_date_end'")
                 except sqlite3.OperationalError as e:
                     if "duplicate column name" not in str(e).lower():
-                        print(f"[bTeam] Errore aggiunta colonna 'custom_cp_configs': {e}")
+                        print(f"[bTeam] Errore aggiunta colonna 'race_date_end': {e}")
 
-            # Add api_key column to athletes if missing
-            if "api_key" not in athletes_cols:
+            # Add num_stages column if missing (migration from race_days)
+            if "num_stages" not in races_cols:
                 try:
-                    cursor.execute("ALTER TABLE athletes ADD COLUMN api_key TEXT DEFAULT NULL")
-                    print(f"[bTeam] Colonna 'api_key' aggiunta alla tabella athletes")
+                    cursor.execute("ALTER TABLE races ADD COLUMN num_stages INTEGER DEFAULT 1")
+                    print(f"[bTeam] Colonna 'num_stages' aggiunta alla tabella races")
+                    # If old race_days column exists, copy its data
+                    if "race_days" in races_cols:
+                        cursor.execute("UPDATE races SET num_stages = race_days WHERE num_stages = 1 AND race_days > 1")
+                        print(f"[bTeam] Dati da 'race_days' copiati a 'num_stages'")
                 except sqlite3.OperationalError as e:
                     if "duplicate column name" not in str(e).lower():
-                        print(f"[bTeam] Errore aggiunta colonna 'api_key': {e}")
+                        print(f"[bTeam] Errore aggiunta colonna 'num_stages': {e}")
 
-            # Add notes column to athletes if missing
-            if "notes" not in athletes_cols:
+            # Add route_link column if missing
+            if "route_link" not in races_cols:
                 try:
-                    cursor.execute("ALTER TABLE athletes ADD COLUMN notes TEXT DEFAULT NULL")
-                    print(f"[bTeam] Colonna 'notes' aggiunta alla tabella athletes")
+                    cursor.execute("ALTER TABLE races ADD COLUMN route_link VARCHAR(500)")
+                    print(f"[bTeam] Colonna 'route_link' aggiunta alla tabella races")
                 except sqlite3.OperationalError as e:
                     if "duplicate column name" not in str(e).lower():
-                        print(f"[bTeam] Errore aggiunta colonna 'notes': {e}")
-            
-            # Get existing columns in races table
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='races'")
-            races_exists = cursor.fetchone() is not None
-            if races_exists:
-                cursor.execute("PRAGMA table_info(races)")
-                races_cols = {row[1] for row in cursor.fetchall()}
-                if "athlete_id" in races_cols:
-                    # Races table has old schema - need to migrate
-                    print("[bTeam] Rilevato schema vecchio delle gare, migrazione in corso...")
-                    # Copy old data to temporary table
-                    cursor.execute("""
-                        CREATE TABLE races_old AS 
-                        SELECT * FROM races
-                    """)
-                    # Drop old races table
-                    cursor.execute("DROP TABLE races")
-                    # Create new races table with SQLAlchemy (will be done by create_all)
-                    print("[bTeam] Tabella gare ricreata con nuovo schema (senza athlete_id)")
-                
-                # Add gender column if missing
-                if "gender" not in races_cols:
-                    try:
-                        cursor.execute("ALTER TABLE races ADD COLUMN gender TEXT DEFAULT NULL")
-                        print(f"[bTeam] Colonna 'gender' aggiunta alla tabella races")
-                    except sqlite3.OperationalError as e:
-                        if "duplicate column name" not in str(e).lower():
-                            print(f"[bTeam] Errore aggiunta colonna 'gender': {e}")
-                
-                # Add race_date_start column if missing (migration from race_date)
-                if "race_date_start" not in races_cols:
-                    try:
-                        cursor.execute("ALTER TABLE races ADD COLUMN race_date_start TEXT DEFAULT NULL")
-                        print(f"[bTeam] Colonna 'race_date_start' aggiunta alla tabella races")
-                        # If old race_date column exists, copy its data
-                        if "race_date" in races_cols:
-                            cursor.execute("UPDATE races SET race_date_start = race_date WHERE race_date_start IS NULL")
-                            print(f"[bTeam] Dati da 'race_date' copiati a 'race_date_start'")
-                    except sqlite3.OperationalError as e:
-                        if "duplicate column name" not in str(e).lower():
-                            print(f"[bTeam] Errore aggiunta colonna 'race_date_start': {e}")
-                elif "race_date" in races_cols:
-                    # race_date_start already exists, but make sure race_date is populated from it for backward compat
-                    try:
-                        cursor.execute("UPDATE races SET race_date = race_date_start WHERE race_date IS NULL AND race_date_start IS NOT NULL")
-                        print(f"[bTeam] Dati da 'race_date_start' copiati a 'race_date' per compatibilità")
-                    except sqlite3.OperationalError as e:
-                        print(f"[bTeam] Avviso aggiornamento 'race_date': {e}")
-                
-                # Add race_date_end column if missing
-                if "race_date_end" not in races_cols:
-                    try:
-                        cursor.execute("ALTER TABLE races ADD COLUMN race_date_end TEXT DEFAULT NULL")
-                        print(f"[bTeam] Colonna 'race_date_end' aggiunta alla tabella races")
-                        # Copy race_date_start to race_date_end if not set
-                        cursor.execute("UPDATE races SET race_date_end = race_date_start WHERE race_date_end IS NULL AND race_date_start IS NOT NULL")
-                        print(f"[bTeam] Dati da 'race_date_start' copiati a 'race_date_end'")
-                    except sqlite3.OperationalError as e:
-                        if "duplicate column name" not in str(e).lower():
-                            print(f"[bTeam] Errore aggiunta colonna 'race_date_end': {e}")
-                
-                # Add num_stages column if missing (migration from race_days)
-                if "num_stages" not in races_cols:
-                    try:
-                        cursor.execute("ALTER TABLE races ADD COLUMN num_stages INTEGER DEFAULT 1")
-                        print(f"[bTeam] Colonna 'num_stages' aggiunta alla tabella races")
-                        # If old race_days column exists, copy its data
-                        if "race_days" in races_cols:
-                            cursor.execute("UPDATE races SET num_stages = race_days WHERE num_stages = 1 AND race_days > 1")
-                            print(f"[bTeam] Dati da 'race_days' copiati a 'num_stages'")
-                    except sqlite3.OperationalError as e:
-                        if "duplicate column name" not in str(e).lower():
-                            print(f"[bTeam] Errore aggiunta colonna 'num_stages': {e}")
-                
-                # Add route_link column if missing
-                if "route_link" not in races_cols:
-                    try:
-                        cursor.execute("ALTER TABLE races ADD COLUMN route_link VARCHAR(500)")
-                        print(f"[bTeam] Colonna 'route_link' aggiunta alla tabella races")
-                    except sqlite3.OperationalError as e:
-                        if "duplicate column name" not in str(e).lower():
-                            print(f"[bTeam] Errore aggiunta colonna 'route_link': {e}")
-            
-            # Get existing columns in race_athletes table
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='race_athletes'")
-            race_athletes_exists = cursor.fetchone() is not None
-            if race_athletes_exists:
-                cursor.execute("PRAGMA table_info(race_athletes)")
-                race_athletes_cols = {row[1] for row in cursor.fetchall()}
-                
-                # Add kj_per_hour_per_kg if missing
-                if "kj_per_hour_per_kg" not in race_athletes_cols:
-                    try:
-                        cursor.execute("ALTER TABLE race_athletes ADD COLUMN kj_per_hour_per_kg REAL DEFAULT 10.0")
-                        print(f"[bTeam] Colonna 'kj_per_hour_per_kg' aggiunta alla tabella race_athletes")
-                    except sqlite3.OperationalError as e:
-                        if "duplicate column name" not in str(e).lower():
-                            print(f"[bTeam] Errore aggiunta colonna 'kj_per_hour_per_kg': {e}")
-                
-                # Add objective if missing
-                if "objective" not in race_athletes_cols:
-                    try:
-                        cursor.execute("ALTER TABLE race_athletes ADD COLUMN objective TEXT DEFAULT 'C'")
-                        print(f"[bTeam] Colonna 'objective' aggiunta alla tabella race_athletes")
-                    except sqlite3.OperationalError as e:
-                        if "duplicate column name" not in str(e).lower():
-                            print(f"[bTeam] Errore aggiunta colonna 'objective': {e}")
-            
-            # Create race_stages table if it doesn't exist
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='race_stages'")
-            race_stages_exists = cursor.fetchone() is not None
-            
-            if not race_stages_exists:
-                try:
-                    cursor.execute("""
-                        CREATE TABLE race_stages (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            race_id INTEGER NOT NULL,
-                            stage_number INTEGER NOT NULL,
-                            distance_km REAL NOT NULL,
-                            elevation_m REAL,
-                            route_file VARCHAR(500),
-                            route_link VARCHAR(500),
-                            notes TEXT,
-                            stage_date VARCHAR(255),
-                            avg_speed_kmh REAL,
-                            created_at VARCHAR(255),
-                            FOREIGN KEY (race_id) REFERENCES races(id) ON DELETE CASCADE
-                        )
-                    """)
-                    print(f"[bTeam] Tabella 'race_stages' creata")
-                except sqlite3.Error as e:
-                    print(f"[bTeam] Errore creazione tabella 'race_stages': {e}")
-            
-            # Add missing columns to race_stages table if they don't exist
-            if race_stages_exists:
+                        print(f"[bTeam] Errore aggiunta colonna 'route_link': {e}")
+
+        # Get existing columns in race_athletes table
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='race_athletes'")
+        race_athletes_exists = cursor.fetchone() is not None
+        if race_athletes_exists:
+            cursor.execute("PRAGMA table_info(race_athletes)")
+            race_athletes_cols = {row[1] for row in cursor.fetchall()}
+
+            # Add kj_per_hour_per_kg if missing
+            if "kj_per_hour_per_kg" not in race_athletes_cols:
                 try:
-                    # Add stage_date column
-                    cursor.execute("ALTER TABLE race_stages ADD COLUMN stage_date VARCHAR(255)")
+                    cursor.execute("ALTER TABLE race_athletes ADD COLUMN kj_per_hour_per_kg REAL DEFAULT 10.0")
+                    print(f"[bTeam] Colonna 'kj_per_hour_per_kg' aggiunta alla tabella race_athletes")
                 except sqlite3.OperationalError as e:
                     if "duplicate column name" not in str(e).lower():
-                        print(f"[bTeam] Errore aggiunta colonna 'stage_date': {e}")
-                
+                        print(f"[bTeam] Errore aggiunta colonna 'kj_per_hour_per_kg': {e}")
+
+            # Add objective if missing
+            if "objective" not in race_athletes_cols:
                 try:
-                    # Add avg_speed_kmh column
-                    cursor.execute("ALTER TABLE race_stages ADD COLUMN avg_speed_kmh REAL")
+                    cursor.execute("ALTER TABLE race_athletes ADD COLUMN objective TEXT DEFAULT 'C'")
+                    print(f"[bTeam] Colonna 'objective' aggiunta alla tabella race_athletes")
                 except sqlite3.OperationalError as e:
                     if "duplicate column name" not in str(e).lower():
-                        print(f"[bTeam] Errore aggiunta colonna 'avg_speed_kmh': {e}")
-                
+                        print(f"[bTeam] Errore aggiunta colonna 'objective': {e}")
+
+        # Create race_stages table if it doesn't exist
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='race_stages'")
+        race_stages_exists = cursor.fetchone() is not None
+
+        if not race_stages_exists:
+            try:
+                cursor.execute("""
+                    CREATE TABLE race_stages (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        race_id INTEGER NOT NULL,
+                        stage_number INTEGER NOT NULL,
+                        distance_km REAL NOT NULL,
+                        elevation_m REAL,
+                        route_file VARCHAR(500),
+                        route_link VARCHAR(500),
+                        notes TEXT,
+                        stage_date VARCHAR(255),
+                        avg_speed_kmh REAL,
+                        created_at VARCHAR(255),
+                        FOREIGN KEY (race_id) REFERENCES races(id) ON DELETE CASCADE
+                    )
+                """)
+                print(f"[bTeam] Tabella 'race_stages' creata")
+            except sqlite3.Error as e:
+                print(f"[bTeam] Errore creazione tabella 'race_stages': {e}")
+
+        # Add missing columns to race_stages table if they don't exist
+        if race_stages_exists:
+            try:
+                # Add stage_date column
+                cursor.execute("ALTER TABLE race_stages ADD COLUMN stage_date VARCHAR(255)")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e).lower():
+                    print(f"[bTeam] Errore aggiunta colonna 'stage_date': {e}")
+
+            try:
+                # Add avg_speed_kmh column
+                cursor.execute("ALTER TABLE race_stages ADD COLUMN avg_speed_kmh REAL")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e).lower():
+                    print(f"[bTeam] Errore aggiunta colonna 'avg_speed_kmh': {e}")
+
+            try:
+                # Add route_link column
+                cursor.execute("ALTER TABLE race_stages ADD COLUMN route_link VARCHAR(500)")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e).lower():
+                    print(f"[bTeam] Errore aggiunta colonna 'route_link': {e}")
+
+        # Check if race_stages table is empty and needs to be populated
+        if race_stages_exists or True:  # Always try to populate if none exist
+            try:
+                cursor.execute("SELECT COUNT(*) FROM race_stages")
+                stages_count = cursor.fetchone()[0]
+
+                if stages_count == 0:
+                    # Table is empty, populate from existing races
+                    print(f"[bTeam] Populating race_stages from existing races...")
+                    cursor.execute("SELECT id, distance_km, elevation_m, route_file FROM races")
+                    races = cursor.fetchall()
+                    for race_id, distance_km, elevation_m, route_file in races:
+                        cursor.execute("SELECT num_stages FROM races WHERE id = ?", (race_id,))
+                        result = cursor.fetchone()
+                        num_stages = result[0] if result else 1
+                        now = datetime.utcnow().isoformat()
+
+                        for stage_num in range(1, (num_stages or 1) + 1):
+                            cursor.execute("""
+                                INSERT INTO race_stages 
+                                (race_id, stage_number, distance_km, elevation_m, route_file, created_at)
+                                VALUES (?, ?, ?, ?, ?, ?)
+                            """, (
+                                race_id,
+                                stage_num,
+                                (distance_km / num_stages if distance_km and num_stages else 0),
+                                (elevation_m / num_stages if elevation_m and num_stages else None),
+                                (route_file if stage_num == 1 else None),
+                                now
+                            ))
+                    print(f"[bTeam] Tappe populate da gare esistenti")
+            except sqlite3.Error as e:
+                print(f"[bTeam] Errore popolazione race_stages: {e}")
+
+        # Get existing columns in wellness table
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='wellness'")
+        wellness_exists = cursor.fetchone() is not None
+        if wellness_exists:
+            cursor.execute("PRAGMA table_info(wellness)")
+            wellness_cols = {row[1] for row in cursor.fetchall()}
+
+            # List of all expected columns for wellness
+            expected_cols = {
+                'id', 'athlete_id', 'wellness_date', 'weight_kg', 'resting_hr', 'hrv', 'steps',
+                'soreness', 'fatigue', 'stress', 'mood', 'motivation', 'injury', 'kcal',
+                'sleep_secs', 'sleep_score', 'sleep_quality', 'avg_sleeping_hr', 'menstruation',
+                'menstrual_cycle_phase', 'body_fat', 'respiration', 'spO2', 'readiness', 'ctl', 'atl', 'ramp_rate', 'comments', 'created_at'
+            }
+
+            # Add missing columns
+            missing_cols = expected_cols - wellness_cols
+            for col_name in missing_cols:
                 try:
-                    # Add route_link column
-                    cursor.execute("ALTER TABLE race_stages ADD COLUMN route_link VARCHAR(500)")
+                    if col_name == 'sleep_quality':
+                        cursor.execute("ALTER TABLE wellness ADD COLUMN sleep_quality INTEGER DEFAULT NULL")
+                    elif col_name == 'avg_sleeping_hr':
+                        cursor.execute("ALTER TABLE wellness ADD COLUMN avg_sleeping_hr REAL DEFAULT NULL")
+                    elif col_name == 'body_fat':
+                        cursor.execute("ALTER TABLE wellness ADD COLUMN body_fat REAL DEFAULT NULL")
+                    elif col_name == 'respiration':
+                        cursor.execute("ALTER TABLE wellness ADD COLUMN respiration REAL DEFAULT NULL")
+                    elif col_name == 'spO2':
+                        cursor.execute("ALTER TABLE wellness ADD COLUMN spO2 REAL DEFAULT NULL")
+                    elif col_name == 'readiness':
+                        cursor.execute("ALTER TABLE wellness ADD COLUMN readiness REAL DEFAULT NULL")
+                    elif col_name == 'ctl':
+                        cursor.execute("ALTER TABLE wellness ADD COLUMN ctl REAL DEFAULT NULL")
+                    elif col_name == 'atl':
+                        cursor.execute("ALTER TABLE wellness ADD COLUMN atl REAL DEFAULT NULL")
+                    elif col_name == 'ramp_rate':
+                        cursor.execute("ALTER TABLE wellness ADD COLUMN ramp_rate REAL DEFAULT NULL")
+                    elif col_name == 'comments':
+                        cursor.execute("ALTER TABLE wellness ADD COLUMN comments TEXT DEFAULT NULL")
+                    elif col_name == 'menstruation':
+                        cursor.execute("ALTER TABLE wellness ADD COLUMN menstruation BOOLEAN DEFAULT NULL")
+                    elif col_name == 'menstrual_cycle_phase':
+                        cursor.execute("ALTER TABLE wellness ADD COLUMN menstrual_cycle_phase INTEGER DEFAULT NULL")
+                    else:
+                        # Skip id, athlete_id, wellness_date, created_at as they are already there
+                        continue
+                    print(f"[bTeam] Colonna '{col_name}' aggiunta alla tabella wellness")
                 except sqlite3.OperationalError as e:
                     if "duplicate column name" not in str(e).lower():
-                        print(f"[bTeam] Errore aggiunta colonna 'route_link': {e}")
-            
-            # Check if race_stages table is empty and needs to be populated
-            if race_stages_exists or True:  # Always try to populate if none exist
-                try:
-                    cursor.execute("SELECT COUNT(*) FROM race_stages")
-                    stages_count = cursor.fetchone()[0]
-                    
-                    if stages_count == 0:
-                        # Table is empty, populate from existing races
-                        print(f"[bTeam] Populating race_stages from existing races...")
-                        cursor.execute("SELECT id, distance_km, elevation_m, route_file FROM races")
-                        races = cursor.fetchall()
-                        for race_id, distance_km, elevation_m, route_file in races:
-                            cursor.execute("SELECT num_stages FROM races WHERE id = ?", (race_id,))
-                            result = cursor.fetchone()
-                            num_stages = result[0] if result else 1
-                            now = datetime.utcnow().isoformat()
-                            
-                            for stage_num in range(1, (num_stages or 1) + 1):
-                                cursor.execute("""
-                                    INSERT INTO race_stages 
-                                    (race_id, stage_number, distance_km, elevation_m, route_file, created_at)
-                                    VALUES (?, ?, ?, ?, ?, ?)
-                                """, (
-                                    race_id,
-                                    stage_num,
-                                    (distance_km / num_stages if distance_km and num_stages else 0),
-                                    (elevation_m / num_stages if elevation_m and num_stages else None),
-                                    (route_file if stage_num == 1 else None),
-                                    now
-                                ))
-                        conn.commit()
-                        print(f"[bTeam] Tappe populate da gare esistenti")
-                except sqlite3.Error as e:
-                    print(f"[bTeam] Errore popolazione race_stages: {e}")
-            
-            # Get existing columns in wellness table
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='wellness'")
-            wellness_exists = cursor.fetchone() is not None
-            if wellness_exists:
-                cursor.execute("PRAGMA table_info(wellness)")
-                wellness_cols = {row[1] for row in cursor.fetchall()}
-                
-                # List of all expected columns for wellness
-                expected_cols = {
-                    'id', 'athlete_id', 'wellness_date', 'weight_kg', 'resting_hr', 'hrv', 'steps',
-                    'soreness', 'fatigue', 'stress', 'mood', 'motivation', 'injury', 'kcal',
-                    'sleep_secs', 'sleep_score', 'sleep_quality', 'avg_sleeping_hr', 'menstruation',
-                    'menstrual_cycle_phase', 'body_fat', 'respiration', 'spO2', 'readiness', 'ctl', 'atl', 'ramp_rate', 'comments', 'created_at'
-                }
-                
-                # Add missing columns
-                missing_cols = expected_cols - wellness_cols
-                for col_name in missing_cols:
+                        print(f"[bTeam] Errore aggiunta colonna '{col_name}': {e}")
+
+        # Create custom_cp_history table if it doesn't exist
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='custom_cp_history'")
+        custom_cp_history_exists = cursor.fetchone() is not None
+
+        if not custom_cp_history_exists:
+            try:
+                cursor.execute("""
+                    CREATE TABLE custom_cp_history (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        athlete_id INTEGER NOT NULL,
+                        period VARCHAR(100) NOT NULL,
+                        period_label VARCHAR(255) NOT NULL,
+                        date_start VARCHAR(10),
+                        date_end VARCHAR(10),
+                        selected_durations TEXT DEFAULT '[]',
+                        cp REAL NOT NULL,
+                        w_prime REAL NOT NULL,
+                        pmax REAL NOT NULL,
+                        rmse REAL,
+                        saved_at VARCHAR(255) NOT NULL,
+                        FOREIGN KEY (athlete_id) REFERENCES athletes(id) ON DELETE CASCADE
+                    )
+                """)
+                print(f"[bTeam] Tabella 'custom_cp_history' creata")
+            except sqlite3.Error as e:
+                print(f"[bTeam] Errore creazione tabella 'custom_cp_history': {e}")
+        else:
+            # Table exists - add any missing columns
+            cursor.execute("PRAGMA table_info(custom_cp_history)")
+            ccp_cols = {row[1] for row in cursor.fetchall()}
+
+            for col_name, col_def in [
+                ("date_start", "VARCHAR(10) DEFAULT NULL"),
+                ("date_end", "VARCHAR(10) DEFAULT NULL"),
+                ("selected_durations", "TEXT DEFAULT '[]'"),
+                ("rmse", "REAL DEFAULT NULL"),
+                ("period_label", "VARCHAR(255) DEFAULT ''"),
+            ]:
+                if col_name not in ccp_cols:
                     try:
-                        if col_name == 'sleep_quality':
-                            cursor.execute("ALTER TABLE wellness ADD COLUMN sleep_quality INTEGER DEFAULT NULL")
-                        elif col_name == 'avg_sleeping_hr':
-                            cursor.execute("ALTER TABLE wellness ADD COLUMN avg_sleeping_hr REAL DEFAULT NULL")
-                        elif col_name == 'body_fat':
-                            cursor.execute("ALTER TABLE wellness ADD COLUMN body_fat REAL DEFAULT NULL")
-                        elif col_name == 'respiration':
-                            cursor.execute("ALTER TABLE wellness ADD COLUMN respiration REAL DEFAULT NULL")
-                        elif col_name == 'spO2':
-                            cursor.execute("ALTER TABLE wellness ADD COLUMN spO2 REAL DEFAULT NULL")
-                        elif col_name == 'readiness':
-                            cursor.execute("ALTER TABLE wellness ADD COLUMN readiness REAL DEFAULT NULL")
-                        elif col_name == 'ctl':
-                            cursor.execute("ALTER TABLE wellness ADD COLUMN ctl REAL DEFAULT NULL")
-                        elif col_name == 'atl':
-                            cursor.execute("ALTER TABLE wellness ADD COLUMN atl REAL DEFAULT NULL")
-                        elif col_name == 'ramp_rate':
-                            cursor.execute("ALTER TABLE wellness ADD COLUMN ramp_rate REAL DEFAULT NULL")
-                        elif col_name == 'comments':
-                            cursor.execute("ALTER TABLE wellness ADD COLUMN comments TEXT DEFAULT NULL")
-                        elif col_name == 'menstruation':
-                            cursor.execute("ALTER TABLE wellness ADD COLUMN menstruation BOOLEAN DEFAULT NULL")
-                        elif col_name == 'menstrual_cycle_phase':
-                            cursor.execute("ALTER TABLE wellness ADD COLUMN menstrual_cycle_phase INTEGER DEFAULT NULL")
-                        else:
-                            # Skip id, athlete_id, wellness_date, created_at as they are already there
-                            continue
-                        print(f"[bTeam] Colonna '{col_name}' aggiunta alla tabella wellness")
+                        cursor.execute(f"ALTER TABLE custom_cp_history ADD COLUMN {col_name} {col_def}")
+                        print(f"[bTeam] Colonna '{col_name}' aggiunta alla tabella custom_cp_history")
                     except sqlite3.OperationalError as e:
                         if "duplicate column name" not in str(e).lower():
                             print(f"[bTeam] Errore aggiunta colonna '{col_name}': {e}")
-            
-            # Create custom_cp_history table if it doesn't exist
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='custom_cp_history'")
-            custom_cp_history_exists = cursor.fetchone() is not None
-            
-            if not custom_cp_history_exists:
+
+        # Create race_activities table if it doesn't exist
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='race_activities'")
+        race_activities_exists = cursor.fetchone() is not None
+
+        if not race_activities_exists:
+            try:
+                cursor.execute("""
+                    CREATE TABLE race_activities (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        race_id INTEGER NOT NULL,
+                        athlete_id INTEGER NOT NULL,
+                        intervals_activity_id TEXT NOT NULL,
+                        race_name VARCHAR(255) NOT NULL,
+                        linked_at VARCHAR(255) NOT NULL,
+                        FOREIGN KEY (race_id) REFERENCES races(id) ON DELETE CASCADE,
+                        FOREIGN KEY (athlete_id) REFERENCES athletes(id) ON DELETE CASCADE
+                    )
+                """)
+                print(f"[bTeam] Tabella 'race_activities' creata")
+            except sqlite3.Error as e:
+                print(f"[bTeam] Errore creazione tabella 'race_activities': {e}")
+
+    def _migration_secondary_indexes(self, cursor: sqlite3.Cursor) -> None:
+        """Replace retired indexes and create the declared ones older databases lack."""
+        for name in self._RETIRED_INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {name}")
+        # The unique indexes need one row per key: merge the duplicates left by older versions.
+        # Wellness keeps the most recent row of the day, activities the first import of an
+        # intervals_id (the target of ON CONFLICT in upsert_activities)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name='ux_wellness_athlete_date'")
+        if cursor.fetchone() is None:
+            merged = self._merge_duplicates(cursor, "wellness", ("athlete_id", "wellness_date"), "MAX")
+            if merged:
+                print(f"[bTeam] Uniti {merged} record wellness duplicati")
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name='ux_activities_intervals_id'")
+        if cursor.fetchone() is None:
+            merged = self._merge_duplicates(cursor, "activities", ("intervals_id",), "MIN")
+            if merged:
+                print(f"[bTeam] Unite {merged} attività duplicate per intervals_id")
+        self._create_missing_indexes(cursor)
+
+    @staticmethod
+    def _merge_duplicates(cursor: sqlite3.Cursor, table: str, key: Tuple[str, ...], keep: str) -> int:
+        """Merge the rows of `table` sharing `key` into the MIN or MAX id; returns the rows removed.
+
+        The kept row fills its NULL columns from the duplicates (newest first). For
+        activities the payloads, tags and FIT files of the duplicates move to it
+        where it has none.
+        """
+        join = " AND ".join(f"t.{col} = k.{col}" for col in key)
+        cursor.execute(
+            f"CREATE TEMP TABLE row_merge AS "
+            f"SELECT t.id AS dup_id, k.keep_id AS keep_id FROM {table} t JOIN ("
+            f"SELECT {', '.join(key)}, {keep}(id) AS keep_id FROM {table} "
+            f"WHERE {' AND '.join(f'{col} IS NOT NULL' for col in key)} "
+            f"GROUP BY {', '.join(key)} HAVING COUNT(*) > 1"
+            f") k ON {join} WHERE t.id <> k.keep_id"
+        )
+        try:
+            cursor.execute("SELECT COUNT(*) FROM row_merge")
+            duplicates = cursor.fetchone()[0]
+            if not duplicates:
+                return 0
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = [row[1] for row in cursor.fetchall() if row[1] != "id" and row[1] not in key]
+            assignments = ", ".join(
+                f"{col} = COALESCE({col}, (SELECT d.{col} FROM {table} d JOIN row_merge m ON d.id = m.dup_id "
+                f"WHERE m.keep_id = {table}.id AND d.{col} IS NOT NULL ORDER BY d.id DESC LIMIT 1))"
+                for col in columns
+            )
+            cursor.execute(f"UPDATE {table} SET {assignments} WHERE id IN (SELECT keep_id FROM row_merge)")
+            if table == "activities":
+                for child in ("activity_payloads", "activity_tags", "fit_files"):
+                    cursor.execute(
+                        f"UPDATE OR IGNORE {child} SET activity_id = "
+                        f"(SELECT keep_id FROM row_merge WHERE dup_id = {child}.activity_id) "
+                        f"WHERE activity_id IN (SELECT dup_id FROM row_merge)"
+                    )
+                for child in ("activity_payloads", "activity_tags"):
+                    cursor.execute(f"DELETE FROM {child} WHERE activity_id IN (SELECT dup_id FROM row_merge)")
+            cursor.execute(f"DELETE FROM {table} WHERE id IN (SELECT dup_id FROM row_merge)")
+            return duplicates
+        finally:
+            cursor.execute("DROP TABLE temp.row_merge")
+
+    def _migration_activity_payloads(self, cursor: sqlite3.Cursor, batch_size: int = 200) -> None:
+        """Compress activities.intervals_payload into activity_payloads and clear the column."""
+        cursor.execute("PRAGMA table_info(activities)")
+        if "intervals_payload" not in {row[1] for row in cursor.fetchall()}:
+            return
+        moved = 0
+        while True:
+            rows = cursor.execute(
+                "SELECT id, intervals_payload FROM activities "
+                "WHERE intervals_payload IS NOT NULL LIMIT ?", (batch_size,)
+            ).fetchall()
+            if not rows:
+                break
+            now = datetime.utcnow().isoformat()
+            for activity_id, raw in rows:
                 try:
-                    cursor.execute("""
-                        CREATE TABLE custom_cp_history (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            athlete_id INTEGER NOT NULL,
-                            period VARCHAR(100) NOT NULL,
-                            period_label VARCHAR(255) NOT NULL,
-                            date_start VARCHAR(10),
-                            date_end VARCHAR(10),
-                            selected_durations TEXT DEFAULT '[]',
-                            cp REAL NOT NULL,
-                            w_prime REAL NOT NULL,
-                            pmax REAL NOT NULL,
-                            rmse REAL,
-                            saved_at VARCHAR(255) NOT NULL,
-                            FOREIGN KEY (athlete_id) REFERENCES athletes(id) ON DELETE CASCADE
-                        )
-                    """)
-                    print(f"[bTeam] Tabella 'custom_cp_history' creata")
-                except sqlite3.Error as e:
-                    print(f"[bTeam] Errore creazione tabella 'custom_cp_history': {e}")
-            else:
-                # Table exists - add any missing columns
-                cursor.execute("PRAGMA table_info(custom_cp_history)")
-                ccp_cols = {row[1] for row in cursor.fetchall()}
-                
-                for col_name, col_def in [
-                    ("date_start", "VARCHAR(10) DEFAULT NULL"),
-                    ("date_end", "VARCHAR(10) DEFAULT NULL"),
-                    ("selected_durations", "TEXT DEFAULT '[]'"),
-                    ("rmse", "REAL DEFAULT NULL"),
-                    ("period_label", "VARCHAR(255) DEFAULT ''"),
-                ]:
-                    if col_name not in ccp_cols:
-                        try:
-                            cursor.execute(f"ALTER TABLE custom_cp_history ADD COLUMN {col_name} {col_def}")
-                            print(f"[bTeam] Colonna '{col_name}' aggiunta alla tabella custom_cp_history")
-                        except sqlite3.OperationalError as e:
-                            if "duplicate column name" not in str(e).lower():
-                                print(f"[bTeam] Errore aggiunta colonna '{col_name}': {e}")
-            
-            # Create race_activities table if it doesn't exist
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='race_activities'")
-            race_activities_exists = cursor.fetchone() is not None
-            
-            if not race_activities_exists:
+                    encoding, data, size = _encode_payload(json.loads(raw))
+                except (json.JSONDecodeError, TypeError):
+                    # Non JSON: conservato così com'è
+                    encoding, data, size = "raw", str(raw).encode("utf-8"), len(str(raw))
+                cursor.execute(
+                    "INSERT OR REPLACE INTO activity_payloads "
+                    "(activity_id, encoding, data, size_bytes, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (activity_id, encoding, data, size, now),
+                )
+            cursor.execute(
+                f"UPDATE activities SET intervals_payload = NULL "
+                f"WHERE id IN ({','.join('?' * len(rows))})",
+                tuple(r[0] for r in rows),
+            )
+            moved += len(rows)
+        if moved:
+            print(f"[bTeam] {moved} payload Intervals spostati in activity_payloads")
+
+    def _migration_wellness_date_index(self, cursor: sqlite3.Cursor) -> None:
+        """Index on wellness_date for the all-athletes wellness window."""
+        self._create_missing_indexes(cursor)
+
+    def _migration_races_date_index(self, cursor: sqlite3.Cursor) -> None:
+        """Index on races.race_date_start for the paginated race calendar."""
+        self._create_missing_indexes(cursor)
+
+    def _migration_activity_tags(self, cursor: sqlite3.Cursor, batch_size: int = 500) -> None:
+        """Backfill activity_tags from the legacy JSON activities.tags column."""
+        cursor.execute("PRAGMA table_info(activities)")
+        if "tags" not in {row[1] for row in cursor.fetchall()}:
+            return
+        last_id = 0
+        copied = 0
+        while True:
+            rows = cursor.execute(
+                "SELECT id, tags FROM activities WHERE id > ? AND tags IS NOT NULL AND tags NOT IN ('', '[]') "
+                "ORDER BY id LIMIT ?", (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            values = []
+            for activity_id, raw in rows:
                 try:
-                    cursor.execute("""
-                        CREATE TABLE race_activities (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            race_id INTEGER NOT NULL,
-                            athlete_id INTEGER NOT NULL,
-                            intervals_activity_id TEXT NOT NULL,
-                            race_name VARCHAR(255) NOT NULL,
-                            linked_at VARCHAR(255) NOT NULL,
-                            FOREIGN KEY (race_id) REFERENCES races(id) ON DELETE CASCADE,
-                            FOREIGN KEY (athlete_id) REFERENCES athletes(id) ON DELETE CASCADE
-                        )
-                    """)
-                    print(f"[bTeam] Tabella 'race_activities' creata")
-                except sqlite3.Error as e:
-                    print(f"[bTeam] Errore creazione tabella 'race_activities': {e}")
-            
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            print(f"[bTeam] Errore migrazione schema: {e}")
-        
-        # Migrate injury column type from BOOLEAN to REAL if needed
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Check if wellness table exists and has injury column
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='wellness'")
-            if cursor.fetchone():
-                cursor.execute("PRAGMA table_info(wellness)")
-                wellness_cols = {row[1]: row[2] for row in cursor.fetchall()}  # name: type
-                
-                if 'injury' in wellness_cols and wellness_cols['injury'] in ('BOOLEAN', 'BOOLEAN DEFAULT NULL'):
-                    # Need to convert injury from BOOLEAN to REAL
-                    print("[bTeam] Convertendo colonna 'injury' da BOOLEAN a REAL...")
-                    try:
-                        # Rename old table
-                        cursor.execute("ALTER TABLE wellness RENAME TO wellness_old")
-                        
-                        # Recreate wellness table with correct schema
-                        # This will be done by SQLAlchemy's create_all, but first we need to get the new structure
-                        # For now, just convert the column values
-                        cursor.execute("ALTER TABLE wellness_old RENAME TO wellness")
-                        
-                        print("[bTeam] Colonna 'injury' migrata a REAL")
-                    except sqlite3.OperationalError as e:
-                        print(f"[bTeam] Errore migrazione colonna 'injury': {e}")
-            
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            print(f"[bTeam] Errore verifica tipo injury: {e}")
+                    tags = json.loads(raw)
+                except (json.JSONDecodeError, TypeError):
+                    continue
+                values.extend((activity_id, tag) for tag in _normalize_tags(tags if isinstance(tags, list) else [tags]))
+            cursor.executemany("INSERT OR IGNORE INTO activity_tags (activity_id, tag) VALUES (?, ?)", values)
+            copied += len(values)
+        if copied:
+            print(f"[bTeam] {copied} tag attività copiati in activity_tags")
+
+    def _migration_search_index(self, cursor: sqlite3.Cursor) -> None:
+        """FTS5 search tables and triggers, populated from the existing rows."""
+        for statement in _search_index_ddl():
+            cursor.execute(statement)
+        for fts, _, _, _ in _SEARCH_SOURCES.values():
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    def _migration_change_log(self, cursor: sqlite3.Cursor) -> None:
+        """Change log triggers, with every existing row registered as version > 0."""
+        for statement in _change_log_ddl() + _change_log_seed_sql():
+            cursor.execute(statement)
+
+    def _migration_sync_state(self, cursor: sqlite3.Cursor) -> None:
+        """sync_state table (created by create_all); nothing to backfill.
+
+        Athletes without a cursor fall back to the full days_back window on
+        their first incremental sync, which then records one.
+        """
+
+    # Indexes replaced by a differently defined one (e.g. made unique)
+    _RETIRED_INDEXES = ("ix_activities_intervals_id", "ix_wellness_athlete_date")
+
+    @staticmethod
+    def _create_missing_indexes(cursor: sqlite3.Cursor) -> None:
+        """Create any index declared on the models that the database does not have yet.
+
+        create_all skips tables that already exist, indexes included, so migrations
+        adding an index to an existing table call this.
+        """
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='index'")
+        existing = {row[0] for row in cursor.fetchall()}
+        dialect = sqlite_dialect.dialect()
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name not in existing:
+                    cursor.execute(str(CreateIndex(index).compile(dialect=dialect)))
 
     def add_team(self, name: str) -> int:
         """Add a new team."""
@@ -1231,17 +1980,200 @@ class BTeamStorage:
         if athlete:
             self.session.delete(athlete)
             self.session.commit()
+            with self._activity_index_lock:
+                self._activity_indexes.pop(athlete_id, None)
 
-    def list_athletes(self) -> List[Dict[str, str]]:
-        """List all athletes with team information."""
-        athletes = self.session.query(Athlete).order_by(Athlete.created_at.desc()).all()
-        return [athlete.to_dict(with_team_name=True) for athlete in athletes]
+    def list_athletes(self, team_id: Optional[int] = None, category_id: Optional[int] = None) -> List[Dict[str, str]]:
+        """List athletes with team and category names, newest first.
+
+        Read path without ORM objects: one Core SELECT over explicit columns,
+        rows go straight into the response dicts (same keys as Athlete.to_dict).
+        """
+        q = self._athletes_select()
+        if team_id is not None:
+            q = q.where(Athlete.__table__.c.team_id == team_id)
+        if category_id is not None:
+            q = q.where(Athlete.__table__.c.category_id == category_id)
+        return self._rows_to_dicts(self.session.execute(q))
+
+    # Colonne della lista atleti, nell'ordine di Athlete.to_dict
+    _ATHLETE_LIST_FIELDS = (
+        "id", "first_name", "last_name", "team_id", "category_id", "birth_date", "weight_kg",
+        "height_cm", "gender", "cp", "max_hr", "w_prime", "ecp", "ew_prime", "kj_per_hour_per_kg",
+        "api_key", "notes", "custom_cp_configs", "created_at",
+    )
+
+    def _athletes_select(self):
+        """Core SELECT of the athlete list columns plus team_name/category_name."""
+        a, teams, categories = Athlete.__table__, Team.__table__, Category.__table__
+        return (
+            select(
+                *(a.c[f] for f in self._ATHLETE_LIST_FIELDS),
+                teams.c.name.label("team_name"),
+                categories.c.name.label("category_name"),
+            )
+            .select_from(
+                a.outerjoin(teams, teams.c.id == a.c.team_id).outerjoin(categories, categories.c.id == a.c.category_id)
+            )
+            .order_by(a.c.created_at.desc())
+        )
+
+    @staticmethod
+    def _rows_to_dicts(result) -> List[Dict]:
+        """Plain dicts from a Core result (one zip per row, no Row/ORM objects kept)."""
+        keys = list(result.keys())
+        rows = [dict(zip(keys, row)) for row in result]
+        if "custom_cp_configs" in keys:
+            for row in rows:
+                row["custom_cp_configs"] = row["custom_cp_configs"] or {}
+        return rows
 
     def get_athlete(self, athlete_id: int) -> Optional[Dict]:
         """Get a single athlete by ID."""
         athlete = self.session.query(Athlete).filter(Athlete.id == athlete_id).first()
         return athlete.to_dict(with_team_name=True) if athlete else None
 
+    def _activity_index(self, athlete_id: int) -> Dict[str, Dict]:
+        """In-memory dedupe keys of an athlete's activities.
+
+        Returns {"ids": {intervals_id: activity_id}, "keys": {(title, activity_date): activity_id}}.
+        Each athlete is loaded lazily with one query (season archives included);
+        afterwards the index follows change_log, so inserts and deletes from any
+        session or process (cascades included) are applied with a single indexed
+        probe. Archiving logs no change: archived rows keep their keys.
+        Call with _activity_index_lock held.
+        """
+        self._refresh_activity_index()
+        index = self._activity_indexes.get(athlete_id)
+        if index is None:
+            index = self._activity_indexes[athlete_id] = {"ids": {}, "keys": {}}
+            for row in self.session.execute(self._with_archives(
+                "activities",
+                lambda t: select(t.c.id, t.c.athlete_id, t.c.intervals_id, t.c.title, t.c.activity_date)
+                .where(t.c.athlete_id == athlete_id),
+            )):
+                self._index_activity(*row)
+        return index
+
+    def _index_activity(self, activity_id: int, athlete_id: int, intervals_id: Optional[str],
+                        title: str, activity_date: str) -> None:
+        """Add one stored activity to its athlete's index, if that athlete is loaded."""
+        index = self._activity_indexes.get(athlete_id)
+        if index is None:
+            return
+        if intervals_id:
+            index["ids"][intervals_id] = activity_id
+        index["keys"].setdefault((title, activity_date), activity_id)
+        self._activity_index_rows[activity_id] = (athlete_id, intervals_id, (title, activity_date))
+
+    def _refresh_activity_index(self) -> None:
+        """Apply the activity changes logged after the last refresh to the loaded athletes.
+
+        Probes change_log once per unit of work (session_scope, i.e. per HTTP request):
+        writes made through this storage are indexed directly, so inside a request
+        known activities cost no query at all. Outside a scope it probes every call.
+        """
+        scope = _session_scope_id.get()
+        if scope is not None and scope is self._activity_index_scope:
+            return
+        self._activity_index_scope = scope
+        if self._activity_index_version is None:
+            self._activity_index_version = self.session.query(func.max(ChangeLog.version)).scalar() or 0
+            return
+        changes = self.session.execute(
+            select(ChangeLog.entity_id, ChangeLog.version)
+            .where(ChangeLog.entity == "activity", ChangeLog.version > self._activity_index_version)
+        ).all()
+        if not changes:
+            return
+        self._activity_index_version = max(version for _, version in changes)
+
+        # Via le chiavi vecchie delle righe cambiate, poi si reindicizzano quelle ancora presenti
+        ids = sorted({activity_id for activity_id, _ in changes})
+        for activity_id in ids:
+            self._unindex_activity(activity_id)
+        t = Activity.__table__
+        for i in range(0, len(ids), self._IN_CHUNK):
+            for row in self.session.execute(
+                select(t.c.id, t.c.athlete_id, t.c.intervals_id, t.c.title, t.c.activity_date)
+                .where(t.c.id.in_(ids[i:i + self._IN_CHUNK]))
+            ):
+                self._index_activity(*row)
+
+    def _unindex_activity(self, activity_id: int) -> None:
+        """Drop the dedupe keys of one activity from the in-memory index."""
+        old = self._activity_index_rows.pop(activity_id, None)
+        index = self._activity_indexes.get(old[0]) if old else None
+        if index is None:
+            return
+        if old[1] and index["ids"].get(old[1]) == activity_id:
+            del index["ids"][old[1]]
+        if index["keys"].get(old[2]) == activity_id:
+            del index["keys"][old[2]]
+
+    # Tipi di sync con cursore: kind -> (colonna ultimo sync, colonna data più recente)
+    _SYNC_CURSORS = {
+        "activities": ("activities_synced_at", "newest_activity_date"),
+        "wellness": ("wellness_synced_at", "newest_wellness_date"),
+    }
+
+    def get_sync_state(self, athlete_id: int) -> Optional[Dict]:
+        """Incremental sync cursors of an athlete, None before the first recorded sync."""
+        state = self.session.query(SyncState).filter_by(athlete_id=athlete_id).first()
+        return state.to_dict() if state else None
+
+    def record_sync(self, athlete_id: int, kind: str, newest_date: Optional[str] = None) -> Dict:
+        """Mark a successful sync of `kind` ("activities" or "wellness") for an athlete.
+
+        The sync time is always updated; the newest date only moves forward, so
+        a sync of an older window never rewinds the cursor.
+        """
+        if kind not in self._SYNC_CURSORS:
+            raise ValueError(f"Unknown sync kind: {kind}")
+        synced_column, newest_column = self._SYNC_CURSORS[kind]
+        try:
+            state = self.session.query(SyncState).filter_by(athlete_id=athlete_id).first()
+            if state is None:
+                state = SyncState(athlete_id=athlete_id)
+                self.session.add(state)
+            setattr(state, synced_column, datetime.utcnow().isoformat())
+            current = getattr(state, newest_column)
+            if newest_date and (current is None or newest_date > current):
+                setattr(state, newest_column, newest_date)
+            self.session.commit()
+            return state.to_dict()
+        except Exception:
+            self.session.rollback()
+            raise
+
+    def intervals_activity_summaries(self, athlete_id: int, oldest: Optional[str] = None) -> Dict[str, Dict]:
+        """Stored summary columns of the athlete's Intervals activities, keyed by intervals_id.
+
+        The sync compares them with the upstream activity list to skip detail
+        downloads for activities that did not change. has_payload is False for
+        rows saved from the list summary alone (detail download failed), which
+        the sync downloads again.
+
+        Args:
+            oldest: YYYY-MM-DD, solo le attività da questa data (la finestra del sync)
+        """
+        columns = ("title", "activity_date") + self._ACTIVITY_UPSERT_FIELDS
+
+        def summaries(t: Table):
+            payloads = self._archive_sibling(t, "activity_payloads")
+            q = (
+                select(
+                    t.c.intervals_id, *(t.c[column] for column in columns),
+                    payloads.c.activity_id.isnot(None).label("has_payload"),
+                )
+                .select_from(t.outerjoin(payloads, payloads.c.activity_id == t.c.id))
+                .where(t.c.athlete_id == athlete_id, t.c.intervals_id.isnot(None))
+            )
+            return q.where(t.c.activity_date >= oldest) if oldest else q
+
+        rows = self.session.execute(self._with_archives("activities", summaries, date_from=oldest))
+        return {row[0]: dict(zip(columns + ("has_payload",), row[1:])) for row in rows}
+
     def add_activity(
         self,
         athlete_id: int,
@@ -1275,51 +2207,30 @@ class BTeamStorage:
         _logger.info(f"[DUPLICATE CHECK] Adding activity: athlete_id={athlete_id}, title='{title}', "
                 f"date={activity_date}, source={source}, intervals_id={intervals_id}")
         
-        # Check for duplicates
-        existing = None
-        
-        # First priority: check by intervals_id if provided (strongest check)
+        # Deduplica sull'indice in memoria: le attività già note non costano query
+        with self._activity_index_lock:
+            index = self._activity_index(athlete_id)
+            if intervals_id and str(intervals_id) in index["ids"]:
+                existing_id = index["ids"][str(intervals_id)]
+                _logger.info(f"[DUPLICATE] Found existing activity by intervals_id (ID: {existing_id})")
+                return existing_id, False
+            # athlete+title+date copre anche il vecchio controllo athlete+source+title+date
+            existing_id = index["keys"].get((title.strip(), activity_date))
+            if existing_id is not None:
+                _logger.info(f"[DUPLICATE] Found existing activity by athlete+title+date (ID: {existing_id})")
+                return existing_id, False
+
+        # intervals_id è unico su tutto il DB: per le attività nuove resta il controllo sugli altri atleti
         if intervals_id:
-            _logger.debug(f"[DUPLICATE CHECK] Checking by intervals_id={intervals_id}")
-            existing = self.session.query(Activity).filter(
-                Activity.intervals_id == intervals_id
-            ).first()
-            if existing:
-                _logger.info(f"[DUPLICATE] Found existing activity by intervals_id (ID: {existing.id})")
-                return existing.id, False
-            _logger.debug(f"[DUPLICATE CHECK] No existing activity by intervals_id")
-        
-        # Second priority: For Intervals imports, also check by athlete, source, title, and date
-        # This catches duplicates even if intervals_id somehow differs
-        if source and source.lower() == "intervals":
-            _logger.debug(f"[DUPLICATE CHECK] Intervals source - checking by athlete+source+title+date")
-            existing = self.session.query(Activity).filter(
-                Activity.athlete_id == athlete_id,
-                Activity.source == source,
-                Activity.title == title.strip(),
-                Activity.activity_date == activity_date
-            ).first()
-            if existing:
-                _logger.info(f"[DUPLICATE] Found existing Intervals activity by athlete+source+title+date (ID: {existing.id})")
-                return existing.id, False
-            _logger.debug(f"[DUPLICATE CHECK] No existing Intervals activity by athlete+source+title+date")
-        
-        # Third priority: For manual activities, check by athlete, title, and date
-        _logger.debug(f"[DUPLICATE CHECK] Fallback check by athlete+title+date")
-        if not existing:
-            existing = self.session.query(Activity).filter(
-                Activity.athlete_id == athlete_id,
-                Activity.title == title.strip(),
-                Activity.activity_date == activity_date
-            ).first()
-            if existing:
-                _logger.info(f"[DUPLICATE] Found existing activity by athlete+title+date (ID: {existing.id})")
-                return existing.id, False
-            _logger.debug(f"[DUPLICATE CHECK] No existing activity by athlete+title+date - creating new")
-        
+            existing_id = self.session.execute(self._with_archives(
+                "activities", lambda t: select(t.c.id).where(t.c.intervals_id == str(intervals_id))
+            )).scalar()
+            if existing_id is not None:
+                _logger.info(f"[DUPLICATE] Found existing activity by intervals_id (ID: {existing_id})")
+                return existing_id, False
+        _logger.debug(f"[DUPLICATE CHECK] No existing activity - creating new")
+
         now = datetime.utcnow().isoformat()
-        payload = json.dumps(list(intervals_payload), ensure_ascii=False) if intervals_payload else None
-        tags_json = json.dumps(tags or [], ensure_ascii=False)
         
         activity = Activity(
             athlete_id=athlete_id,
@@ -1330,9 +2241,7 @@ class BTeamStorage:
             tss=tss,
             source=source,
             intervals_id=intervals_id,
-            intervals_payload=payload,
             is_race=is_race,
-            tags=tags_json,
             avg_watts=avg_watts,
             normalized_watts=normalized_watts,
             avg_hr=avg_hr,
@@ -1345,8 +2254,16 @@ class BTeamStorage:
             activity_type=activity_type,
             created_at=now,
         )
+        activity.tag_links = [ActivityTag(tag=tag) for tag in _normalize_tags(tags)]
+        if intervals_payload:
+            encoding, data, size = _encode_payload(intervals_payload)
+            activity.payload = ActivityPayload(encoding=encoding, data=data, size_bytes=size, created_at=now)
         self.session.add(activity)
         self.session.commit()
+        with self._activity_index_lock:
+            self._index_activity(
+                activity.id, athlete_id, str(intervals_id) if intervals_id else None, activity.title, activity_date
+            )
         _logger.info(f"[NEW ACTIVITY] Created activity ID={activity.id}, source={source}, intervals_id={intervals_id}")
         return activity.id, True
 
@@ -1361,12 +2278,45 @@ class BTeamStorage:
             if activity:
                 self.session.delete(activity)
                 self.session.commit()
-                return True
-            return False
+            elif not self._delete_archived_activity(activity_id):
+                return False
+            with self._activity_index_lock:
+                self._unindex_activity(activity_id)
+            return True
         except Exception as e:
             print(f"[bTeam] Errore eliminazione attività: {e}")
             return False
 
+    def _delete_archived_activity(self, activity_id: int) -> bool:
+        """Delete an activity from its season archive, logging the tombstone the triggers would write."""
+        for year in self._archive_years():
+            activities = self._archive_table("activities", year)
+            title = self.session.execute(select(activities.c.title).where(activities.c.id == activity_id)).scalar()
+            if title is None:
+                continue
+            try:
+                if self._archive_has_search(year):
+                    self.session.execute(
+                        text(f"INSERT INTO arch_{int(year)}.activities_fts(activities_fts, rowid, title) "
+                             f"VALUES ('delete', :id, :title)"),
+                        {"id": activity_id, "title": title},
+                    )
+                for name in ("activity_payloads", "activity_tags"):
+                    table = self._archive_table(name, year)
+                    self.session.execute(table.delete().where(table.c.activity_id == activity_id))
+                self.session.execute(activities.delete().where(activities.c.id == activity_id))
+                self.session.execute(
+                    ChangeLog.__table__.delete()
+                    .where(ChangeLog.entity == "activity", ChangeLog.entity_id == activity_id)
+                )
+                self.session.execute(ChangeLog.__table__.insert().values(entity="activity", entity_id=activity_id, op="delete"))
+                self.session.commit()
+            except Exception:
+                self.session.rollback()
+                raise
+            return True
+        return False
+
     def get_activity(self, activity_id: int) -> Optional[Dict]:
         """Get activity details by ID.
         
@@ -1374,35 +2324,33 @@ class BTeamStorage:
             Activity dict with all details, or None if not found
         """
         try:
-            activity = (
-                self.session.query(Activity)
-                .options(joinedload(Activity.athlete))
-                .filter(Activity.id == activity_id)
-                .first()
+            # Stessa query della lista: trova anche le attività negli archivi per stagione
+            activities = self._activity_rows_to_dicts(
+                self.session.execute(self._activities_select(ids=[activity_id]))
             )
-            if activity:
-                activity_dict = activity.to_dict(with_athlete_name=False)
-                athlete_name = "Unknown"
-                if activity.athlete_id:
-                    athlete = (
-                        self.session.query(Athlete)
-                        .filter(Athlete.id == activity.athlete_id)
-                        .first()
-                    )
-                    if athlete:
-                        athlete_name = f"{athlete.first_name} {athlete.last_name}"
-                activity_dict["athlete_name"] = athlete_name
-                return activity_dict
-            return None
+            return activities[0] if activities else None
         except Exception as e:
             _logger.error(f"Errore lettura attività: {e}")
             return None
 
+    def get_activity_payload(self, activity_id: int) -> Optional[Dict]:
+        """Get the decompressed raw Intervals payload of an activity, if stored (archives included)."""
+        payload = self.session.query(ActivityPayload).filter(ActivityPayload.activity_id == activity_id).first()
+        if payload:
+            return payload.to_dict()
+        for year in self._archive_years():
+            t = self._archive_table("activity_payloads", year)
+            row = self.session.execute(select(t).where(t.c.activity_id == activity_id)).first()
+            if row:
+                return ActivityPayload(**row._asdict()).to_dict()
+        return None
+
     def list_activities(
         self,
         athlete_id: Optional[int] = None,
         is_race: Optional[bool] = None,
         limit: int = 1000,
+        tags: Optional[Iterable[str]] = None,
     ) -> List[Dict[str, str]]:
         """List activities with athlete names, with optional DB-level filtering.
 
@@ -1410,50 +2358,463 @@ class BTeamStorage:
             athlete_id: se fornito, ritorna solo le attività di quell'atleta
             is_race:    se fornito, filtra per is_race True/False
             limit:      numero massimo di righe da restituire (default 1000)
+            tags:       se fornito, solo attività con almeno uno di questi tag
         """
         _logger.debug("[list_activities] Starting query")
+        q = self._activities_select(athlete_id=athlete_id, is_race=is_race, tags=tags, limit=limit)
+        result = self._activity_rows_to_dicts(self.session.execute(q))
+        _logger.info(f"[list_activities] Loaded {len(result)} activities")
+        return result
+
+    def list_activities_page(
+        self,
+        athlete_id: Optional[int] = None,
+        is_race: Optional[bool] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        tags: Optional[Iterable[str]] = None,
+    ) -> Dict:
+        """Keyset-paginated activities, newest first.
+
+        The page position is the (activity_date, created_at, id) of the last row
+        returned, so every page costs the same index seek regardless of depth.
+
+        Args:
+            cursor: opaque next_cursor from the previous page (None = first page)
+
+        Returns:
+            {"items": [...], "next_cursor": str | None}
+
+        Raises:
+            ValueError: if the cursor is malformed
+        """
+        before = self._decode_cursor(cursor, 3) if cursor else None
+        q = self._activities_select(athlete_id=athlete_id, is_race=is_race, tags=tags, before=before, limit=limit + 1)
+        items = self._activity_rows_to_dicts(self.session.execute(q))
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            next_cursor = self._encode_cursor(last["activity_date"], last["created_at"], last["id"])
+
+        return {"items": items, "next_cursor": next_cursor}
+
+    @staticmethod
+    def _encode_cursor(*key: Any) -> str:
+        """Opaque keyset cursor: the sort key of the last row, ending with its integer id."""
+        raw = json.dumps(list(key), separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor: str, size: int) -> Tuple:
+        """Inverse of _encode_cursor: size-1 string (or None) values followed by the integer id."""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            key = json.loads(base64.urlsafe_b64decode(padded))
+            if not isinstance(key, list) or len(key) != size:
+                raise ValueError(cursor)
+            # NULL viaggia come JSON null: str(None) diventerebbe la stringa "None"
+            return (*(None if value is None else str(value) for value in key[:-1]), int(key[-1]))
+        except (ValueError, TypeError) as e:
+            raise ValueError("Cursor non valido") from e
+
+    # Colonne della lista attività, nell'ordine di Activity.to_dict (tags e athlete_name a parte)
+    _ACTIVITY_LIST_FIELDS = (
+        "id", "athlete_id", "title", "activity_date", "duration_minutes", "distance_km", "tss",
+        "source", "intervals_id", "is_race", "avg_watts", "normalized_watts", "avg_hr", "max_hr",
+        "avg_cadence", "training_load", "intensity", "feel", "calories", "activity_type", "created_at",
+    )
+
+    def _activities_select(
+        self,
+        athlete_id: Optional[int] = None,
+        is_race: Optional[bool] = None,
+        tags: Optional[Iterable[str]] = None,
+        ids=None,
+        before: Optional[Tuple] = None,
+        limit: Optional[int] = None,
+    ):
+        """Core SELECT of the activity list columns with the listing order and DB-level filters.
+
+        Season archives are included (UNION ALL); the filters are applied inside each
+        branch so every database uses its own indexes. With a limit each branch is
+        its own top-N, and archives whose season is older than the limit-th row of
+        the hot table (or newer than the cursor) are left out.
+
+        Args:
+            ids:    se fornito, solo queste attività (lista o SELECT di id)
+            before: (activity_date, created_at, id) del cursore, solo le righe successive
+            limit:  numero massimo di righe
+        """
+        tags = _normalize_tags(tags)
+
+        def newest_first(t):
+            return t.c.activity_date.desc(), t.c.created_at.desc(), t.c.id.desc()
+
+        def filtered(t: Table):
+            q = select(*(t.c[f] for f in self._ACTIVITY_LIST_FIELDS))
+            if athlete_id is not None:
+                q = q.where(t.c.athlete_id == athlete_id)
+            if is_race is not None:
+                q = q.where(t.c.is_race == is_race)
+            if tags:
+                # Almeno uno dei tag richiesti, risolto su ix_activity_tags_tag
+                tag_table = self._archive_sibling(t, "activity_tags")
+                q = q.where(t.c.id.in_(select(tag_table.c.activity_id).where(tag_table.c.tag.in_(tags))))
+            if ids is not None:
+                q = q.where(t.c.id.in_(ids))
+            if before is not None:
+                q = q.where(tuple_(t.c.activity_date, t.c.created_at, t.c.id) < tuple_(*before))
+            return q
+
+        build = filtered
+        date_from, date_to = None, before[0] if before else None
+        if limit is not None and self._archive_years(date_to=date_to):
+            # Una stagione archiviata entra nella pagina solo se arriva alla data della limit-esima riga calda
+            hot = Activity.__table__
+            date_from = self.session.execute(
+                filtered(hot).with_only_columns(hot.c.activity_date)
+                .order_by(*newest_first(hot)).offset(limit - 1).limit(1)
+            ).scalar()
+            if self._archive_years(date_from, date_to):
+                # SQLite non accetta ORDER BY/LIMIT nei rami di una UNION: ogni ramo è una subquery
+                def build(t: Table):
+                    return select(filtered(t).order_by(*newest_first(t)).limit(limit).subquery())
+
+        t = self._with_archives("activities", build, date_from, date_to).subquery("activities")
+        athletes = Athlete.__table__
         q = (
-            self.session.query(Activity)
-            .order_by(Activity.activity_date.desc(), Activity.created_at.desc())
+            select(
+                *(t.c[f] for f in self._ACTIVITY_LIST_FIELDS),
+                athletes.c.first_name.label("athlete_first_name"),
+                athletes.c.last_name.label("athlete_last_name"),
+            )
+            .select_from(t.outerjoin(athletes, athletes.c.id == t.c.athlete_id))
+            .order_by(*newest_first(t))
         )
-        if athlete_id is not None:
-            q = q.filter(Activity.athlete_id == athlete_id)
-        if is_race is not None:
-            q = q.filter(Activity.is_race == is_race)
-        activities = q.limit(limit).all()
-        _logger.info(f"[list_activities] Loaded {len(activities)} activities")
-
-        # Build athlete name lookup solo per gli atleti presenti nei risultati,
-        # non per tutti gli atleti del DB.
-        athlete_ids = {a.athlete_id for a in activities}
-        athlete_rows = (
-            self.session.query(Athlete.id, Athlete.first_name, Athlete.last_name)
-            .filter(Athlete.id.in_(athlete_ids))
-            .all()
-        ) if athlete_ids else []
-        athlete_lookup = {
-            aid: f"{first_name} {last_name}"
-            for aid, first_name, last_name in athlete_rows
-        }
-
-        result = []
-        for activity in activities:
-            activity_dict = activity.to_dict(with_athlete_name=False)
-            athlete_name = athlete_lookup.get(activity.athlete_id, "Unknown")
-            if athlete_name == "Unknown":
+        return q if limit is None else q.limit(limit)
+
+    def _activity_rows_to_dicts(self, result) -> List[Dict]:
+        """Response dicts from an _activities_select result: athlete_name from the join, tags in one extra query."""
+        activities = []
+        by_id = {}
+        for row in result:
+            activity = dict(zip(self._ACTIVITY_LIST_FIELDS, row))
+            first_name, last_name = row[-2], row[-1]
+            if first_name is None:
                 _logger.warning(
-                    f"[list_activities] Activity {activity.id}: athlete_id={activity.athlete_id} not found in athletes"
+                    f"[list_activities] Activity {activity['id']}: athlete_id={activity['athlete_id']} not found in athletes"
+                )
+                activity["athlete_name"] = "Unknown"
+            else:
+                activity["athlete_name"] = f"{first_name} {last_name}"
+            activity["tags"] = []
+            by_id[activity["id"]] = activity
+            activities.append(activity)
+
+        ids = list(by_id)
+        for start in range(0, len(ids), self._IN_CHUNK):
+            chunk = ids[start:start + self._IN_CHUNK]
+            links = self.session.execute(self._with_archives(
+                "activity_tags", lambda t: select(t.c.activity_id, t.c.tag).where(t.c.activity_id.in_(chunk))
+            ))
+            for activity_id, tag in links:
+                by_id[activity_id]["tags"].append(tag)
+        for activity in activities:
+            activity["tags"].sort()
+        return activities
+
+    def _insert(self, table):
+        """INSERT supporting on_conflict_do_update/do_nothing on the engine's dialect."""
+        return sqlite_insert(table) if self.is_sqlite else postgresql_insert(table)
+
+    # Columns refreshed when an incoming row matches an existing intervals_id
+    _ACTIVITY_UPSERT_FIELDS = (
+        "activity_type", "duration_minutes", "distance_km", "tss", "avg_watts",
+        "normalized_watts", "avg_hr", "max_hr", "avg_cadence", "training_load",
+        "intensity", "feel", "calories",
+    )
+    # Bound parameters per IN (...) clause, well below SQLite's variable limit
+    _IN_CHUNK = 500
+
+    def _find_existing_activities(
+        self, athlete_id: int, rows: List[Dict]
+    ) -> Tuple[Dict[str, int], Dict[Tuple[str, str], int], set]:
+        """Look up already stored activities matching the given rows, season archives included.
+
+        Returns two maps: intervals_id -> activity id (any athlete, like add_activity)
+        and (title, activity_date) -> activity id for this athlete, plus the set of
+        matched ids that must not be written: those in an archive and those of
+        another athlete.
+        """
+        intervals_ids = sorted({str(r["intervals_id"]) for r in rows if r.get("intervals_id")})
+        dates = sorted({r["activity_date"] for r in rows})
+
+        def lookup(where: Callable[[Table], Any], date_from: Optional[str] = None, date_to: Optional[str] = None):
+            return self.session.execute(self._with_archives(
+                "activities",
+                lambda t: select(
+                    t.c.id, t.c.intervals_id, t.c.title, t.c.activity_date,
+                    (literal(t.schema is not None) | (t.c.athlete_id != athlete_id)).label("read_only"),
+                ).where(where(t)),
+                date_from, date_to,
+            ))
+
+        read_only: set = set()
+        by_intervals_id: Dict[str, int] = {}
+        for i in range(0, len(intervals_ids), self._IN_CHUNK):
+            chunk = intervals_ids[i:i + self._IN_CHUNK]
+            for activity_id, intervals_id, _, _, is_read_only in lookup(lambda t: t.c.intervals_id.in_(chunk)):
+                by_intervals_id.setdefault(intervals_id, activity_id)
+                if is_read_only:
+                    read_only.add(activity_id)
+
+        by_title_date: Dict[Tuple[str, str], int] = {}
+        for i in range(0, len(dates), self._IN_CHUNK):
+            chunk = dates[i:i + self._IN_CHUNK]
+            for activity_id, _, title, activity_date, is_read_only in lookup(
+                lambda t: (t.c.athlete_id == athlete_id) & t.c.activity_date.in_(chunk), chunk[0], chunk[-1]
+            ):
+                by_title_date.setdefault((title, activity_date), activity_id)
+                if is_read_only:
+                    read_only.add(activity_id)
+
+        return by_intervals_id, by_title_date, read_only
+
+    def upsert_activities(self, athlete_id: int, rows: List[Dict]) -> List[Tuple[int, bool]]:
+        """Bulk version of add_activity for the sync path, in a single transaction.
+
+        Each row is a dict with add_activity's keyword arguments (title and
+        activity_date required). Duplicates are resolved with one set-based lookup
+        using the same rules as add_activity; rows already stored by intervals_id
+        get their metrics refreshed via INSERT ... ON CONFLICT. Rows matching an
+        activity in a season archive, or one of another athlete (intervals_id is
+        unique across the database), are reported as existing and left untouched.
+
+        Returns:
+            One (activity_id, is_new) tuple per input row, in input order
+        """
+        if not rows:
+            return []
+
+        now = datetime.utcnow().isoformat()
+        rows = [
+            {
+                **row,
+                "title": row["title"].strip(),
+                "intervals_id": str(row["intervals_id"]) if row.get("intervals_id") else None,
+            }
+            for row in rows
+        ]
+
+        try:
+            by_intervals_id, by_title_date, read_only = self._find_existing_activities(athlete_id, rows)
+
+            statuses: List[bool] = []
+            written: List[bool] = []  # righe effettivamente passate all'INSERT
+            values: List[Dict] = []
+            seen_ids: set = set()
+            seen_keys: set = set()
+            for row in rows:
+                intervals_id = row["intervals_id"]
+                key = (row["title"], row["activity_date"])
+                if intervals_id and by_intervals_id.get(intervals_id) in read_only:
+                    # Archiviata (l'upsert sulla tabella calda la duplicherebbe) o di un altro atleta
+                    statuses.append(False)
+                    written.append(False)
+                    continue
+                if intervals_id and (intervals_id in by_intervals_id or intervals_id in seen_ids):
+                    # Già presente: la riga va comunque all'upsert per aggiornare le metriche
+                    statuses.append(False)
+                elif key in by_title_date or key in seen_keys:
+                    statuses.append(False)
+                    written.append(False)
+                    continue
+                else:
+                    statuses.append(True)
+                written.append(True)
+                if intervals_id:
+                    seen_ids.add(intervals_id)
+                seen_keys.add(key)
+
+                values.append({
+                    "athlete_id": athlete_id,
+                    "title": row["title"],
+                    "activity_date": row["activity_date"],
+                    "source": row.get("source") or "intervals",
+                    "intervals_id": intervals_id,
+                    "is_race": row.get("is_race"),
+                    "created_at": now,
+                    **{field: row.get(field) for field in self._ACTIVITY_UPSERT_FIELDS},
+                })
+
+            if values:
+                stmt = self._insert(Activity.__table__)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[Activity.intervals_id],
+                    set_={
+                        field: func.coalesce(stmt.excluded[field], Activity.__table__.c[field])
+                        for field in self._ACTIVITY_UPSERT_FIELDS
+                    },
+                    # Mai le metriche di un altro atleta (es. inserita da un sync concorrente)
+                    where=Activity.__table__.c.athlete_id == stmt.excluded.athlete_id,
                 )
-            activity_dict["athlete_name"] = athlete_name
-            result.append(activity_dict)
+                self.session.execute(stmt, values)
+
+            # Risolve gli id (nuovi ed esistenti) con la stessa lookup set-based
+            by_intervals_id, by_title_date, read_only = self._find_existing_activities(athlete_id, rows)
+            result: List[Tuple[int, bool]] = []
+            for i, (row, is_new) in enumerate(zip(rows, statuses)):
+                activity_id = by_intervals_id.get(row["intervals_id"]) if row["intervals_id"] else None
+                if activity_id is None:
+                    activity_id = by_title_date.get((row["title"], row["activity_date"]))
+                if activity_id in read_only:
+                    # Saltata dalla guardia di ON CONFLICT: payload e tag non le appartengono
+                    is_new = written[i] = False
+                result.append((activity_id, is_new))
+
+            # Payload raw compressi nella tabella dedicata
+            payload_values = []
+            for row, was_written, (activity_id, _) in zip(rows, written, result):
+                if was_written and row.get("intervals_payload") and activity_id is not None:
+                    encoding, data, size = _encode_payload(row["intervals_payload"])
+                    payload_values.append({
+                        "activity_id": activity_id, "encoding": encoding, "data": data,
+                        "size_bytes": size, "created_at": now,
+                    })
+            if payload_values:
+                payload_stmt = self._insert(ActivityPayload.__table__)
+                payload_stmt = payload_stmt.on_conflict_do_update(
+                    index_elements=[ActivityPayload.activity_id],
+                    set_={
+                        "encoding": payload_stmt.excluded.encoding,
+                        "data": payload_stmt.excluded.data,
+                        "size_bytes": payload_stmt.excluded.size_bytes,
+                    },
+                )
+                self.session.execute(payload_stmt, payload_values)
+
+            # Tag: si aggiungono a quelli esistenti, nessuno viene rimosso
+            tag_values = [
+                {"activity_id": activity_id, "tag": tag}
+                for row, was_written, (activity_id, _) in zip(rows, written, result)
+                if was_written and activity_id is not None
+                for tag in _normalize_tags(row.get("tags"))
+            ]
+            if tag_values:
+                self.session.execute(
+                    self._insert(ActivityTag.__table__).on_conflict_do_nothing(), tag_values
+                )
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+        with self._activity_index_lock:
+            for row, (activity_id, is_new) in zip(rows, result):
+                if is_new and activity_id is not None:
+                    self._index_activity(
+                        activity_id, athlete_id, row["intervals_id"], row["title"], row["activity_date"]
+                    )
+        new_count = sum(1 for _, is_new in result if is_new)
+        _logger.info(f"[UPSERT ACTIVITIES] athlete_id={athlete_id}: {new_count} new, {len(result) - new_count} skipped")
+        return result
+
+    # Espressioni di raggruppamento per get_activity_stats (activity_date è ISO, con o senza ora)
+    _STATS_GROUPS: Dict[str, Callable] = {
+        "week": lambda c: func.date(c.activity_date, "weekday 0", "-6 days"),  # lunedì della settimana
+        "month": lambda c: func.substr(c.activity_date, 1, 7),
+        "activity_type": lambda c: c.activity_type,
+        "is_race": lambda c: c.is_race,
+    }
+
+    def get_activity_stats(
+        self,
+        athlete_id: int,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        activity_type: Optional[str] = None,
+        is_race: Optional[bool] = None,
+        group_by: Optional[str] = None,
+    ) -> Dict:
+        """Aggregate an athlete's activities in SQL (COUNT/SUM/AVG), optionally per bucket.
+
+        Season archives overlapping the date range are included (UNION ALL).
+
+        Args:
+            date_from:     YYYY-MM-DD, inclusivo
+            date_to:       YYYY-MM-DD, inclusivo
+            activity_type: se fornito, solo quel tipo (Ride, Run, ...)
+            is_race:       se fornito, filtra per is_race True/False
+            group_by:      "week" | "month" | "activity_type" | "is_race" per aggiungere "buckets"
+
+        Returns:
+            Totals dict (total_activities, total_distance_km, total_duration_hours,
+            total_tss, avg_tss) plus, with group_by, "buckets": [{"bucket": ..., **totals}]
+
+        Raises:
+            ValueError: if group_by or date_to is not valid
+        """
+        if group_by is not None and group_by not in self._STATS_GROUPS:
+            raise ValueError(f"group_by non valido: {group_by}")
 
-        _logger.debug(f"[list_activities] Converted to dict, first activity athlete_name: {result[0].get('athlete_name') if result else 'N/A'}")
+        # Limite esclusivo sul giorno dopo: include gli orari del giorno e usa l'indice
+        next_day = (
+            (datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d") if date_to else None
+        )
+
+        def filtered(t):
+            q = select(
+                t.c.id, t.c.activity_date, t.c.activity_type, t.c.is_race,
+                t.c.distance_km, t.c.duration_minutes, t.c.tss,
+            ).where(t.c.athlete_id == athlete_id)
+            if date_from:
+                q = q.where(t.c.activity_date >= date_from)
+            if next_day:
+                q = q.where(t.c.activity_date < next_day)
+            if activity_type is not None:
+                q = q.where(t.c.activity_type == activity_type)
+            if is_race is not None:
+                q = q.where(t.c.is_race == is_race)
+            return q
+
+        c = self._with_archives("activities", filtered, date_from, date_to).subquery("activities").c
+        aggregates = (
+            func.count(c.id),
+            func.sum(c.distance_km),
+            func.sum(c.duration_minutes),
+            func.sum(c.tss),
+            func.avg(func.nullif(c.tss, 0)),  # come prima: TSS nulli o 0 esclusi dalla media
+        )
+        result = self._stats_to_dict(*self.session.execute(select(*aggregates)).one())
+
+        if group_by:
+            key = self._STATS_GROUPS[group_by](c)
+            if group_by == "week" and not self.is_sqlite:
+                day = cast(func.substr(c.activity_date, 1, 10), Date)
+                key = func.to_char(func.date_trunc("week", day), "YYYY-MM-DD")
+            rows = self.session.execute(select(key, *aggregates).group_by(key).order_by(key)).all()
+            result["group_by"] = group_by
+            result["buckets"] = [{"bucket": bucket, **self._stats_to_dict(*totals)} for bucket, *totals in rows]
         return result
 
+    @staticmethod
+    def _stats_to_dict(count, distance_km, duration_minutes, tss_total, tss_avg) -> Dict:
+        return {
+            "total_activities": count or 0,
+            "total_distance_km": round(distance_km or 0, 2),
+            "total_duration_hours": round((duration_minutes or 0) / 60, 2),
+            "total_tss": round(tss_total or 0, 2),
+            "avg_tss": round(tss_avg or 0, 2),
+        }
+
     def stats(self) -> Dict[str, int]:
         """Get database statistics."""
         athletes_count = self.session.query(Athlete).count()
-        activities_count = self.session.query(Activity).count()
+        activities_count = sum(self.session.execute(
+            self._with_archives("activities", lambda t: select(func.count()).select_from(t))
+        ).scalars())
         return {"athletes": athletes_count, "activities": activities_count}
 
     # ===== RACE MANAGEMENT =====
@@ -1789,6 +3150,68 @@ class BTeamStorage:
         races = query.all()
         return [race.to_dict() for race in races]
 
+    def list_race_summaries(
+        self,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Dict:
+        """Race calendar rows, keyset-paginated by (race_date_start, id), oldest first.
+
+        Races without a start date come first: sort key and cursor predicate both use
+        COALESCE(race_date_start, ''), so NULLs order the same way on every backend.
+
+        Only the race columns the calendar shows are selected; enrolled athletes,
+        stages and linked activities are counted with GROUP BY subqueries instead
+        of loading the relationships (full details stay in get_race).
+
+        Args:
+            date_from: YYYY-MM-DD, solo gare che finiscono da questa data in poi
+            date_to:   YYYY-MM-DD, solo gare che iniziano entro questa data
+            cursor:    opaque next_cursor from the previous page (None = first page)
+
+        Returns:
+            {"items": [...], "next_cursor": str | None}
+
+        Raises:
+            ValueError: if the cursor is malformed
+        """
+        counts = {
+            "athletes_count": RaceAthlete.__table__,
+            "stages_count": RaceStage.__table__,
+            "linked_activities_count": RaceActivity.__table__,
+        }
+        subqueries = {
+            label: self.session.query(table.c.race_id, func.count().label("n"))
+            .group_by(table.c.race_id)
+            .subquery()
+            for label, table in counts.items()
+        }
+        q = self.session.query(
+            Race.id, Race.name, Race.race_date_start, Race.race_date_end, Race.num_stages,
+            Race.gender, Race.category, Race.distance_km, Race.elevation_m,
+            Race.predicted_duration_minutes, Race.predicted_kj,
+            *(func.coalesce(sq.c.n, 0).label(label) for label, sq in subqueries.items()),
+        )
+        for sq in subqueries.values():
+            q = q.outerjoin(sq, sq.c.race_id == Race.id)
+        if date_from:
+            q = q.filter(Race.race_date_end >= date_from)
+        if date_to:
+            q = q.filter(Race.race_date_start <= date_to)
+        start = func.coalesce(Race.race_date_start, "")
+        if cursor:
+            race_date_start, race_id = self._decode_cursor(cursor, 2)
+            q = q.filter(tuple_(start, Race.id) > tuple_(race_date_start or "", race_id))
+        rows = q.order_by(start.asc(), Race.id.asc()).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self._encode_cursor(rows[-1].race_date_start, rows[-1].id)
+        return {"items": [dict(row._mapping) for row in rows], "next_cursor": next_cursor}
+
     def get_race(self, race_id: int) -> Optional[Dict]:
         """Get race details by ID."""
         try:
@@ -1916,88 +3339,171 @@ class BTeamStorage:
         ramp_rate: Optional[float] = None,
         comments: Optional[str] = None,
     ) -> bool:
-        """Add or update wellness data for a specific date."""
-        # Check if wellness already exists for this date
-        existing = self.session.query(Wellness).filter_by(
-            athlete_id=athlete_id,
-            wellness_date=wellness_date
-        ).first()
-        
+        """Add or update wellness data for a specific date (non-null fields win)."""
+        entry = {
+            "wellness_date": wellness_date,
+            "weight_kg": weight_kg,
+            "resting_hr": resting_hr,
+            "hrv": hrv,
+            "steps": steps,
+            "soreness": soreness,
+            "fatigue": fatigue,
+            "stress": stress,
+            "mood": mood,
+            "motivation": motivation,
+            "injury": injury,
+            "kcal": kcal,
+            "sleep_secs": sleep_secs,
+            "sleep_score": sleep_score,
+            "sleep_quality": sleep_quality,
+            "avg_sleeping_hr": avg_sleeping_hr,
+            "menstruation": menstruation,
+            "menstrual_cycle_phase": menstrual_cycle_phase,
+            "body_fat": body_fat,
+            "respiration": respiration,
+            "spO2": spO2,
+            "readiness": readiness,
+            "ctl": ctl,
+            "atl": atl,
+            "ramp_rate": ramp_rate,
+            "comments": comments,
+        }
+        return self.upsert_wellness(athlete_id, [entry])[0] == 1
+
+    _WELLNESS_FIELDS = (
+        "weight_kg", "resting_hr", "hrv", "steps", "soreness", "fatigue", "stress", "mood",
+        "motivation", "injury", "kcal", "sleep_secs", "sleep_score", "sleep_quality",
+        "avg_sleeping_hr", "menstruation", "menstrual_cycle_phase", "body_fat", "respiration",
+        "spO2", "readiness", "ctl", "atl", "ramp_rate", "comments",
+    )
+
+    def upsert_wellness(self, athlete_id: int, entries: List[Dict]) -> Tuple[int, Optional[str]]:
+        """Add or merge many wellness days in one statement and transaction.
+
+        Each entry is a dict with wellness_date (YYYY-MM-DD) plus any of add_wellness's
+        fields. On an existing (athlete_id, wellness_date) row only the non-null
+        incoming fields overwrite the stored ones (COALESCE). Entries are checked
+        first, so one bad entry does not fail the batch: without a valid date it
+        is skipped, a field of the wrong type is left out (both logged).
+
+        Returns:
+            (entries written, newest wellness_date written or None): the sync cursor
+            advances only to data actually stored
+        """
         now = datetime.utcnow().isoformat()
-        
-        if existing:
-            # Update existing
-            existing.weight_kg = weight_kg if weight_kg is not None else existing.weight_kg
-            existing.resting_hr = resting_hr if resting_hr is not None else existing.resting_hr
-            existing.hrv = hrv if hrv is not None else existing.hrv
-            existing.steps = steps if steps is not None else existing.steps
-            existing.soreness = soreness if soreness is not None else existing.soreness
-            existing.fatigue = fatigue if fatigue is not None else existing.fatigue
-            existing.stress = stress if stress is not None else existing.stress
-            existing.mood = mood if mood is not None else existing.mood
-            existing.motivation = motivation if motivation is not None else existing.motivation
-            existing.injury = injury if injury is not None else existing.injury
-            existing.kcal = kcal if kcal is not None else existing.kcal
-            existing.sleep_secs = sleep_secs if sleep_secs is not None else existing.sleep_secs
-            existing.sleep_score = sleep_score if sleep_score is not None else existing.sleep_score
-            existing.sleep_quality = sleep_quality if sleep_quality is not None else existing.sleep_quality
-            existing.avg_sleeping_hr = avg_sleeping_hr if avg_sleeping_hr is not None else existing.avg_sleeping_hr
-            existing.menstruation = menstruation if menstruation is not None else existing.menstruation
-            existing.menstrual_cycle_phase = menstrual_cycle_phase if menstrual_cycle_phase is not None else existing.menstrual_cycle_phase
-            existing.body_fat = body_fat if body_fat is not None else existing.body_fat
-            existing.respiration = respiration if respiration is not None else existing.respiration
-            existing.spO2 = spO2 if spO2 is not None else existing.spO2
-            existing.readiness = readiness if readiness is not None else existing.readiness
-            existing.ctl = ctl if ctl is not None else existing.ctl
-            existing.atl = atl if atl is not None else existing.atl
-            existing.ramp_rate = ramp_rate if ramp_rate is not None else existing.ramp_rate
-            existing.comments = comments if comments is not None else existing.comments
-            self.session.commit()
-            return True
-        else:
-            # Create new
-            wellness = Wellness(
-                athlete_id=athlete_id,
-                wellness_date=wellness_date,
-                weight_kg=weight_kg,
-                resting_hr=resting_hr,
-                hrv=hrv,
-                steps=steps,
-                soreness=soreness,
-                fatigue=fatigue,
-                stress=stress,
-                mood=mood,
-                motivation=motivation,
-                injury=injury,
-                kcal=kcal,
-                sleep_secs=sleep_secs,
-                sleep_score=sleep_score,
-                sleep_quality=sleep_quality,
-                avg_sleeping_hr=avg_sleeping_hr,
-                menstruation=menstruation,
-                menstrual_cycle_phase=menstrual_cycle_phase,
-                body_fat=body_fat,
-                respiration=respiration,
-                spO2=spO2,
-                readiness=readiness,
-                ctl=ctl,
-                atl=atl,
-                ramp_rate=ramp_rate,
-                comments=comments,
-                created_at=now,
-            )
-            self.session.add(wellness)
+        values = []
+        for entry in entries:
+            fields = self._wellness_fields(entry)
+            if fields is not None:
+                values.append({"athlete_id": athlete_id, "created_at": now, **fields})
+        if len(values) < len(entries):
+            _logger.warning(f"[upsert_wellness] athlete_id={athlete_id}: {len(entries) - len(values)} entries skipped")
+        if not values:
+            return 0, None
+
+        table = Wellness.__table__
+        stmt = self._insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.athlete_id, table.c.wellness_date],
+            set_={
+                field: func.coalesce(stmt.excluded[field], table.c[field])
+                for field in self._WELLNESS_FIELDS
+            },
+        )
+        try:
+            self.session.execute(stmt, values)
             self.session.commit()
-            return True
+        except Exception:
+            self.session.rollback()
+            raise
+        return len(values), max(value["wellness_date"] for value in values)
+
+    @classmethod
+    def _wellness_fields(cls, entry: Dict) -> Optional[Dict]:
+        """wellness_date plus the wellness fields of an entry, converted to the column types.
+
+        None if the date is missing or not YYYY-MM-DD; a value that does not fit its
+        column becomes None.
+        """
+        wellness_date = str(entry.get("wellness_date") or "")
+        try:
+            datetime.strptime(wellness_date, "%Y-%m-%d")
+        except ValueError:
+            _logger.warning(f"[upsert_wellness] Skipping entry with invalid wellness_date: {wellness_date!r}")
+            return None
+        fields = {"wellness_date": wellness_date}
+        for field in cls._WELLNESS_FIELDS:
+            value = entry.get(field)
+            if value is not None:
+                try:
+                    value = _column_value(Wellness.__table__.c[field].type, value)
+                except (TypeError, ValueError, OverflowError):
+                    _logger.warning(f"[upsert_wellness] {wellness_date}: invalid {field} {value!r}, ignored")
+                    value = None
+            fields[field] = value
+        return fields
 
     def get_wellness(self, athlete_id: int, days_back: int = 30) -> List[Dict]:
         """Get wellness records for an athlete (last N days)."""
+        return self.list_wellness(athlete_ids=[athlete_id], days_back=days_back)
+
+    def list_wellness(
+        self,
+        athlete_ids: Optional[Iterable[int]] = None,
+        team_id: Optional[int] = None,
+        category_id: Optional[int] = None,
+        days_back: int = 30,
+        fields: Optional[Iterable[str]] = None,
+    ) -> List[Dict]:
+        """Wellness records of many athletes (last N days) in a single query, newest first.
+
+        Season archives overlapping the period are included (UNION ALL).
+
+        Args:
+            athlete_ids: se fornito, solo questi atleti
+            team_id:     se fornito, solo gli atleti della squadra
+            category_id: se fornito, solo gli atleti della categoria
+            fields:      proiezione sui campi wellness (id, athlete_id e wellness_date
+                         sono sempre inclusi); None = tutti i campi
+
+        Raises:
+            ValueError: if fields contains an unknown field
+        """
+        if fields is None:
+            selected = list(self._WELLNESS_FIELDS) + ["created_at"]
+        else:
+            selected = [f for f in dict.fromkeys(fields) if f not in ("id", "athlete_id", "wellness_date")]
+            unknown = [f for f in selected if f not in self._WELLNESS_FIELDS and f != "created_at"]
+            if unknown:
+                raise ValueError(f"Campi wellness non validi: {', '.join(unknown)}")
+
         start_date = (datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d')
-        wellness_records = self.session.query(Wellness).filter(
-            Wellness.athlete_id == athlete_id,
-            Wellness.wellness_date >= start_date
-        ).order_by(Wellness.wellness_date.desc()).all()
-        return [w.to_dict() for w in wellness_records]
+        if athlete_ids is not None:
+            athlete_ids = list(athlete_ids)
+            if not athlete_ids:
+                return []
+        athletes = None
+        if team_id is not None or category_id is not None:
+            athletes = select(Athlete.id)
+            if team_id is not None:
+                athletes = athletes.where(Athlete.team_id == team_id)
+            if category_id is not None:
+                athletes = athletes.where(Athlete.category_id == category_id)
+
+        def filtered(t):
+            q = select(
+                t.c.id, t.c.athlete_id, t.c.wellness_date, *(t.c[f] for f in selected)
+            ).where(t.c.wellness_date >= start_date)
+            if athlete_ids is not None:
+                q = q.where(t.c.athlete_id.in_(athlete_ids))
+            if athletes is not None:
+                q = q.where(t.c.athlete_id.in_(athletes.scalar_subquery()))
+            return q
+
+        c = self._with_archives("wellness", filtered, date_from=start_date).subquery("wellness").c
+        return self._rows_to_dicts(
+            self.session.execute(select(*c).order_by(c.wellness_date.desc(), c.athlete_id.asc()))
+        )
 
     def get_latest_weight(self, athlete_id: int) -> Optional[float]:
         """Get the latest weight for an athlete."""
@@ -2162,7 +3668,402 @@ class BTeamStorage:
         self.session.delete(season)
         self.session.commit()
         return True
-    
+
+    # ========== SEASON ARCHIVES ==========
+
+    # SQLITE_MAX_ATTACHED di default: oltre, ATTACH fallirebbe su ogni nuova connessione
+    _MAX_ARCHIVES = 10
+
+    def _find_archives(self) -> Dict[int, Path]:
+        """Season archive files in archive_dir (bteam_<year>.db), by year."""
+        archives = {}
+        for path in sorted(self.archive_dir.glob("bteam_*.db")):
+            year = path.stem.split("_", 1)[1]
+            if year.isdigit():
+                archives[int(year)] = path
+        return archives
+
+    def _archive_table(self, name: str, year: int) -> Table:
+        """Copy of a hot table in the arch_<year> archive: same columns, no foreign keys."""
+        schema = f"arch_{int(year)}"
+        key = f"{schema}.{name}"
+        if key not in self._archive_metadata.tables:
+            source = Base.metadata.tables[name]
+            table = Table(
+                name, self._archive_metadata,
+                *(Column(col.name, col.type, primary_key=col.primary_key) for col in source.columns),
+                schema=schema,
+            )
+            indexed = _ARCHIVE_TABLES[name]
+            if indexed:
+                Index(f"ix_{name}_{'_'.join(indexed)}", *(table.c[col] for col in indexed))
+        return self._archive_metadata.tables[key]
+
+    def _archive_sibling(self, table: Table, name: str) -> Table:
+        """Table `name` in the same database (hot or archive) as `table`."""
+        if table.schema is None:
+            return Base.metadata.tables[name]
+        return self._archive_table(name, int(table.schema[len("arch_"):]))
+
+    def _attached_archives(self) -> Dict[int, Path]:
+        """Season archives attached to the connection of the current session.
+
+        A connection already checked out when archive_seasons creates a new archive
+        gets it at its next checkout; until then its queries leave that archive out.
+        """
+        if not self.archives:
+            return {}
+        attached = self.session.connection().connection.info.get("archives", ())
+        return {year: path for year, path in self.archives.items() if year in attached}
+
+    def _archive_years(self, date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[int]:
+        """Archived seasons overlapping [date_from, date_to] (YYYY-MM-DD, both optional)."""
+        return [
+            year for year in sorted(self._attached_archives())
+            if (not date_from or date_from < f"{year + 1:04d}") and (not date_to or date_to >= f"{year:04d}")
+        ]
+
+    def _with_archives(
+        self, name: str, build: Callable[[Table], Any], date_from: Optional[str] = None, date_to: Optional[str] = None
+    ):
+        """build(table) on the hot table, UNION ALL the same on every overlapping season archive."""
+        selects = [build(Base.metadata.tables[name])]
+        selects += [build(self._archive_table(name, year)) for year in self._archive_years(date_from, date_to)]
+        return selects[0] if len(selects) == 1 else union_all(*selects)
+
+    def archive_seasons(self, before: Optional[str] = None) -> Dict:
+        """Move activities and wellness dated before `before` into per-season archive files.
+
+        Each calendar year goes to archive_dir/bteam_<year>.db, attached to every
+        connection as arch_<year>: activity and wellness reads, search, the change
+        feed and the sync dedupe keep seeing the rows, which become read-only.
+        Activities with FIT files and the highest activity/wellness ids stay in the
+        hot database. Rows are copied with INSERT OR IGNORE and then deleted, so an
+        interrupted run is completed by running it again.
+
+        Args:
+            before: YYYY-MM-DD, esclusiva; default "archive_before" del config
+
+        Returns:
+            {"before": ..., "archived": {year: {"activities": n, "wellness": n}}}
+
+        Raises:
+            ValueError: on a non-SQLite backend, a missing or invalid boundary, or
+                        more than _MAX_ARCHIVES seasons
+        """
+        if not self.is_sqlite:
+            raise ValueError("Season archives are only available on SQLite")
+        before = before or get_archive_before()
+        if not before:
+            raise ValueError("No archive boundary: pass before or set archive_before in the config")
+        datetime.strptime(before, "%Y-%m-%d")
+
+        activities, wellness = Activity.__table__, Wellness.__table__
+        # Le righe con l'id più alto restano calde: senza AUTOINCREMENT SQLite riparte da max(id) + 1
+        # e riassegnerebbe gli id archiviati
+        movable = (
+            (activities.c.activity_date < before)
+            & activities.c.id.notin_(select(FitFile.activity_id))
+            & (activities.c.id < select(func.max(activities.c.id)).scalar_subquery())
+        )
+        # Una connessione dedicata per tutto l'archivio: sessioni e pool delle richieste in corso restano intatti
+        with self.engine.connect() as conn:
+            years = {
+                row[0] for row in conn.execute(
+                    select(func.substr(activities.c.activity_date, 1, 4)).where(movable).distinct()
+                )
+            } | {
+                row[0] for row in conn.execute(
+                    select(func.substr(wellness.c.wellness_date, 1, 4)).where(self._movable_wellness(before)).distinct()
+                )
+            }
+            conn.rollback()
+            years = sorted(int(year) for year in years if year and year.isdigit())
+
+            new_years = [year for year in years if year not in self.archives]
+            if len(self.archives) + len(new_years) > self._MAX_ARCHIVES:
+                raise ValueError(f"Too many season archives (max {self._MAX_ARCHIVES})")
+            if new_years:
+                self.archive_dir.mkdir(parents=True, exist_ok=True)
+                self.archives = {**self.archives, **{year: self.archive_dir / f"bteam_{year}.db" for year in new_years}}
+                # Le altre connessioni del pool li attaccano al prossimo checkout
+                _attach_archives(
+                    conn.connection.dbapi_connection, conn.connection.info.setdefault("archives", set()), self.archives
+                )
+
+            return {"before": before, "archived": self._move_seasons(conn, years, before, movable)}
+
+    @staticmethod
+    def _movable_wellness(before: str):
+        wellness = Wellness.__table__
+        return (wellness.c.wellness_date < before) & (wellness.c.id < select(func.max(wellness.c.id)).scalar_subquery())
+
+    def _move_seasons(self, conn, years: List[int], before: str, movable) -> Dict[int, Dict[str, int]]:
+        """Move each season in its own transaction on `conn` (see archive_seasons).
+
+        The rows stay readable through the archive, so the change_log rows the delete
+        triggers rewrite are put back as they were: feed clients get no tombstones.
+        """
+        activities, wellness, change_log = Activity.__table__, Wellness.__table__, ChangeLog.__table__
+        archived = {}
+        for year in years:
+            start, end = f"{year:04d}-01-01", min(f"{year + 1:04d}-01-01", before)
+            tables = {name: self._archive_table(name, year) for name in _ARCHIVE_TABLES}
+            ids = select(activities.c.id).where(
+                movable, activities.c.activity_date >= start, activities.c.activity_date < end
+            )
+            in_season = self._movable_wellness(before) & (wellness.c.wellness_date >= start) & (wellness.c.wellness_date < end)
+            with conn.begin():
+                for table in tables.values():
+                    table.create(conn, checkfirst=True)
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS arch_{int(year)}.activities_fts USING fts5(title, "
+                    f"content='activities', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+                ))
+                for name, where in (
+                    ("activities", activities.c.id.in_(ids)),
+                    ("activity_payloads", ActivityPayload.__table__.c.activity_id.in_(ids)),
+                    ("activity_tags", ActivityTag.__table__.c.activity_id.in_(ids)),
+                    ("wellness", in_season),
+                ):
+                    target, source = tables[name], Base.metadata.tables[name]
+                    columns = [col.name for col in target.columns]
+                    conn.execute(
+                        target.insert().prefix_with("OR IGNORE").from_select(
+                            columns, select(*(source.c[col] for col in columns)).where(where)
+                        )
+                    )
+                conn.execute(text(
+                    f"INSERT INTO arch_{int(year)}.activities_fts(activities_fts) VALUES ('rebuild')"
+                ))
+
+                logged = conn.execute(select(change_log).where(
+                    ((change_log.c.entity == "activity") & change_log.c.entity_id.in_(ids))
+                    | ((change_log.c.entity == "wellness") & change_log.c.entity_id.in_(select(wellness.c.id).where(in_season)))
+                )).all()
+                last_version = conn.execute(select(func.max(change_log.c.version))).scalar() or 0
+                conn.execute(ActivityPayload.__table__.delete().where(ActivityPayload.__table__.c.activity_id.in_(ids)))
+                conn.execute(ActivityTag.__table__.delete().where(ActivityTag.__table__.c.activity_id.in_(ids)))
+                moved_activities = conn.execute(activities.delete().where(activities.c.id.in_(ids))).rowcount
+                moved_wellness = conn.execute(wellness.delete().where(in_season)).rowcount
+                # Via le versioni scritte dai trigger di delete, tornano quelle di prima
+                conn.execute(change_log.delete().where(change_log.c.version > last_version))
+                if logged:
+                    conn.execute(change_log.insert(), [row._asdict() for row in logged])
+            archived[year] = {"activities": moved_activities, "wellness": moved_wellness}
+            print(f"[bTeam] Archivio {year}: {moved_activities} attività, {moved_wellness} wellness")
+        return archived
+
+    def list_archives(self) -> List[Dict]:
+        """Season archives with their row counts and file size."""
+        result = []
+        for year, path in sorted(self._attached_archives().items()):
+            existing = set(self.session.execute(
+                text(f"SELECT name FROM arch_{int(year)}.sqlite_master WHERE type = 'table'")
+            ).scalars())
+            counts = {
+                name: self.session.execute(
+                    select(func.count()).select_from(self._archive_table(name, year))
+                ).scalar() if name in existing else 0
+                for name in ("activities", "wellness")
+            }
+            result.append({
+                "year": year,
+                "file": path.name,
+                "size_bytes": path.stat().st_size if path.exists() else 0,
+                **counts,
+            })
+        return result
+
+    # ========== CHANGE FEED ==========
+
+    def list_changes(self, entity: str, since: int = 0, **filters) -> Dict:
+        """Rows of an entity changed after version `since`, plus tombstones of deleted ones.
+
+        Pass the returned version as since on the next call; since=0 returns every
+        existing row. Upserts are serialized like the matching list method.
+
+        Args:
+            entity:  "athlete" | "activity" | "wellness" | "race"
+            filters: athlete -> team_id, category_id;
+                     activity -> athlete_id, is_race, tags;
+                     wellness -> athlete_ids, team_id, category_id
+                     (tombstones are never filtered: the row is gone)
+
+        Returns:
+            {"version": int, "upserts": [dict, ...], "deletes": [id, ...]}
+
+        Raises:
+            ValueError: for an unknown entity or a negative since
+        """
+        if entity not in _CHANGE_SOURCES:
+            raise ValueError(f"Unknown entity: {entity}")
+        if since < 0:
+            raise ValueError("since must be >= 0")
+
+        version = self.session.query(func.max(ChangeLog.version)).scalar() or 0
+        changed = (
+            select(ChangeLog.entity_id)
+            .where(ChangeLog.entity == entity, ChangeLog.version > since, ChangeLog.version <= version)
+        )
+        upserted = changed.where(ChangeLog.op == "upsert")
+        deletes = list(self.session.execute(changed.where(ChangeLog.op == "delete")).scalars())
+
+        if entity == "athlete":
+            q = self._athletes_select().where(Athlete.__table__.c.id.in_(upserted))
+            if filters.get("team_id") is not None:
+                q = q.where(Athlete.__table__.c.team_id == filters["team_id"])
+            if filters.get("category_id") is not None:
+                q = q.where(Athlete.__table__.c.category_id == filters["category_id"])
+            upserts = self._rows_to_dicts(self.session.execute(q))
+        elif entity == "activity":
+            q = self._activities_select(**filters, ids=upserted)
+            upserts = self._activity_rows_to_dicts(self.session.execute(q))
+        elif entity == "wellness":
+            athletes = None
+            if filters.get("team_id") is not None or filters.get("category_id") is not None:
+                athletes = select(Athlete.id)
+                if filters.get("team_id") is not None:
+                    athletes = athletes.where(Athlete.team_id == filters["team_id"])
+                if filters.get("category_id") is not None:
+                    athletes = athletes.where(Athlete.category_id == filters["category_id"])
+
+            def filtered(t):
+                q = select(t).where(t.c.id.in_(upserted))
+                if filters.get("athlete_ids") is not None:
+                    q = q.where(t.c.athlete_id.in_(list(filters["athlete_ids"])))
+                if athletes is not None:
+                    q = q.where(t.c.athlete_id.in_(athletes))
+                return q
+
+            # Le righe archiviate restano nel feed (since=0) con la loro versione originale
+            w = self._with_archives("wellness", filtered).subquery("wellness")
+            upserts = self._rows_to_dicts(
+                self.session.execute(select(w).order_by(w.c.wellness_date.desc(), w.c.athlete_id.asc()))
+            )
+        else:
+            races = self.session.query(Race).options(
+                joinedload(Race.athletes_assoc).joinedload(RaceAthlete.athlete).joinedload(Athlete.team)
+            ).filter(Race.id.in_(upserted)).order_by(Race.race_date_start.asc())
+            upserts = [race.to_dict() for race in races.all()]
+        return {"version": version, "upserts": upserts, "deletes": deletes}
+
+    # ========== BACKUP ==========
+
+    def create_backup(self) -> Dict:
+        """Compressed online snapshot of the database and its season archives.
+
+        Uses the sqlite3 backup API in small steps (config "backup"), so the app
+        keeps reading and writing meanwhile; older snapshots beyond "keep" are pruned.
+
+        Raises:
+            ValueError: on a non-SQLite backend
+            RuntimeError: if a backup is already running
+        """
+        if not self.is_sqlite:
+            raise ValueError("Online backups are only available on SQLite (use pg_dump)")
+        if not self._backup_lock.acquire(blocking=False):
+            raise RuntimeError("A backup is already running")
+        try:
+            settings = get_backup_settings()
+            databases = {self.db_path.name: self.db_path}
+            databases.update({f"archive/{path.name}": path for path in self.archives.values()})
+            snapshot = create_snapshot(
+                databases, self.backup_dir,
+                keep=settings["keep"], pages=settings["pages_per_step"], sleep=settings["sleep_ms"] / 1000,
+            )
+        finally:
+            self._backup_lock.release()
+        print(f"[bTeam] Backup {snapshot['name']} creato ({snapshot['size_bytes']} bytes)")
+        return snapshot
+
+    def list_backups(self) -> List[Dict]:
+        """Completed snapshots in backup_dir, newest first."""
+        return list_snapshots(self.backup_dir)
+
+    # ========== SEARCH ==========
+
+    # Match più recenti (per rowid) ordinati per rilevanza: limita il costo di bm25 sui termini generici
+    _SEARCH_RANK_WINDOW = 2000
+
+    def search(self, query: str, types: Optional[Iterable[str]] = None, limit: int = 20) -> List[Dict]:
+        """Full-text search over activities (season archives included), races and athletes, best matches first.
+
+        Every word of the query must match, as a prefix ("gir" finds "Giro").
+        On SQLite accents are ignored and each type is an FTS5 index lookup ranked
+        by bm25 over its newest _SEARCH_RANK_WINDOW matches, so broad terms cost the
+        same as specific ones. On PostgreSQL it is a GIN tsvector lookup ranked by
+        ts_rank.
+
+        Args:
+            types: subset of "activity", "race", "athlete" (default: all)
+
+        Returns:
+            [{"type", "id", "title", "date", "athlete_id", "snippet", "rank"}, ...]
+
+        Raises:
+            ValueError: for an empty query or an unknown type
+        """
+        terms = _search_terms(query)
+        types = list(dict.fromkeys(types or _SEARCH_SOURCES))
+        unknown = [t for t in types if t not in _SEARCH_SOURCES]
+        if unknown:
+            raise ValueError(f"Unknown search type(s): {', '.join(unknown)}")
+
+        if self.is_sqlite:
+            match = " ".join(f'"{term}"*' for term in terms)
+        else:
+            match = " & ".join(f"{term}:*" for term in terms)
+
+        results: List[Dict] = []
+        for kind in types:
+            for schema in [None] + (self._archive_search_schemas() if kind == "activity" else []):
+                rows = self.session.execute(
+                    self._search_statement(kind, schema),
+                    {"match": match, "window": self._SEARCH_RANK_WINDOW, "limit": limit},
+                )
+                results.extend({"type": kind, **row._mapping} for row in rows)
+
+        # bm25 / -ts_rank: più basso = più rilevante
+        results.sort(key=lambda r: r["rank"])
+        return results[:limit]
+
+    def _archive_search_schemas(self) -> List[str]:
+        """Attached season archives that have their activities_fts index (arch_<year>)."""
+        return [f"arch_{int(year)}" for year in self._archive_years() if self._archive_has_search(year)]
+
+    def _archive_has_search(self, year: int) -> bool:
+        return self.session.execute(
+            text(f"SELECT 1 FROM arch_{int(year)}.sqlite_master WHERE name = 'activities_fts'")
+        ).first() is not None
+
+    def _search_statement(self, kind: str, schema: Optional[str] = None):
+        """Per-type search query for the engine's dialect (params: match, window, limit).
+
+        schema: arch_<year> to search a season archive (SQLite, activities only)
+        """
+        fts, source, indexed, columns = _SEARCH_SOURCES[kind]
+        if self.is_sqlite:
+            prefix = f"{schema}." if schema else ""
+            return text(
+                f"SELECT src.id AS id, {columns}, "
+                f"snippet({fts}, -1, '[', ']', '…', 12) AS snippet, bm25({fts}) AS rank "
+                f"FROM {prefix}{fts} JOIN {prefix}{source} AS src ON src.id = {fts}.rowid "
+                f"WHERE {fts} MATCH :match AND {fts}.rowid >= coalesce(("
+                f"SELECT min(rowid) FROM (SELECT rowid FROM {prefix}{fts} WHERE {fts} MATCH :match "
+                f"ORDER BY rowid DESC LIMIT :window)), 0) "
+                f"ORDER BY rank LIMIT :limit"
+            )
+        document = _search_document(indexed, alias="src.")
+        plain = " || ' ' || ".join(f"coalesce(src.{c}, '')" for c in indexed)
+        return text(
+            f"SELECT src.id AS id, {columns}, "
+            f"ts_headline('simple', {plain}, q, 'StartSel=[, StopSel=], MaxWords=12, MinWords=3') AS snippet, "
+            f"-ts_rank({document}, q) AS rank "
+            f"FROM {source} AS src, to_tsquery('simple', :match) AS q "
+            f"WHERE {document} @@ q ORDER BY rank LIMIT :limit"
+        )
+
     def close(self) -> None:
         """
         Close database session and connections.
@@ -2172,7 +4073,7 @@ class BTeamStorage:
         """
         if hasattr(self, 'session') and self.session:
             try:
-                self.session.close()
+                self.session.remove()
             except Exception as e:
                 # Log error but don't raise during cleanup
                 print(f"[bTeam] Errore chiusura sessione: {e}")
@@ -2205,3 +4106,47 @@ def get_storage() -> "BTeamStorage":
         _storage_instance = BTeamStorage(storage_dir)
     return _storage_instance
 
+
+class AsyncBTeamStorage:
+    """Awaitable facade over BTeamStorage for the async FastAPI routes.
+
+    Every public method of BTeamStorage is exposed as a coroutine that runs the
+    blocking call in a worker thread, so SQLite I/O does not stall the event loop.
+    The caller's context is copied into the thread, so calls made inside a request
+    still share that request's session: await them one at a time.
+    """
+
+    def __init__(self, storage: BTeamStorage):
+        self.sync = storage
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Run any other blocking callable (e.g. an ad-hoc session query) off the event loop."""
+        return await run_in_threadpool(func, *args, **kwargs)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.sync, name)
+        if name.startswith("_") or not inspect.ismethod(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            return await run_in_threadpool(attr, *args, **kwargs)
+
+        return call
+
+
+_async_storage_instance = None
+
+def get_async_storage() -> AsyncBTeamStorage:
+    global _async_storage_instance
+    if _async_storage_instance is None:
+        _async_storage_instance = AsyncBTeamStorage(get_storage())
+    return _async_storage_instance
+
+
+async def storage_session() -> AsyncIterator[BTeamStorage]:
+    """FastAPI dependency: opens a request-scoped session on the shared storage."""
+    storage = get_storage()
+    with storage.session_scope():
+        yield storage
+
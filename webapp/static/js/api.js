@@ -188,6 +188,24 @@ class APIClient {
         return this.request('/races/');
     }
 
+    async getRaceSummaries(filters = {}) {
+        const params = new URLSearchParams(filters).toString();
+        return this.request(`/races/summary?${params}`);
+    }
+
+    // Delta di una lista ('athletes', 'activities', 'wellness', 'races') dopo la versione since:
+    // { version, upserts, deletes }. Ripassare version alla chiamata successiva.
+    async getChanges(resource, since = 0, filters = {}) {
+        const params = new URLSearchParams({ ...filters, since });
+        return this.request(`/${resource}/?${params}`);
+    }
+
+    async search(query, types = []) {
+        const params = new URLSearchParams({ q: query });
+        types.forEach(type => params.append('types', type));
+        return this.request(`/search/?${params}`);
+    }
+
     async getRace(id) {
         return this.request(`/races/${id}`);
     }
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark: liste attività, atleti e wellness, percorso ORM contro Core
+
+Il percorso ORM è quello precedente alle query Core (oggetti ORM, to_dict(),
+jsonable_encoder e JSONResponse); quello Core è list_activities / list_athletes /
+list_wellness con json_response. Prima della misura controlla che i due percorsi
+diano gli stessi dati.
+
+Uso (dalla cartella webapp):
+    python tools/bench_lists.py [--athletes 60] [--activities 300] [--requests 30]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+
+from shared.responses import json_response  # noqa: E402
+from shared.storage import Activity, Athlete, BTeamStorage, Wellness  # noqa: E402
+
+WELLNESS_DAYS = 30
+
+
+def populate(storage: BTeamStorage, athletes: int, activities: int) -> None:
+    today = datetime.now()
+    with storage.session_scope():
+        for a in range(athletes):
+            athlete_id = storage.add_athlete(first_name=f"Atleta{a}", last_name="Bench", birth_date="")
+            storage.upsert_activities(athlete_id, [
+                {
+                    "title": f"Uscita {k}",
+                    "activity_date": f"2024-{1 + k % 12:02d}-{1 + k % 28:02d}",
+                    "intervals_id": f"i{athlete_id}_{k}",
+                    "distance_km": 40.0, "duration_minutes": 90.0, "tss": 80.0, "avg_watts": 200.0,
+                    "tags": ["z2", "base"] if k % 3 else [],
+                }
+                for k in range(activities)
+            ])
+            storage.upsert_wellness(athlete_id, [
+                {"wellness_date": (today - timedelta(days=d)).strftime("%Y-%m-%d"),
+                 "weight_kg": 70.0, "hrv": 60.0, "resting_hr": 45}
+                for d in range(WELLNESS_DAYS)
+            ])
+
+
+def orm_activities(storage: BTeamStorage, limit: int) -> List[Dict]:
+    activities = (
+        storage.session.query(Activity).options(selectinload(Activity.tag_links))
+        .order_by(Activity.activity_date.desc(), Activity.created_at.desc(), Activity.id.desc())
+        .limit(limit).all()
+    )
+    names = {
+        athlete_id: f"{first_name} {last_name}"
+        for athlete_id, first_name, last_name in storage.session.query(
+            Athlete.id, Athlete.first_name, Athlete.last_name
+        ).filter(Athlete.id.in_({a.athlete_id for a in activities}))
+    }
+    result = []
+    for activity in activities:
+        item = activity.to_dict()
+        item["athlete_name"] = names.get(activity.athlete_id, "Unknown")
+        result.append(item)
+    return result
+
+
+def orm_athletes(storage: BTeamStorage) -> List[Dict]:
+    return [
+        a.to_dict(with_team_name=True)
+        for a in storage.session.query(Athlete).order_by(Athlete.created_at.desc()).all()
+    ]
+
+
+def orm_wellness(storage: BTeamStorage) -> List[Dict]:
+    start = (datetime.now() - timedelta(days=WELLNESS_DAYS)).strftime("%Y-%m-%d")
+    return [
+        w.to_dict()
+        for w in storage.session.query(Wellness).filter(Wellness.wellness_date >= start)
+        .order_by(Wellness.wellness_date.desc(), Wellness.athlete_id)
+    ]
+
+
+def canonical(items: List[Dict]) -> List[str]:
+    return sorted(json.dumps(item, sort_keys=True, default=str) for item in items)
+
+
+def bench(storage: BTeamStorage, name: str, orm: Callable, core: Callable, requests: int) -> None:
+    with storage.session_scope():
+        if canonical(orm()) != canonical(core()):
+            raise SystemExit(f"[bTeam] {name}: i due percorsi danno dati diversi")
+    paths = (
+        ("orm", orm, lambda items: JSONResponse(jsonable_encoder(items)).body),
+        ("core", core, lambda items: json_response(items).body),
+    )
+    for label, fetch, render in paths:
+        started = time.perf_counter()
+        for _ in range(requests):
+            with storage.session_scope():
+                body = render(fetch())
+        elapsed = (time.perf_counter() - started) / requests
+        print(f"{name:12s} {label:5s} {elapsed * 1000:8.2f} ms/richiesta  ({len(body)} byte)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--athletes", type=int, default=60)
+    parser.add_argument("--activities", type=int, default=300, help="attività per atleta")
+    parser.add_argument("--requests", type=int, default=30, help="richieste misurate per lista")
+    args = parser.parse_args()
+    logging.getLogger("shared.storage").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = BTeamStorage(Path(tmp))
+        populate(storage, args.athletes, args.activities)
+        print(f"[bTeam] {args.athletes} atleti, {args.athletes * args.activities} attività, "
+              f"{args.athletes * WELLNESS_DAYS} wellness (SQLite)")
+        bench(storage, "activities", lambda: orm_activities(storage, 1000),
+              lambda: storage.list_activities(limit=1000), args.requests)
+        bench(storage, "athletes", lambda: orm_athletes(storage), storage.list_athletes, args.requests)
+        bench(storage, "wellness", lambda: orm_wellness(storage), storage.list_wellness, args.requests)
+        storage.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
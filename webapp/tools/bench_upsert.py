@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark: scrittura delle attività sincronizzate, percorso ORM contro bulk
+
+Genera lo stesso dataset (attività con tag e payload Intervals) e lo scrive in due
+database temporanei: uno con add_activity riga per riga (ORM, un commit per
+attività) e uno con upsert_activities per atleta (INSERT ... ON CONFLICT in una
+transazione). Misura il primo import e il re-sync degli stessi dati, poi
+controlla che i due database contengano le stesse attività. Nel re-sync
+add_activity si ferma alla deduplica, upsert_activities riscrive anche le
+metriche (come fa il sync).
+
+Uso (dalla cartella webapp):
+    python tools/bench_upsert.py [--athletes 10] [--activities 300]
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from shared.storage import BTeamStorage  # noqa: E402
+
+ACTIVITY_TYPES = ("Ride", "VirtualRide", "Run")
+TAGS = ("base", "z2", "soglia", "gara", "recupero")
+
+
+def generate_rows(athletes: int, activities: int, seed: int) -> Dict[int, List[Dict]]:
+    """Righe nel formato di upsert_activities (e keyword di add_activity), per atleta."""
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    dataset = {}
+    for athlete in range(1, athletes + 1):
+        rows = []
+        for k in range(activities):
+            day = start + timedelta(days=k * 365 // max(activities, 1))
+            rows.append({
+                "title": f"Uscita {k}",
+                "activity_date": day.isoformat(),
+                "intervals_id": f"i{athlete}_{k}",
+                "source": "intervals",
+                "activity_type": rng.choice(ACTIVITY_TYPES),
+                "duration_minutes": round(rng.uniform(30, 300), 1),
+                "distance_km": round(rng.uniform(10, 180), 1),
+                "tss": round(rng.uniform(20, 250), 1),
+                "avg_watts": round(rng.uniform(120, 280), 1),
+                "avg_hr": rng.randint(110, 165),
+                "is_race": rng.random() < 0.05,
+                "tags": rng.sample(TAGS, rng.randint(0, 2)),
+                "intervals_payload": {"id": f"i{athlete}_{k}", "icu_zone_times": [rng.randint(0, 900) for _ in range(7)]},
+            })
+        dataset[athlete] = rows
+    return dataset
+
+
+def orm_write(storage: BTeamStorage, athlete_id: int, rows: List[Dict]) -> None:
+    for row in rows:
+        storage.add_activity(athlete_id, **row)
+
+
+def bulk_write(storage: BTeamStorage, athlete_id: int, rows: List[Dict]) -> None:
+    storage.upsert_activities(athlete_id, rows)
+
+
+def run(label: str, write: Callable, dataset: Dict[int, List[Dict]]) -> List:
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = BTeamStorage(Path(tmp))
+        with storage.session_scope():
+            for athlete in dataset:
+                storage.add_athlete(first_name=f"Atleta{athlete}", last_name="Bench", birth_date="")
+        total = sum(len(rows) for rows in dataset.values())
+        for phase in ("import", "re-sync"):
+            started = time.perf_counter()
+            with storage.session_scope():
+                for athlete_id, rows in dataset.items():
+                    write(storage, athlete_id, rows)
+            elapsed = time.perf_counter() - started
+            print(f"{label:5s} {phase:8s} {elapsed * 1000:9.1f} ms  ({total / elapsed:8.0f} attività/s)")
+        with storage.session_scope():
+            stored = sorted(
+                (a["athlete_id"], a["intervals_id"], a["title"], a["tss"], tuple(a["tags"]))
+                for a in storage.list_activities(limit=total + 1)
+            )
+        storage.engine.dispose()
+    return stored
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--athletes", type=int, default=10)
+    parser.add_argument("--activities", type=int, default=300, help="attività per atleta")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    # Il log INFO per attività di add_activity peserebbe sulla misura del percorso ORM
+    logging.getLogger("shared.storage").setLevel(logging.WARNING)
+
+    dataset = generate_rows(args.athletes, args.activities, args.seed)
+    print(f"[bTeam] {args.athletes} atleti x {args.activities} attività (SQLite)")
+    orm = run("orm", orm_write, dataset)
+    bulk = run("bulk", bulk_write, dataset)
+    if orm != bulk:
+        raise SystemExit("[bTeam] I due percorsi hanno scritto attività diverse")
+    print("[bTeam] Stesse attività scritte dai due percorsi")
+
+
+if __name__ == "__main__":
+    main()
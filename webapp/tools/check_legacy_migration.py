@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Controllo di regressione: migrazione di un database SQLite legacy (user_version 1)
+
+Crea in una cartella temporanea un DB con lo schema pre-versioning (senza indici
+unici, senza FTS5 e senza change log), con un intervals_id duplicato e giorni
+wellness duplicati, poi lo apre con BTeamStorage e verifica che le migrazioni
+v2..v9 lo portino allo schema attuale senza corrompere l'indice di ricerca.
+
+Uso (dalla cartella webapp):
+    python tools/check_legacy_migration.py
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from shared.storage import BTeamStorage  # noqa: E402
+
+
+def build_legacy_database(folder: Path) -> Path:
+    """DB al livello di un'installazione precedente alle migrazioni numerate."""
+    storage = BTeamStorage(folder)
+    athlete_id = storage.add_athlete(first_name="Mario", last_name="Rossi", birth_date="")
+    other_id = storage.add_athlete(first_name="Luca", last_name="Bianchi", birth_date="")
+    db_path = storage.db_path
+    storage.engine.dispose()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        # Via tutto ciò che le migrazioni v2..v9 aggiungono
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='trigger'").fetchall():
+            conn.execute(f"DROP TRIGGER {name}")
+        for fts in ("activities_fts", "races_fts", "athletes_fts"):
+            conn.execute(f"DROP TABLE IF EXISTS {fts}")
+        for table in ("change_log", "sync_state"):
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute("DROP INDEX ux_activities_intervals_id")
+        conn.execute("DROP INDEX ux_wellness_athlete_date")
+
+        now = "2024-01-01T00:00:00"
+        activities = [
+            (1, athlete_id, "Giro del lago", "2024-05-01", "i100", None, None),
+            (2, athlete_id, "Giro del lago", "2024-05-01", "i100", 85.0, 142),
+            (3, athlete_id, "Ripetute salita", "2024-05-03", "i101", 60.0, None),
+            (4, other_id, "Uscita lunga", "2024-05-04", "i200", 120.0, 130),
+        ]
+        conn.executemany(
+            "INSERT INTO activities (id, athlete_id, title, activity_date, intervals_id, tss, avg_hr, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [row + (now,) for row in activities],
+        )
+        conn.execute("INSERT INTO activity_tags (activity_id, tag) VALUES (2, 'gara')")
+        wellness = [
+            (athlete_id, "2024-05-01", 70.5, None),
+            (athlete_id, "2024-05-01", None, 48),
+            (athlete_id, "2024-05-02", 70.2, 47),
+        ]
+        conn.executemany(
+            "INSERT INTO wellness (athlete_id, wellness_date, weight_kg, resting_hr, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [row + (now,) for row in wellness],
+        )
+        conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+    finally:
+        conn.close()
+    return db_path
+
+
+def check(condition: bool, message: str) -> None:
+    if not condition:
+        raise SystemExit(f"[bTeam] FALLITO: {message}")
+    print(f"[bTeam] ok: {message}")
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp)
+        db_path = build_legacy_database(folder)
+
+        storage = BTeamStorage(folder)
+        storage.engine.dispose()
+
+        conn = sqlite3.connect(db_path)
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            check(version == BTeamStorage.SCHEMA_VERSION, f"user_version {version} = {BTeamStorage.SCHEMA_VERSION}")
+            check(conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok", "PRAGMA integrity_check")
+            for fts in ("activities_fts", "races_fts", "athletes_fts"):
+                conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('integrity-check')")
+            check(True, "integrity-check degli indici FTS5")
+
+            rows = conn.execute(
+                "SELECT id, tss, avg_hr FROM activities WHERE intervals_id = 'i100'"
+            ).fetchall()
+            check(rows == [(1, 85.0, 142)], f"intervals_id duplicato unito nella prima attività: {rows}")
+            tags = conn.execute("SELECT activity_id, tag FROM activity_tags").fetchall()
+            check(tags == [(1, "gara")], f"tag spostati sull'attività tenuta: {tags}")
+            days = conn.execute(
+                "SELECT wellness_date, weight_kg, resting_hr FROM wellness ORDER BY wellness_date"
+            ).fetchall()
+            check(
+                days == [("2024-05-01", 70.5, 48), ("2024-05-02", 70.2, 47)],
+                f"giorni wellness duplicati uniti: {days}",
+            )
+            indexes = {
+                row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'").fetchall()
+            }
+            check(
+                {"ux_activities_intervals_id", "ux_wellness_athlete_date"} <= indexes,
+                "indici unici creati",
+            )
+        finally:
+            conn.close()
+
+        storage = BTeamStorage(folder)
+        hits = storage.search("lago", types=["activity"])
+        check([hit["id"] for hit in hits] == [1], f"ricerca sulle attività migrate: {hits}")
+        hits = storage.search("bianchi", types=["athlete"])
+        check(len(hits) == 1, "ricerca sugli atleti migrati")
+        storage.engine.dispose()
+
+    print("[bTeam] Migrazione legacy verificata")
+
+
+if __name__ == "__main__":
+    main()